@@ -5,17 +5,19 @@ author: Fu-Jie
 author_url: https://github.com/Fu-Jie/openwebui-extensions
 funding_url: https://github.com/open-webui
 description: Reduces token consumption in long conversations while maintaining coherence through intelligent summarization and message compression.
-version: 1.5.0
+version: 1.6.0
 openwebui_id: b1655bc8-6de9-4cad-8cb5-a6f7829a02ce
 license: MIT
 
 ═══════════════════════════════════════════════════════════════════════════════
-📌 What's new in 1.5.0
+📌 What's new in 1.6.0
 ═══════════════════════════════════════════════════════════════════════════════
 
-  ✅ Stronger Working-Memory Prompt: Refined XML summary instructions to better preserve useful context in general chat and multi-step tool workflows.
-  ✅ Clearer Frontend Debug Logs: Reworked browser-console debug output into grouped, structured snapshots for faster diagnosis.
-  ✅ Safer Tool Trimming Defaults: Native tool-output trimming is now enabled by default with a configurable 600-character threshold.
+  ✅ Per-Chat Token Ledger: Precise message counts are remembered per chat; each turn only counts new or changed messages.
+  ✅ Lazy Per-Model Tokenizers: tiktoken encodings load in the background per model and fall back to the default encoding when loading fails.
+  ✅ Bounded Summary Scheduling: Global cap on background summary jobs with per-chat coalescing, plus hierarchical summaries for oversized ranges.
+  ✅ Early First Summary, Tool Output Offload and Cache-Stable Summary Prefix (all opt-in).
+  ✅ Write-Behind Summary Saves, Metrics and Batched Frontend Debug Logs.
 
 ═══════════════════════════════════════════════════════════════════════════════
 📌 Overview
@@ -272,15 +274,49 @@ import hashlib
 import math
 import time
 import contextlib
+import functools
 import logging
+import sys
+import threading
+import types
+from bisect import bisect_left
+from collections import OrderedDict, deque
 from copy import deepcopy
-from functools import lru_cache
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
 SUMMARY_METADATA_SOURCE = "async_context_compression"
 
+# Per-chat token ledger bounds (in-process, shared by inlet/outlet passes)
+TOKEN_LEDGER_MAX_CHATS = 256
+TOKEN_LEDGER_MIN_ENTRIES = 64
+SUMMARY_INJECTION_CACHE_MAX_CHATS = 512
+# Marker that opens a versioned summary when `stable_summary_prefix` is on
+SUMMARY_VERSION_MARKER = "context-summary"
+# Hierarchical (map-reduce) summarization bounds
+SUMMARY_CHUNK_CACHE_MAX_ENTRIES = 512
+HIERARCHICAL_SUMMARY_MAX_LEVELS = 4
+HIERARCHICAL_SUMMARY_MIN_WINDOW_TOKENS = 512
+# Content-addressed offload of trimmed tool outputs
+TOOL_OUTPUT_REF_PREFIX = "tool-output:sha256:"
+TOOL_OUTPUT_REF_PATTERN = re.compile(r"tool-output:sha256:([0-9a-f]{64})")
+TOOL_OUTPUT_OFFLOAD_KNOWN_MAX = 4096
+# Outputs kept in memory for retry while the offload store is unavailable
+TOOL_OUTPUT_OFFLOAD_PENDING_MAX = 256
+# Minimum spacing between offload retention sweeps (deleted chats, expired rows)
+TOOL_OUTPUT_OFFLOAD_CLEANUP_INTERVAL_SECONDS = 3600
+# Tool-call cards embedded in assistant content (<details type="tool_calls">)
+TOOL_BLOCK_OPEN = '<details type="tool_calls"'
+TOOL_BLOCK_CLOSE = "</details>"
+TOOL_BLOCK_RESULT_ATTR = 'result="'
+# Metrics: JSONL write-behind interval and the process-wide Prometheus server slot
+METRICS_JSONL_FLUSH_INTERVAL = 1.0
+METRICS_SERVER_HOLDER = "_async_context_compression_metrics_server"
+# Write-behind retry policy for summary rows that failed to flush
+SUMMARY_WRITE_RETRY_MAX_DELAY = 60.0
+SUMMARY_WRITE_MAX_ATTEMPTS = 5
+
 # Open WebUI built-in imports
 from open_webui.utils.chat import generate_chat_completion
 from open_webui.models.users import Users
@@ -292,6 +328,10 @@ try:
     from open_webui.models.chats import Chats
 except ModuleNotFoundError:  # pragma: no cover - filter runs inside OpenWebUI
     Chats = None
+try:
+    from open_webui.models.chats import Chat as owui_Chat
+except ImportError:  # pragma: no cover - filter runs inside OpenWebUI
+    owui_Chat = None
 
 # Open WebUI internal database (re-use shared connection)
 try:
@@ -309,7 +349,7 @@ except ImportError:
 from sqlalchemy import Column, String, Text, DateTime, Integer, inspect
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.engine import Engine
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 
 def _discover_owui_engine(db_module: Any) -> Optional[Engine]:
@@ -405,6 +445,24 @@ class ChatSummary(owui_Base):
     )
 
 
+class ToolOutputOffload(owui_Base):
+    """Offloaded Tool Output Storage Table (content-addressed per chat, written once)"""
+
+    __tablename__ = "chat_tool_output_offload"
+    __table_args__ = (
+        {"extend_existing": True, "schema": owui_schema}
+        if owui_schema
+        else {"extend_existing": True}
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    digest = Column(String(64), unique=True, nullable=False, index=True)
+    chat_id = Column(String(255), nullable=False, index=True)
+    content = Column(Text, nullable=False)
+    char_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 TRANSLATIONS = {
     "en-US": {
         "status_context_usage": "Context Usage (Estimated): {tokens} / {max_tokens} Tokens ({ratio}%)",
@@ -539,13 +597,9 @@ TRANSLATIONS = {
 }
 
 
-# Global cache for tiktoken encoding
-TIKTOKEN_ENCODING = None
-if tiktoken:
-    try:
-        TIKTOKEN_ENCODING = tiktoken.get_encoding("o200k_base")
-    except Exception as e:
-        logger.error(f"[Init] Failed to load tiktoken encoding: {e}")
+# Tokenizer names: any tiktoken encoding, or "estimate" for the heuristic estimator
+DEFAULT_TOKENIZER_ENCODING = "o200k_base"
+ESTIMATE_TOKENIZER = "estimate"
 
 
 ASCII_PUNCTUATION_CHARS = ".,:;!?/\\()[]{}<>-=+*_`"
@@ -560,49 +614,54 @@ SCRIPT_BYTE_COEFFICIENTS = {
 }
 
 
-def _sample_script_mix(text: str, limit: int = 256) -> tuple[Dict[str, int], str]:
-    counts = {key: 0 for key in SCRIPT_BYTE_COEFFICIENTS}
-    seen = 0
-
-    for char in text:
-        codepoint = ord(char)
-        if codepoint < 128:
-            continue
-
-        seen += 1
-        if 0x3040 <= codepoint <= 0x30FF or 0x31F0 <= codepoint <= 0x31FF:
-            counts["kana"] += 1
-        elif (
-            0x3400 <= codepoint <= 0x4DBF
-            or 0x4E00 <= codepoint <= 0x9FFF
-            or 0xF900 <= codepoint <= 0xFAFF
-        ):
-            counts["han"] += 1
-        elif (
-            0x1100 <= codepoint <= 0x11FF
-            or 0x3130 <= codepoint <= 0x318F
-            or 0xAC00 <= codepoint <= 0xD7AF
-        ):
-            counts["hangul"] += 1
-        elif (
-            0x0400 <= codepoint <= 0x052F
-            or 0x2DE0 <= codepoint <= 0x2DFF
-            or 0xA640 <= codepoint <= 0xA69F
-        ):
-            counts["cyr"] += 1
-        elif (
-            0x0600 <= codepoint <= 0x06FF
-            or 0x0750 <= codepoint <= 0x077F
-            or 0x08A0 <= codepoint <= 0x08FF
-        ):
-            counts["arabic"] += 1
-        elif 0x0E00 <= codepoint <= 0x0E7F:
-            counts["thai"] += 1
-        else:
-            counts["other"] += 1
+# Byte tables keep the estimator in C loops instead of walking characters.
+ASCII_PUNCTUATION_BYTES = ASCII_PUNCTUATION_CHARS.encode("ascii")
+ASCII_BYTES = bytes(range(128))
+NON_ASCII_BYTES = bytes(range(128, 256))
+SCRIPT_CODEPOINT_RANGES = {
+    "kana": ((0x3040, 0x30FF), (0x31F0, 0x31FF)),
+    "han": ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF)),
+    "hangul": ((0x1100, 0x11FF), (0x3130, 0x318F), (0xAC00, 0xD7AF)),
+    "cyr": ((0x0400, 0x052F), (0x2DE0, 0x2DFF), (0xA640, 0xA69F)),
+    "arabic": ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF)),
+    "thai": ((0x0E00, 0x0E7F),),
+}
+SCRIPT_CLASS_CODES = {key: chr(0x41 + index) for index, key in enumerate(SCRIPT_BYTE_COEFFICIENTS)}
+
+
+class _ScriptClassTable(dict):
+    """`str.translate` table mapping each codepoint to its script's class code, filled lazily."""
+
+    def __missing__(self, codepoint: int) -> str:
+        code = SCRIPT_CLASS_CODES["other"]
+        for key, ranges in SCRIPT_CODEPOINT_RANGES.items():
+            if any(low <= codepoint <= high for low, high in ranges):
+                code = SCRIPT_CLASS_CODES[key]
+                break
+        self[codepoint] = code
+        return code
+
+
+SCRIPT_CLASS_TABLE = _ScriptClassTable()
+
+
+def _non_ascii_sample(encoded: bytes, limit: int) -> str:
+    """Return the first `limit` non-ASCII characters of UTF-8 `encoded`."""
+    # Removing ASCII bytes from valid UTF-8 leaves valid UTF-8 for the remaining
+    # characters. Try a bounded prefix first; a character cut at the prefix end
+    # is dropped by "ignore", and we only trust the prefix if it yields `limit`.
+    head = encoded[: limit * 16]
+    sample = head.translate(None, ASCII_BYTES).decode("utf-8", "ignore")
+    if len(sample) < limit and len(head) < len(encoded):
+        sample = (
+            encoded.translate(None, ASCII_BYTES)[: limit * 4].decode("utf-8", "ignore")
+        )
+    return sample[:limit]
 
-        if seen >= limit:
-            break
+
+def _classify_script_sample(sample: str) -> tuple[Dict[str, int], str]:
+    classes = sample.translate(SCRIPT_CLASS_TABLE)
+    counts = {key: classes.count(code) for key, code in SCRIPT_CLASS_CODES.items()}
 
     total = sum(counts.values())
     if total == 0:
@@ -615,18 +674,511 @@ def _sample_script_mix(text: str, limit: int = 256) -> tuple[Dict[str, int], str
     return counts, max(counts, key=counts.get)
 
 
-@lru_cache(maxsize=4096)
+def _sample_script_mix(text: str, limit: int = 256) -> tuple[Dict[str, int], str]:
+    return _classify_script_sample(_non_ascii_sample(text.encode("utf-8"), limit))
+
+
+class TokenCountCache:
+    """Thread-safe LRU of token counts bounded by an approximate byte budget.
+
+    Short texts are keyed directly; longer texts are keyed by a 16-byte BLAKE2b
+    digest so large tool outputs are never pinned in memory by the cache itself.
+    Instances are module-level and therefore shared by every Filter in the process.
+    """
+
+    DIRECT_KEY_MAX_CHARS = 64
+    ENTRY_OVERHEAD_BYTES = 160
+
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _make_key(self, text: str) -> tuple[Any, int]:
+        if len(text) <= self.DIRECT_KEY_MAX_CHARS:
+            return text, self.ENTRY_OVERHEAD_BYTES + len(text)
+        digest = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        return (len(text), digest), self.ENTRY_OVERHEAD_BYTES + len(digest)
+
+    def lookup(self, text: str) -> Optional[int]:
+        key, _ = self._make_key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def store(self, text: str, value: int) -> None:
+        key, cost = self._make_key(text)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._bytes -= evicted_cost
+                self.evictions += 1
+
+    def get_or_compute(self, text: str, compute: Callable[[str], int]) -> int:
+        value = self.lookup(text)
+        if value is None:
+            value = compute(text)
+            self.store(text, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Process-wide token caches (shared across Filter instances)
+ESTIMATE_TOKEN_CACHE = TokenCountCache("estimate", max_bytes=4 * 1024 * 1024)
+EXACT_TOKEN_CACHE = TokenCountCache("exact", max_bytes=4 * 1024 * 1024)
+
+
+class TokenizerRegistry:
+    """Lazily loaded tiktoken encodings, keyed by encoding name.
+
+    `get` never blocks: an encoding that is not loaded yet is warmed on a daemon
+    thread and None is returned, so callers fall back to the heuristic estimator
+    until it is ready. Each encoding gets its own exact-count cache, since counts
+    are only valid for the encoding that produced them.
+    """
+
+    def __init__(self):
+        self._encodings: Dict[str, Any] = {}
+        self._caches: Dict[str, TokenCountCache] = {
+            DEFAULT_TOKENIZER_ENCODING: EXACT_TOKEN_CACHE
+        }
+        self._loading: set = set()
+        self._failed: set = set()
+        self._lock = threading.Lock()
+
+    def get(self, name: Optional[str]) -> Optional[Any]:
+        if not name or name == ESTIMATE_TOKENIZER:
+            return None
+        with self._lock:
+            encoding = self._encodings.get(name)
+            if encoding is not None or name in self._failed or name in self._loading:
+                return encoding
+            if tiktoken is None:
+                return None
+            self._loading.add(name)
+        threading.Thread(
+            target=self._load, args=(name,), name=f"tiktoken-{name}", daemon=True
+        ).start()
+        return None
+
+    def warm(self, name: Optional[str]) -> None:
+        self.get(name)
+
+    def has_failed(self, name: Optional[str]) -> bool:
+        with self._lock:
+            return bool(name) and name in self._failed
+
+    def register(self, name: str, encoding: Any) -> None:
+        with self._lock:
+            self._encodings[name] = encoding
+            self._failed.discard(name)
+
+    def _load(self, name: str) -> None:
+        start_time = time.time()
+        try:
+            encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.error(f"[Init] Failed to load tiktoken encoding '{name}': {e}")
+            with self._lock:
+                self._failed.add(name)
+                self._loading.discard(name)
+            return
+        with self._lock:
+            self._encodings.setdefault(name, encoding)
+            self._loading.discard(name)
+        logger.info(
+            f"[Init] Loaded tiktoken encoding '{name}' in {(time.time() - start_time) * 1000:.0f}ms"
+        )
+
+    def cache_for(self, name: str) -> TokenCountCache:
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                cache = TokenCountCache(f"exact:{name}", max_bytes=4 * 1024 * 1024)
+                self._caches[name] = cache
+            return cache
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": sorted(self._encodings),
+                "loading": sorted(self._loading),
+                "failed": sorted(self._failed),
+            }
+
+
+TOKENIZER_REGISTRY = TokenizerRegistry()
+# Start loading the default encoding now without holding up the import.
+TOKENIZER_REGISTRY.warm(DEFAULT_TOKENIZER_ENCODING)
+
+
+def _tokenizer_name_for_model(model_id: Optional[str]) -> Optional[str]:
+    """The tiktoken encoding tiktoken itself maps to a (known OpenAI) model ID."""
+    if tiktoken is None or not model_id:
+        return None
+    try:
+        return tiktoken.encoding_name_for_model(model_id)
+    except Exception:
+        return None
+
+
+class SummaryJobScheduler:
+    """Runs background summary jobs under a global concurrency cap.
+
+    Jobs are keyed by chat ID. While a chat has a job queued or running, newer
+    submissions for it replace the queued one (latest wins), so a burst of outlets
+    keeps at most one running and one waiting job per chat. Per-chat state is
+    dropped as soon as the chat goes idle. New chats are rejected once
+    `max_queued` chats are waiting.
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, max_concurrency: int = 2, max_queued: int = 64):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self._pending: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._ready: "deque[str]" = deque()
+        self._running: set = set()
+        self._tasks: set = set()
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_queued = 0
+
+    def submit(self, key: str, factory: Callable[[], Awaitable[Any]]) -> str:
+        """Schedule `factory()` for `key`. Returns started/queued/coalesced/rejected."""
+        self.submitted += 1
+        if key in self._pending:
+            self._pending[key] = factory
+            self.coalesced += 1
+            return "coalesced"
+
+        # The queue cap only applies to jobs that would have to wait; a job that
+        # can start right away is always accepted (so max_queued=0 means "no waiting").
+        can_start = key not in self._running and len(self._running) < max(
+            1, self.max_concurrency
+        )
+        if not can_start and len(self._pending) >= max(0, self.max_queued):
+            self.rejected += 1
+            return "rejected"
+
+        self._pending[key] = factory
+        self.peak_queued = max(self.peak_queued, len(self._pending))
+        if key not in self._running:
+            self._ready.append(key)
+        self._pump()
+        return "started" if key in self._running and key not in self._pending else "queued"
+
+    def _pump(self) -> None:
+        while self._ready and len(self._running) < max(1, self.max_concurrency):
+            key = self._ready.popleft()
+            factory = self._pending.pop(key)
+            self._running.add(key)
+            # Hold a reference until the job finishes so it is not garbage collected.
+            self._tasks.add(asyncio.create_task(self._run(key, factory)))
+
+    async def _run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        cancelled = False
+        try:
+            await factory()
+            self.completed += 1
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception:
+            self.failed += 1
+            logger.exception("[Scheduler] Summary job failed for chat %s", key)
+        finally:
+            self._tasks.discard(asyncio.current_task())
+            self._running.discard(key)
+            if key in self._pending:
+                self._ready.append(key)
+            # A cancelled job means the loop is shutting down; leave queued work
+            # for the next submit instead of spawning tasks on a closing loop.
+            if not cancelled:
+                self._pump()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._running),
+            "queued": len(self._pending),
+            "peak_queued": self.peak_queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+class CompressionMetrics:
+    """Structured timings and counters for the filter, fanned out to pluggable sinks.
+
+    Each event is a flat dict (`event`, `ts` plus fields) kept in an in-memory ring
+    buffer, optionally appended to a JSONL file and passed to any sink added with
+    `add_sink`. Numeric fields are aggregated per event: fields ending in `_ms`
+    as latency summaries, the rest as running totals. `render_prometheus` returns
+    the aggregates (and token cache stats) in Prometheus text format, optionally
+    served over HTTP on `prometheus_port`.
+
+    One instance (`METRICS`) is shared by every Filter in the process. JSONL lines
+    are buffered and appended by a timer thread, never on the caller's thread.
+    """
+
+    PREFIX = "async_context_compression"
+
+    def __init__(self, ring_size: int = 1000):
+        self._lock = threading.Lock()
+        self._ring: deque = deque(maxlen=ring_size)
+        self._sinks: List[Callable[[Dict[str, Any]], None]] = []
+        self._jsonl_path = ""
+        self._event_counts: Dict[str, int] = {}
+        # (event, field) -> [count, sum, max] for *_ms fields, running sum otherwise
+        self._timings: Dict[tuple, List[float]] = {}
+        self._totals: Dict[tuple, float] = {}
+        self._server_port = 0
+        self._jsonl_buffer: List[tuple] = []  # (path, line) waiting for the writer
+        self._jsonl_timer: Optional[threading.Timer] = None
+        self._jsonl_write_lock = threading.Lock()
+
+    def configure(
+        self, ring_size: int, jsonl_path: str = "", prometheus_port: int = 0
+    ) -> None:
+        with self._lock:
+            if ring_size > 0 and ring_size != self._ring.maxlen:
+                self._ring = deque(self._ring, maxlen=ring_size)
+            self._jsonl_path = jsonl_path or ""
+        if prometheus_port != self._server_port:
+            self._restart_server(prometheus_port)
+
+    def add_sink(self, sink: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._sinks.append(sink)
+
+    def record(self, event: str, **fields: Any) -> None:
+        entry = {"event": event, "ts": round(time.time(), 3), **fields}
+        with self._lock:
+            self._ring.append(entry)
+            self._event_counts[event] = self._event_counts.get(event, 0) + 1
+            for field, value in fields.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if field.endswith("_ms"):
+                    stats = self._timings.setdefault((event, field), [0, 0.0, 0.0])
+                    stats[0] += 1
+                    stats[1] += value
+                    stats[2] = max(stats[2], value)
+                else:
+                    key = (event, field)
+                    self._totals[key] = self._totals.get(key, 0) + value
+            sinks = list(self._sinks)
+            if self._jsonl_path:
+                self._jsonl_buffer.append(
+                    (
+                        self._jsonl_path,
+                        json.dumps(entry, ensure_ascii=False, default=str),
+                    )
+                )
+                if self._jsonl_timer is None:
+                    timer = threading.Timer(
+                        METRICS_JSONL_FLUSH_INTERVAL, self.flush_jsonl
+                    )
+                    timer.daemon = True
+                    self._jsonl_timer = timer
+                    timer.start()
+
+        for sink in sinks:
+            try:
+                sink(entry)
+            except Exception as e:
+                logger.warning(f"[Metrics] Sink error: {e}")
+
+    def flush_jsonl(self) -> int:
+        """Append buffered JSONL lines to their files. Returns the number written."""
+        with self._lock:
+            buffered = self._jsonl_buffer
+            self._jsonl_buffer = []
+            self._jsonl_timer = None
+        if not buffered:
+            return 0
+
+        lines_by_path: Dict[str, List[str]] = {}
+        for path, line in buffered:
+            lines_by_path.setdefault(path, []).append(line)
+        with self._jsonl_write_lock:
+            for path, lines in lines_by_path.items():
+                try:
+                    with open(path, "a", encoding="utf-8") as fh:
+                        fh.write("\n".join(lines) + "\n")
+                except Exception as e:
+                    logger.warning(f"[Metrics] JSONL sink error: {e}")
+        return len(buffered)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            events = list(self._ring)
+        return events[-limit:] if limit else events
+
+    def render_prometheus(self) -> str:
+        prefix = self.PREFIX
+        with self._lock:
+            event_counts = dict(self._event_counts)
+            timings = {key: list(value) for key, value in self._timings.items()}
+            totals = dict(self._totals)
+
+        lines = [f"# TYPE {prefix}_events_total counter"]
+        for event, count in sorted(event_counts.items()):
+            lines.append(f'{prefix}_events_total{{event="{event}"}} {count}')
+        lines.append(f"# TYPE {prefix}_duration_ms summary")
+        for (event, field), (count, total, _) in sorted(timings.items()):
+            labels = f'event="{event}",phase="{field[:-3]}"'
+            lines.append(f"{prefix}_duration_ms_sum{{{labels}}} {round(total, 3)}")
+            lines.append(f"{prefix}_duration_ms_count{{{labels}}} {count}")
+        lines.append(f"# TYPE {prefix}_duration_ms_max gauge")
+        for (event, field), (_, _, maximum) in sorted(timings.items()):
+            labels = f'event="{event}",phase="{field[:-3]}"'
+            lines.append(f"{prefix}_duration_ms_max{{{labels}}} {round(maximum, 3)}")
+        lines.append(f"# TYPE {prefix}_value_total counter")
+        for (event, field), total in sorted(totals.items()):
+            lines.append(
+                f'{prefix}_value_total{{event="{event}",field="{field}"}} {total}'
+            )
+
+        cache_stats = [ESTIMATE_TOKEN_CACHE.stats(), EXACT_TOKEN_CACHE.stats()]
+        for metric, key, metric_type in (
+            ("token_cache_hit_ratio", "hit_ratio", "gauge"),
+            ("token_cache_entries", "entries", "gauge"),
+            ("token_cache_evictions_total", "evictions", "counter"),
+        ):
+            lines.append(f"# TYPE {prefix}_{metric} {metric_type}")
+            for stats in cache_stats:
+                lines.append(
+                    f'{prefix}_{metric}{{cache="{stats["name"]}"}} {stats[key]}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def _restart_server(self, port: int) -> None:
+        # The server slot is process-wide: a reloaded copy of this module must
+        # close the server still bound by the previous copy before binding again.
+        holder = _get_metrics_server_holder()
+        with holder.lock:
+            if holder.server is not None:
+                holder.server.shutdown()
+                holder.server.server_close()
+                holder.server = None
+            self._server_port = port
+            if port <= 0:
+                return
+
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            metrics = self
+
+            class _MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    payload = metrics.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+
+                def log_message(self, format, *args):
+                    return
+
+            try:
+                server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning(
+                    f"[Metrics] Could not serve Prometheus metrics on :{port}: {e}"
+                )
+                return
+            holder.server = server
+            threading.Thread(
+                target=server.serve_forever, name="acc-metrics", daemon=True
+            ).start()
+        logger.info(f"[Metrics] Serving Prometheus metrics on :{port}")
+
+
+def _get_metrics_server_holder() -> types.ModuleType:
+    """Process-wide slot for the Prometheus server.
+
+    Open WebUI re-executes this module when the function is reloaded, so module
+    globals start fresh; the slot is kept in `sys.modules` instead.
+    """
+    holder = sys.modules.get(METRICS_SERVER_HOLDER)
+    if holder is None:
+        candidate = types.ModuleType(METRICS_SERVER_HOLDER)
+        candidate.server = None
+        candidate.lock = threading.Lock()
+        holder = sys.modules.setdefault(METRICS_SERVER_HOLDER, candidate)
+    return holder
+
+
+METRICS = CompressionMetrics()
+
+
 def _estimate_text_tokens(text: str) -> int:
     """Fast token estimate using C-backed string primitives."""
     if not text:
         return 0
+    return ESTIMATE_TOKEN_CACHE.get_or_compute(text, _estimate_text_tokens_uncached)
 
-    char_count = len(text)
-    spaces = text.count(" ") + text.count("\t")
-    newlines = text.count("\n") + text.count("\r")
 
-    if text.isascii():
-        punctuation = sum(text.count(ch) for ch in ASCII_PUNCTUATION_CHARS)
+def _estimate_text_tokens_uncached(text: str) -> int:
+    if not text:
+        return 0
+
+    char_count = len(text)
+    # Count on UTF-8 bytes: whitespace and punctuation are single ASCII bytes, and
+    # bytes.count/translate avoid per-character Python work.
+    is_ascii = text.isascii()
+    encoded = text.encode("ascii" if is_ascii else "utf-8")
+    ascii_part = encoded if is_ascii else encoded.translate(None, NON_ASCII_BYTES)
+    spaces = ascii_part.count(b" ") + ascii_part.count(b"\t")
+    newlines = ascii_part.count(b"\n") + ascii_part.count(b"\r")
+
+    if is_ascii:
+        punctuation = char_count - len(encoded.translate(None, ASCII_PUNCTUATION_BYTES))
         codeish = newlines > 0 or punctuation * 6 > char_count
         if codeish:
             estimate = (
@@ -640,9 +1192,11 @@ def _estimate_text_tokens(text: str) -> int:
 
         return max(1, math.ceil(estimate))
 
-    ascii_chars = len(text.encode("ascii", "ignore"))
-    non_ascii_bytes = len(text.encode("utf-8")) - ascii_chars
-    script_counts, script_profile = _sample_script_mix(text)
+    ascii_chars = len(ascii_part)
+    non_ascii_bytes = len(encoded) - ascii_chars
+    script_counts, script_profile = _classify_script_sample(
+        _non_ascii_sample(encoded, 256)
+    )
     sampled_total = max(1, sum(script_counts.values()))
     byte_coefficient = sum(
         (script_counts[key] / sampled_total) * SCRIPT_BYTE_COEFFICIENTS[key]
@@ -665,23 +1219,60 @@ def _estimate_text_tokens(text: str) -> int:
     return max(1, math.ceil(estimate))
 
 
-@lru_cache(maxsize=1024)
-def _get_cached_tokens(text: str) -> int:
-    """Calculates tokens with LRU caching for exact string matches."""
+def _estimate_text_token_list(texts: List[str]) -> List[int]:
+    """Per-text token estimates for a list of texts, in order (each served from the estimate cache)."""
+    return [_estimate_text_tokens(text) if text else 0 for text in texts]
+
+
+def _scan_tool_block_result_spans(content: str) -> tuple:
+    """Single pass over `content` for the result="..." value of each tool-call card.
+
+    Each block runs from `<details type="tool_calls"` to the next `</details>`; the
+    first `result="..."` attribute inside it is reported, as the old regex did.
+    """
+    spans = []
+    position = content.find(TOOL_BLOCK_OPEN)
+    while position != -1:
+        block_end = content.find(TOOL_BLOCK_CLOSE, position + len(TOOL_BLOCK_OPEN))
+        if block_end == -1:
+            break
+        value_start = content.find(TOOL_BLOCK_RESULT_ATTR, position, block_end)
+        if value_start != -1:
+            value_start += len(TOOL_BLOCK_RESULT_ATTR)
+            value_end = content.find('"', value_start, block_end)
+            if value_end != -1:
+                spans.append((value_start, value_end))
+        position = content.find(TOOL_BLOCK_OPEN, block_end + len(TOOL_BLOCK_CLOSE))
+    return tuple(spans)
+
+
+def _encode_token_count(encoding: Any, text: str) -> int:
+    try:
+        return len(encoding.encode(text))
+    except Exception as e:
+        logger.warning(
+            f"[Token Count] tiktoken error: {e}, falling back to character estimation"
+        )
+        return _estimate_text_tokens(text)
+
+
+def _get_cached_tokens(text: str, tokenizer: Optional[str] = None) -> int:
+    """Calculates tokens with a digest-keyed, byte-bounded cache per encoding.
+
+    Until the encoding is loaded (or when tiktoken is unavailable) the heuristic
+    estimate is returned and not cached as an exact count.
+    """
     if not text:
         return 0
-    if TIKTOKEN_ENCODING:
-        try:
-            # tiktoken logic is relatively fast, but caching it based on exact string match
-            # turns O(N) encoding time to O(1) dictionary lookup for historical messages.
-            return len(TIKTOKEN_ENCODING.encode(text))
-        except Exception as e:
-            logger.warning(
-                f"[Token Count] tiktoken error: {e}, falling back to character estimation"
-            )
-            pass
-
-    return _estimate_text_tokens(text)
+    name = tokenizer or DEFAULT_TOKENIZER_ENCODING
+    encoding = TOKENIZER_REGISTRY.get(name)
+    if encoding is None:
+        return _estimate_text_tokens(text)
+    # tiktoken logic is relatively fast, but caching it based on content digest
+    # turns O(N) encoding time to O(1) dictionary lookup for historical messages.
+    return TOKENIZER_REGISTRY.cache_for(name).get_or_compute(
+        text, functools.partial(_encode_token_count, encoding)
+    )
 
 
 class Filter:
@@ -705,11 +1296,60 @@ class Filter:
             "de-AT": "de-DE",
         }
 
-        # Concurrency control: Lock per chat session
-        self._chat_locks = {}
+        # Background summary jobs: global cap, one running + one queued job per chat
+        self._summary_scheduler = SummaryJobScheduler()
+        # Per-chat token ledger: chat_id -> {message key: (content digest, tokens)}
+        self._token_ledgers: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()
+        self._token_ledger_lock = threading.Lock()
+        # Summary injection cache: chat_id -> {"version", "record", "prefix"}
+        self._summary_injection_cache: "OrderedDict[str, Dict[str, Any]]" = (
+            OrderedDict()
+        )
+        # Touched from the event loop, to_thread workers and the write-behind timer
+        self._summary_injection_lock = threading.Lock()
+        # Write-behind queue for summary upserts: chat_id -> pending row
+        self._pending_summary_writes: Dict[str, Dict[str, Any]] = {}
+        self._summary_write_lock = threading.Lock()
+        self._summary_flush_timer: Optional[threading.Timer] = None
+        self._summary_write_attempts: Dict[str, int] = {}
+        self._summary_flush_failures = 0
+        # Map-step summaries keyed by sha256(model + window text)
+        self._summary_chunk_cache: "OrderedDict[str, str]" = OrderedDict()
+        # Last injected [head + summary] fingerprint per chat: chat_id -> (version, digest)
+        self._summary_prefix_fingerprints: "OrderedDict[str, tuple]" = OrderedDict()
+        self._summary_prefix_stats: Dict[str, int] = {
+            "new": 0,
+            "stable": 0,
+            "boundary": 0,
+            "drift": 0,
+        }
+        # Early (pre-threshold) first summaries held back from inlet: chat_id -> covered target
+        self._early_summaries: "OrderedDict[str, int]" = OrderedDict()
         self._pending_inlet_messages: Dict[str, List[Dict[str, Any]]] = {}
+        # Trimmed tool outputs waiting to be offloaded (digest -> (chat_id, content)) and digests already stored
+        self._pending_tool_offloads: Dict[str, tuple] = {}
+        self._offloaded_digests: "OrderedDict[str, None]" = OrderedDict()
+        # The offload table is created on the first flush; retention sweeps are spaced out
+        self._tool_offload_table_ready = False
+        self._tool_offload_last_cleanup = 0.0
+        # Structured timings/counters (process-wide); sinks are configured from valves on use
+        self._metrics = METRICS
+        # Buffered frontend console logs per request: event_call -> {"entries", "chars"}
+        self._frontend_log_buffers: Dict[Any, Dict[str, Any]] = {}
+        self._tool_offload_lock = threading.Lock()
         self._init_database()
 
+    def _record_metric(self, event: str, **fields: Any) -> None:
+        """Record a structured metrics event when `enable_metrics` is on."""
+        if not self.valves.enable_metrics:
+            return
+        self._metrics.configure(
+            self.valves.metrics_ring_size,
+            self.valves.metrics_jsonl_path,
+            self.valves.metrics_prometheus_port,
+        )
+        self._metrics.record(event, **fields)
+
     def _resolve_language(self, lang: str) -> str:
         """Resolve the best matching language code from the TRANSLATIONS dict."""
         target_lang = lang
@@ -746,12 +1386,6 @@ class Filter:
                 logger.warning(f"Translation formatting failed for {key}: {e}")
         return text
 
-    def _get_chat_lock(self, chat_id: str) -> asyncio.Lock:
-        """Get or create an asyncio lock for a specific chat ID."""
-        if chat_id not in self._chat_locks:
-            self._chat_locks[chat_id] = asyncio.Lock()
-        return self._chat_locks[chat_id]
-
     def _capture_pending_inlet_messages(
         self, chat_id: str, messages: List[Dict[str, Any]]
     ) -> None:
@@ -826,21 +1460,50 @@ class Filter:
         )
 
     def _build_summary_message(
-        self, summary_text: str, lang: str, covered_until: int
+        self,
+        summary_text: str,
+        lang: str,
+        covered_until: int,
+        version: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Create a summary marker message with original-history progress metadata."""
+        """Create a summary marker message with original-history progress metadata.
+
+        With a `version`, the content starts with a fixed marker so the provider
+        sees the same bytes until the summary itself changes.
+        """
         summary_content = (
             self._get_translation(lang, "summary_prompt_prefix")
             + f"{summary_text}"
             + self._get_translation(lang, "summary_prompt_suffix")
         )
+        metadata = {
+            "is_summary": True,
+            "source": SUMMARY_METADATA_SOURCE,
+            "covered_until": max(0, int(covered_until)),
+        }
+        if version:
+            summary_content = f"<!-- {SUMMARY_VERSION_MARKER} {version} -->\n" + (
+                summary_content
+            )
+            metadata["summary_version"] = version
+        return {"role": "assistant", "content": summary_content, "metadata": metadata}
+
+    def _build_external_reference_message(
+        self, external_refs: Dict[str, Any], covered_until: int
+    ) -> Dict[str, Any]:
+        """Create the standalone contextual block for referenced chats."""
         return {
             "role": "assistant",
-            "content": summary_content,
+            "content": (
+                f"<external_references>\n{external_refs.get('content', '')}\n</external_references>\n\n"
+                + "Here are references to other conversations that may be relevant to this discussion."
+            ),
             "metadata": {
                 "is_summary": True,
-                "source": SUMMARY_METADATA_SOURCE,
-                "covered_until": max(0, int(covered_until)),
+                "is_external_references": True,
+                "source": "external_references",
+                "covered_until": covered_until,
+                "external_references": external_refs.get("references", []),
             },
         }
 
@@ -912,7 +1575,10 @@ class Filter:
     def _reconstruct_active_history_branch(
         self, history_messages: Any, current_id: Optional[str]
     ) -> List[Dict[str, Any]]:
-        """Rebuild the active chat branch from OpenWebUI `history.messages` data."""
+        """
+        Rebuild the active chat branch from OpenWebUI `history.messages` data.
+        Returns the history nodes themselves (no copies); treat them as read-only.
+        """
         if not isinstance(history_messages, dict) or not history_messages:
             return []
 
@@ -927,7 +1593,7 @@ class Filter:
                 if not isinstance(node, dict):
                     break
 
-                ordered_messages.append(deepcopy(node))
+                ordered_messages.append(node)
                 cursor = node.get("parentId") or node.get("parent_id")
 
             if ordered_messages:
@@ -935,6 +1601,8 @@ class Filter:
                 return ordered_messages
 
         sortable_messages = []
+        already_sorted = True
+        previous_timestamp = float("-inf")
         for index, node in enumerate(history_messages.values()):
             if not isinstance(node, dict):
                 continue
@@ -945,13 +1613,26 @@ class Filter:
             if not isinstance(timestamp, (int, float)):
                 timestamp = index
 
-            sortable_messages.append((float(timestamp), index, deepcopy(node)))
+            timestamp = float(timestamp)
+            if timestamp < previous_timestamp:
+                already_sorted = False
+            previous_timestamp = timestamp
+            sortable_messages.append((timestamp, index, node))
 
-        sortable_messages.sort(key=lambda item: (item[0], item[1]))
+        # History dicts are normally stored in creation order; only sort when they are not.
+        if not already_sorted:
+            sortable_messages.sort(key=lambda item: (item[0], item[1]))
         return [message for _, _, message in sortable_messages]
 
     def _load_full_chat_messages(self, chat_id: str) -> List[Dict[str, Any]]:
-        """Load the full persisted chat history for summary decisions when available."""
+        """
+        Load the full persisted chat history for summary decisions when available.
+
+        The returned messages are views into the freshly loaded chat payload rather than
+        deep copies, so large tool outputs and images are not duplicated. Callers must not
+        mutate them in place; the outlet path gets per-message copies from
+        `_unfold_messages` before anything is changed.
+        """
         if not chat_id or Chats is None:
             return []
 
@@ -967,7 +1648,7 @@ class Filter:
 
         direct_messages = chat_payload.get("messages")
         if isinstance(direct_messages, list) and direct_messages:
-            return deepcopy(direct_messages)
+            return list(direct_messages)
 
         history = chat_payload.get("history")
         if not isinstance(history, dict):
@@ -1034,9 +1715,17 @@ class Filter:
         return sum(1 for old_id, new_id in rewritten_ids.items() if old_id != new_id)
 
     def _trim_native_tool_outputs(
-        self, messages: List[Dict], lang: str, collect_debug: bool = False
+        self,
+        messages: List[Dict],
+        lang: str,
+        collect_debug: bool = False,
+        chat_id: Optional[str] = None,
     ) -> tuple[int, Optional[Dict[str, Any]]]:
-        """Collapse verbose native tool outputs while preserving tool-call structure."""
+        """Collapse verbose native tool outputs while preserving tool-call structure.
+
+        Trimmed outputs are offloaded under `chat_id` when offload is enabled;
+        without a chat ID they are only collapsed.
+        """
         trimmed_count = 0
         tool_trim_threshold_chars = self.valves.tool_trim_threshold_chars
         collapsed_text = self._get_translation(lang, "content_collapsed").strip()
@@ -1115,8 +1804,13 @@ class Filter:
                     metadata = {}
                 metadata["is_trimmed"] = True
                 metadata["trimmed_by"] = SUMMARY_METADATA_SOURCE
+                placeholder = collapsed_text
+                ref = self._offload_tool_output(tool_message.get("content"), chat_id)
+                if ref:
+                    metadata["offload_ref"] = ref
+                    placeholder = f"{collapsed_text} [{ref}]"
                 tool_message["metadata"] = metadata
-                tool_message["content"] = collapsed_text
+                tool_message["content"] = placeholder
                 trimmed_count += 1
 
             if assistant_followup is not None:
@@ -1137,7 +1831,7 @@ class Filter:
             content = message.get("content", "")
             if (
                 not isinstance(content, str)
-                or '<details type="tool_calls"' not in content
+                or TOOL_BLOCK_OPEN not in content
             ):
                 continue
 
@@ -1145,15 +1839,11 @@ class Filter:
             if debug_stats is not None:
                 debug_stats["detail_messages_checked"] += 1
 
-            def _replace_tool_block(match: re.Match) -> str:
-                nonlocal trimmed_blocks
-                block = match.group(0)
-                result_match = re.search(r'result="([^"]*)"', block)
-
-                if not result_match:
-                    return block
-
-                result_chars = len(result_match.group(1))
+            # One find()-based pass over the content; no regex backtracking per card.
+            pieces = []
+            cursor = 0
+            for value_start, value_end in _scan_tool_block_result_spans(content):
+                result_chars = value_end - value_start
                 if debug_stats is not None:
                     debug_stats["detail_blocks_found"] += 1
                     debug_stats["largest_detail_result_chars"] = max(
@@ -1163,26 +1853,23 @@ class Filter:
                         debug_stats["detail_block_samples"].append(result_chars)
 
                 if result_chars < tool_trim_threshold_chars:
-                    return block
+                    continue
 
                 if debug_stats is not None:
                     debug_stats["detail_blocks_over_threshold"] += 1
                 trimmed_blocks += 1
-                return re.sub(
-                    r'result="([^"]*)"',
-                    f'result="&quot;{collapsed_text}&quot;"',
-                    block,
-                    count=1,
+                ref = self._offload_tool_output(
+                    content[value_start:value_end], chat_id
                 )
-
-            new_content = re.sub(
-                r'<details type="tool_calls"[\s\S]*?</details>',
-                _replace_tool_block,
-                content,
-            )
+                placeholder = f"{collapsed_text} [{ref}]" if ref else collapsed_text
+                pieces.append(content[cursor:value_start])
+                pieces.append(f"&quot;{placeholder}&quot;")
+                cursor = value_end
 
             if trimmed_blocks <= 0:
                 continue
+            pieces.append(content[cursor:])
+            new_content = "".join(pieces)
 
             metadata = message.get("metadata", {})
             if not isinstance(metadata, dict):
@@ -1195,6 +1882,251 @@ class Filter:
 
         return trimmed_count, debug_stats
 
+    def _offload_tool_output(
+        self, content: Any, chat_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Queue a trimmed tool output for the offload store and return its reference.
+
+        Outputs are keyed by SHA-256 of their chat ID and content, so the same output
+        trimmed on every turn maps to one row per chat (deleted with that chat) and
+        is only queued until it has been written.
+        """
+        if (
+            not self.valves.enable_tool_output_offload
+            or not chat_id
+            or not isinstance(content, str)
+        ):
+            return None
+        hasher = hashlib.sha256(str(chat_id).encode("utf-8", "surrogatepass"))
+        hasher.update(b"\x00")
+        hasher.update(content.encode("utf-8", "surrogatepass"))
+        digest = hasher.hexdigest()
+        with self._tool_offload_lock:
+            if digest not in self._offloaded_digests:
+                self._pending_tool_offloads[digest] = (chat_id, content)
+        return f"{TOOL_OUTPUT_REF_PREFIX}{digest}"
+
+    def _ensure_tool_offload_table(self) -> None:
+        """Create the offload table the first time this process writes to it."""
+        if self._tool_offload_table_ready or self._db_engine is None:
+            return
+        ToolOutputOffload.__table__.create(bind=self._db_engine, checkfirst=True)
+        self._tool_offload_table_ready = True
+
+    def _flush_tool_offloads(self) -> int:
+        """Write queued tool outputs to the offload store. Returns the number written."""
+        with self._tool_offload_lock:
+            pending = self._pending_tool_offloads
+            self._pending_tool_offloads = {}
+        if not pending:
+            return 0
+
+        try:
+            self._ensure_tool_offload_table()
+            with self._db_session() as session:
+                bind = session.get_bind()
+                dialect_name = getattr(getattr(bind, "dialect", None), "name", "")
+                table = ToolOutputOffload.__table__
+                now = datetime.now(timezone.utc)
+                rows = [
+                    {
+                        "digest": digest,
+                        "chat_id": chat_id,
+                        "content": content,
+                        "char_count": len(content),
+                        "created_at": now,
+                    }
+                    for digest, (chat_id, content) in pending.items()
+                ]
+
+                if dialect_name in ("postgresql", "sqlite"):
+                    if dialect_name == "postgresql":
+                        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+                    else:
+                        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+                    session.execute(
+                        dialect_insert(table)
+                        .values(rows)
+                        .on_conflict_do_nothing(index_elements=[table.c.digest])
+                    )
+                else:
+                    existing = {
+                        row[0]
+                        for row in session.query(ToolOutputOffload.digest).filter(
+                            ToolOutputOffload.digest.in_(list(pending))
+                        )
+                    }
+                    new_rows = [row for row in rows if row["digest"] not in existing]
+                    if new_rows:
+                        session.execute(table.insert(), new_rows)
+                session.commit()
+        except Exception as e:
+            logger.error(
+                f"[Offload] ❌ Failed to store {len(pending)} tool output(s), re-queued for the next flush: {str(e)}"
+            )
+            # Keep failed rows pending: references to them stay expandable from
+            # memory and are written on the next flush.
+            with self._tool_offload_lock:
+                requeued = {**pending, **self._pending_tool_offloads}
+                overflow = len(requeued) - TOOL_OUTPUT_OFFLOAD_PENDING_MAX
+                if overflow > 0:
+                    for digest in list(requeued)[:overflow]:
+                        requeued.pop(digest)
+                    logger.error(
+                        f"[Offload] ❌ Dropped {overflow} unstored tool output(s); their references can no longer be expanded"
+                    )
+                self._pending_tool_offloads = requeued
+            return 0
+
+        with self._tool_offload_lock:
+            for digest in pending:
+                self._offloaded_digests[digest] = None
+                self._offloaded_digests.move_to_end(digest)
+            while len(self._offloaded_digests) > TOOL_OUTPUT_OFFLOAD_KNOWN_MAX:
+                self._offloaded_digests.popitem(last=False)
+
+        if self.valves.debug_mode:
+            logger.info(f"[Offload] Stored {len(pending)} tool output(s)")
+        self._cleanup_tool_offloads()
+        return len(pending)
+
+    def _cleanup_tool_offloads(self, force: bool = False) -> int:
+        """Delete offloaded outputs of deleted chats and, if configured, expired ones.
+
+        Runs at most once per TOOL_OUTPUT_OFFLOAD_CLEANUP_INTERVAL_SECONDS unless
+        forced. Returns the number of rows deleted.
+        """
+        now = time.time()
+        if (
+            not force
+            and now - self._tool_offload_last_cleanup
+            < TOOL_OUTPUT_OFFLOAD_CLEANUP_INTERVAL_SECONDS
+        ):
+            return 0
+        self._tool_offload_last_cleanup = now
+
+        deleted = 0
+        try:
+            with self._db_session() as session:
+                chat_table = getattr(owui_Chat, "__table__", None)
+                if chat_table is not None:
+                    deleted += (
+                        session.query(ToolOutputOffload)
+                        .filter(
+                            ~ToolOutputOffload.chat_id.in_(
+                                session.query(chat_table.c.id)
+                            )
+                        )
+                        .delete(synchronize_session=False)
+                    )
+                retention_days = self.valves.tool_output_offload_retention_days
+                if retention_days > 0:
+                    cutoff = datetime.now(timezone.utc) - timedelta(
+                        days=retention_days
+                    )
+                    deleted += (
+                        session.query(ToolOutputOffload)
+                        .filter(ToolOutputOffload.created_at < cutoff)
+                        .delete(synchronize_session=False)
+                    )
+                session.commit()
+        except Exception as e:
+            logger.error(f"[Offload] ❌ Failed to clean up tool outputs: {str(e)}")
+            return 0
+
+        if deleted:
+            # Deleted rows must be written again if the same output is trimmed later.
+            with self._tool_offload_lock:
+                self._offloaded_digests.clear()
+            if self.valves.debug_mode:
+                logger.info(f"[Offload] Deleted {deleted} stale tool output(s)")
+        return deleted
+
+    def _load_offloaded_tool_outputs(
+        self, digests: List[str], chat_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Fetch a chat's offloaded tool outputs by digest, including ones not flushed yet."""
+        if not chat_id:
+            return {}
+        found: Dict[str, str] = {}
+        with self._tool_offload_lock:
+            for digest in digests:
+                entry = self._pending_tool_offloads.get(digest)
+                if entry is not None and entry[0] == chat_id:
+                    found[digest] = entry[1]
+
+        missing = [digest for digest in digests if digest not in found]
+        if missing:
+            try:
+                self._ensure_tool_offload_table()
+                with self._db_session() as session:
+                    for digest, content in session.query(
+                        ToolOutputOffload.digest, ToolOutputOffload.content
+                    ).filter(
+                        ToolOutputOffload.chat_id == chat_id,
+                        ToolOutputOffload.digest.in_(missing),
+                    ):
+                        found[digest] = content
+            except Exception as e:
+                logger.error(f"[Offload] ❌ Failed to load tool outputs: {str(e)}")
+        return found
+
+    def _expand_offloaded_tool_outputs(
+        self, messages: List[Dict], chat_id: Optional[str] = None
+    ) -> List[Dict]:
+        """Expansion hook: put offloaded tool outputs back in place of their references.
+
+        Only outputs offloaded for `chat_id` are resolved. Messages that reference
+        the offload store are copied, not modified, so read-only history views stay
+        untouched. Unknown references are left as is.
+        """
+        digests = set()
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else None
+            if isinstance(content, str) and TOOL_OUTPUT_REF_PREFIX in content:
+                digests.update(TOOL_OUTPUT_REF_PATTERN.findall(content))
+        if not digests:
+            return messages
+
+        outputs = self._load_offloaded_tool_outputs(sorted(digests), chat_id)
+        unresolved = len(digests) - len(outputs)
+        if unresolved:
+            logger.warning(
+                f"[Offload] ⚠️ {unresolved} offloaded tool output(s) not found; their placeholders are kept"
+            )
+        if not outputs:
+            return messages
+
+        def _restore_result(match: re.Match) -> str:
+            output = outputs.get(match.group(1))
+            return f'result="{output}"' if output is not None else match.group(0)
+
+        expanded = []
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else None
+            if not isinstance(content, str) or TOOL_OUTPUT_REF_PREFIX not in content:
+                expanded.append(message)
+                continue
+
+            metadata = message.get("metadata")
+            ref = metadata.get("offload_ref") if isinstance(metadata, dict) else None
+            output = (
+                outputs.get(ref[len(TOOL_OUTPUT_REF_PREFIX) :])
+                if isinstance(ref, str) and message.get("role") == "tool"
+                else None
+            )
+            if output is not None:
+                new_content = output
+            else:
+                new_content = re.sub(
+                    r'result="&quot;[^"]*?\[tool-output:sha256:([0-9a-f]{64})\]&quot;"',
+                    _restore_result,
+                    content,
+                )
+            expanded.append({**message, "content": new_content})
+        return expanded
+
     def _get_atomic_groups(self, messages: List[Dict]) -> List[List[int]]:
         """
         Groups message indices into atomic units that must be kept or dropped together.
@@ -1287,6 +2219,48 @@ class Filter:
 
         return aligned_start
 
+    def _plan_atomic_group_drop(
+        self,
+        messages: List[Dict],
+        token_counts: List[int],
+        excess_tokens: int,
+        stop_index: Optional[int] = None,
+    ) -> tuple[int, int, int]:
+        """
+        Find how many leading messages to drop to shed `excess_tokens`.
+
+        Builds prefix sums over the atomic groups (the newest group is never
+        dropped) and binary-searches the first cut that frees enough tokens, so
+        the caller can trim the history with a single slice. Messages at or after
+        `stop_index` are kept even if that splits a group.
+
+        Returns (cut_index, dropped_tokens, dropped_groups).
+        """
+        groups = self._get_atomic_groups(messages)
+        if excess_tokens <= 0 or len(groups) <= 1:
+            return 0, 0, 0
+
+        group_ends: List[int] = []
+        prefix_tokens: List[int] = []
+        running = 0
+        for group in groups[:-1]:
+            running += sum(token_counts[i] for i in group)
+            group_ends.append(group[-1] + 1)
+            prefix_tokens.append(running)
+
+        dropped_groups = min(
+            bisect_left(prefix_tokens, excess_tokens) + 1, len(prefix_tokens)
+        )
+        cut_index = group_ends[dropped_groups - 1]
+        dropped_tokens = prefix_tokens[dropped_groups - 1]
+
+        if stop_index is not None and stop_index < cut_index:
+            dropped_groups = bisect_left(group_ends, stop_index + 1)
+            cut_index = stop_index
+            dropped_tokens = sum(token_counts[:stop_index])
+
+        return cut_index, dropped_tokens, dropped_groups
+
     async def _get_user_context(
         self,
         __user__: Optional[Dict[str, Any]],
@@ -1343,8 +2317,8 @@ class Filter:
     def _parse_model_thresholds(self) -> Dict[str, Any]:
         """Parse model_thresholds string into a dictionary.
 
-        Format: model_id:compression_threshold:max_context, model_id2:threshold2:max2
-        Example: gpt-4:8000:32000, claude-3:100000:200000
+        Format: model_id:compression_threshold:max_context[:tokenizer], model_id2:threshold2:max2
+        Example: gpt-4:8000:32000:cl100k_base, claude-3:100000:200000:estimate
 
         Returns cached result if already parsed.
         """
@@ -1362,7 +2336,7 @@ class Filter:
                 continue
 
             parts = entry.split(":")
-            if len(parts) != 3:
+            if len(parts) not in (3, 4):
                 continue
 
             try:
@@ -1374,6 +2348,10 @@ class Filter:
                     "compression_threshold_tokens": compression_threshold,
                     "max_context_tokens": max_context,
                 }
+                if len(parts) == 4 and parts[3].strip():
+                    self._model_thresholds_cache[model_id]["tokenizer"] = parts[
+                        3
+                    ].strip()
             except ValueError:
                 continue
 
@@ -1381,6 +2359,18 @@ class Filter:
 
     @contextlib.contextmanager
     def _db_session(self):
+        """Yield a database session, recording how long it was held as a metric."""
+        started = time.perf_counter()
+        try:
+            with self._open_db_session() as session:
+                yield session
+        finally:
+            self._record_metric(
+                "db", db_ms=round((time.perf_counter() - started) * 1000, 3)
+            )
+
+    @contextlib.contextmanager
+    def _open_db_session(self):
         """Yield a database session using Open WebUI helpers with graceful fallbacks."""
         db_module = self._owui_db
         db_context = None
@@ -1464,14 +2454,24 @@ class Filter:
             ge=0,
             description="When total context Token count exceeds this value, trigger compression (Global Default)",
         )
-        max_context_tokens: int = Field(
+        early_summary_ratio: float = Field(
+            default=0.0,
+            ge=0.0,
+            le=1.0,
+            description="Start the first summary of a chat in the background once history reaches this fraction of compression_threshold_tokens (e.g. 0.8). The summary is held back until the threshold is crossed, then injected immediately. 0 disables.",
+        )
+        max_context_tokens: int = Field(
             default=128000,
             ge=0,
             description="Hard limit for context. Exceeding this value will force removal of earliest messages (Global Default)",
         )
         model_thresholds: str = Field(
             default="",
-            description="Per-model threshold overrides. Format: model_id:compression_threshold:max_context (comma-separated). Example: gpt-4:8000:32000, claude-3:100000:200000",
+            description="Per-model threshold overrides. Format: model_id:compression_threshold:max_context[:tokenizer] (comma-separated). The optional tokenizer is a tiktoken encoding name or 'estimate'. Example: gpt-4:8000:32000:cl100k_base, claude-3:100000:200000:estimate",
+        )
+        tokenizer_encoding: str = Field(
+            default=DEFAULT_TOKENIZER_ENCODING,
+            description="tiktoken encoding for precise counts when model_thresholds names none and tiktoken does not know the model. Use 'estimate' to always use the heuristic estimator. Encodings load in the background; the estimator is used until they are ready.",
         )
 
         keep_first: int = Field(
@@ -1482,6 +2482,10 @@ class Filter:
         keep_last: int = Field(
             default=6, ge=0, description="Always keep the last N full messages."
         )
+        stable_summary_prefix: bool = Field(
+            default=False,
+            description="Keep the injected [head + summary] byte-identical between summary updates so upstream prompt caching can reuse it: the summary carries a version marker and external chat references are sent as a separate message after it.",
+        )
         summary_model: Optional[str] = Field(
             default=None,
             description="The model ID used to generate the summary. If empty, uses the current conversation's model. Used to match configurations in model_thresholds.",
@@ -1526,6 +2530,88 @@ class Filter:
             ge=1,
             description="Trim native tool outputs when their total content length reaches this many characters.",
         )
+        enable_tool_output_offload: bool = Field(
+            default=False,
+            description="Store trimmed tool outputs once per chat in the database, keyed by content hash, and leave a stable reference in the placeholder so they can be expanded on demand (e.g. for summaries). Rows are deleted together with their chat.",
+        )
+        tool_output_offload_retention_days: int = Field(
+            default=0,
+            ge=0,
+            description="Also delete offloaded tool outputs older than this many days. Expired outputs stay collapsed in summaries. Set to 0 to keep them until their chat is deleted.",
+        )
+        batch_token_count_min_chars: int = Field(
+            default=200000,
+            ge=0,
+            description="Use tiktoken's multi-threaded batch encoder for precise counts once the uncounted text reaches this many characters. Set to 0 to disable.",
+        )
+        batch_token_count_threads: int = Field(
+            default=4,
+            ge=1,
+            description="Number of native tiktoken threads used by batched precise token counting.",
+        )
+        summary_write_behind_ms: int = Field(
+            default=0,
+            ge=0,
+            description="Coalesce summary saves for this many milliseconds and flush them as one batched upsert. 0 writes immediately. Pending writes are lost if the worker exits inside the window.",
+        )
+        referenced_chat_concurrency: int = Field(
+            default=4,
+            ge=1,
+            description="Maximum number of referenced chats loaded and summarized in parallel.",
+        )
+        referenced_chat_timeout_seconds: float = Field(
+            default=60.0,
+            ge=0.0,
+            description="Per-chat time limit for loading and summarizing a referenced chat. Chats that time out fall back to direct injection (inlet) or are skipped (background). Set to 0 to disable.",
+        )
+        enable_hierarchical_summary: bool = Field(
+            default=True,
+            description="When the range to summarize exceeds the summary model window, summarize it in windows (map) and merge the window summaries (reduce) instead of dropping the overflow.",
+        )
+        summary_chunk_concurrency: int = Field(
+            default=4,
+            ge=1,
+            description="Maximum number of window summaries generated in parallel by hierarchical summarization.",
+        )
+        summary_chunk_timeout_seconds: float = Field(
+            default=120.0,
+            ge=0.0,
+            description="Per-window time limit for a hierarchical map-step summary. A window that times out fails the hierarchical pass instead of stalling it. Set to 0 to disable.",
+        )
+        max_concurrent_summary_jobs: int = Field(
+            default=2,
+            ge=1,
+            description="Maximum number of background summary jobs running at once across all chats.",
+        )
+        max_queued_summary_jobs: int = Field(
+            default=64,
+            ge=0,
+            description="Maximum number of chats waiting for a summary job. Further chats are dropped until the queue drains; repeat requests for a waiting chat replace its queued job. Jobs that can start immediately are never dropped; 0 disables waiting only.",
+        )
+        enable_metrics: bool = Field(
+            default=False,
+            description="Record structured per-phase timings and counters (inlet preflight, token reduction, summary LLM latency, database time, cache hit ratios).",
+        )
+        metrics_ring_size: int = Field(
+            default=1000,
+            ge=1,
+            description="Number of recent metrics events kept in memory.",
+        )
+        metrics_jsonl_path: str = Field(
+            default="",
+            description="If set, append every metrics event as one JSON line to this file. Lines are buffered and written about once per second by a background thread.",
+        )
+        frontend_log_batch_max_chars: int = Field(
+            default=16000,
+            ge=0,
+            description="Buffer frontend console debug logs per request and send them as one grouped event at phase boundaries or once this many characters are buffered. 0 sends every log line immediately.",
+        )
+        metrics_prometheus_port: int = Field(
+            default=0,
+            ge=0,
+            le=65535,
+            description="If set, serve aggregated metrics in Prometheus text format on this port (all interfaces). One server per process; a reloaded filter takes it over. 0 disables.",
+        )
 
     async def _handle_external_chat_references(
         self,
@@ -1573,20 +2659,54 @@ class Filter:
             else max_summary_tokens
         )
 
-        referenced_summaries = []
+        # Preload every referenced chat's summary row in one round-trip.
+        preloaded_summaries = await asyncio.to_thread(
+            self._load_summary_records,
+            [f.get("id") for f in chat_files if isinstance(f.get("id"), str)],
+        )
+
+        # Resolve titles and load raw history for every chat without a cached
+        # summary in parallel; budget decisions below stay in reference order.
+        ref_chats = []
         for chat_file in chat_files:
             ref_chat_id = chat_file.get("id")
+            if not ref_chat_id:
+                continue
             if isinstance(ref_chat_id, str):
                 ref_chat_title = chat_file.get("name", f"Chat {ref_chat_id[:8]}...")
             else:
                 ref_chat_title = chat_file.get("name", "Unknown Chat")
+            ref_chats.append((ref_chat_id, ref_chat_title))
 
-            if not ref_chat_id:
-                continue
-
-            summary_record = await asyncio.to_thread(
-                self._load_summary_record, ref_chat_id
+        pending_loads = [
+            (ref_chat_id, ref_chat_title)
+            for ref_chat_id, ref_chat_title in ref_chats
+            if not (
+                preloaded_summaries.get(ref_chat_id)
+                and preloaded_summaries[ref_chat_id].summary
             )
+        ]
+        loaded_messages = await self._run_referenced_chat_jobs(
+            [
+                (
+                    ref_chat_title,
+                    functools.partial(
+                        asyncio.to_thread, self._load_full_chat_messages, ref_chat_id
+                    ),
+                )
+                for ref_chat_id, ref_chat_title in pending_loads
+            ],
+            __event_call__=__event_call__,
+        )
+        messages_by_chat = {
+            ref_chat_id: chat_messages
+            for (ref_chat_id, _), chat_messages in zip(pending_loads, loaded_messages)
+        }
+
+        referenced_summaries = []
+        summary_jobs = []
+        for ref_chat_id, ref_chat_title in ref_chats:
+            summary_record = preloaded_summaries.get(ref_chat_id)
 
             if summary_record and summary_record.summary:
                 remaining_direct_budget = max(
@@ -1606,145 +2726,202 @@ class Filter:
                     await self._log(
                         f"[Inlet] ✅ Found existing summary for referenced chat '{ref_chat_title}' ({len(summary_record.summary)} chars)",
                         event_call=__event_call__,
+                    )
+                continue
+
+            chat_messages = messages_by_chat.get(ref_chat_id)
+            if not chat_messages:
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] ⚠️ No messages found for '{ref_chat_title}', skipping",
+                        event_call=__event_call__,
+                    )
+                continue
+
+            conversation_text = self._format_messages_for_summary(chat_messages)
+            estimated_tokens = _estimate_text_tokens(conversation_text)
+            inject_full_chat = estimated_tokens <= max(0, remaining_direct_budget)
+
+            if inject_full_chat:
+                referenced_summaries.append(
+                    {
+                        "chat_id": ref_chat_id,
+                        "title": ref_chat_title,
+                        "summary": conversation_text,
+                        "type": "full",
+                    }
                 )
-            else:
-                chat_messages = await asyncio.to_thread(
-                    self._load_full_chat_messages, ref_chat_id
+                remaining_direct_budget = max(
+                    0, remaining_direct_budget - estimated_tokens
                 )
-                if not chat_messages:
-                    if __event_call__:
-                        await self._log(
-                            f"[Inlet] ⚠️ No messages found for '{ref_chat_title}', skipping",
-                            event_call=__event_call__,
-                        )
-                    continue
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] 📄 Chat '{ref_chat_title}' fits current model budget ({estimated_tokens} tokens), injecting full content",
+                        event_call=__event_call__,
+                    )
+                continue
 
-                conversation_text = self._format_messages_for_summary(chat_messages)
-                estimated_tokens = _estimate_text_tokens(conversation_text)
-                inject_full_chat = estimated_tokens <= max(0, remaining_direct_budget)
+            summary_input_text = conversation_text
+            covered_message_count = len(chat_messages)
+            covers_full_history = True
+            hierarchical_messages = None
 
-                if inject_full_chat:
-                    referenced_summaries.append(
-                        {
-                            "chat_id": ref_chat_id,
-                            "title": ref_chat_title,
-                            "summary": conversation_text,
-                            "type": "full",
-                        }
-                    )
-                    remaining_direct_budget = max(
-                        0, remaining_direct_budget - estimated_tokens
-                    )
+            if (
+                summary_model_max_context > 0
+                and estimated_tokens > summary_model_max_context
+            ):
+                summary_input_text = self._truncate_messages_for_summary(
+                    chat_messages, summary_model_max_context
+                )
+                truncated_tokens = _estimate_text_tokens(summary_input_text)
+                covered_message_count = 0
+                covers_full_history = False
+                if self.valves.enable_hierarchical_summary:
+                    # Summarized in windows; the truncated text is only the fallback.
+                    hierarchical_messages = chat_messages
                     if __event_call__:
                         await self._log(
-                            f"[Inlet] 📄 Chat '{ref_chat_title}' fits current model budget ({estimated_tokens} tokens), injecting full content",
+                            f"[Inlet] 🧩 Chat '{ref_chat_title}' exceeds summary input budget ({estimated_tokens} tokens), summarizing it in windows",
                             event_call=__event_call__,
                         )
-                else:
-                    summary_input_text = conversation_text
-                    covered_message_count = len(chat_messages)
-                    covers_full_history = True
+                elif __event_call__:
+                    await self._log(
+                        f"[Inlet] ✂️ Chat '{ref_chat_title}' exceeds summary input budget, truncating recent window from {estimated_tokens} to {truncated_tokens} tokens before summarization",
+                        event_call=__event_call__,
+                    )
 
-                    if (
-                        summary_model_max_context > 0
-                        and estimated_tokens > summary_model_max_context
-                    ):
-                        summary_input_text = self._truncate_messages_for_summary(
-                            chat_messages, summary_model_max_context
-                        )
-                        truncated_tokens = _estimate_text_tokens(summary_input_text)
-                        covered_message_count = 0
-                        covers_full_history = False
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] ✂️ Chat '{ref_chat_title}' exceeds summary input budget, truncating recent window from {estimated_tokens} to {truncated_tokens} tokens before summarization",
-                                event_call=__event_call__,
-                            )
+            # Summaries run concurrently, so reserve their worst-case size now:
+            # the injected text is never longer than its input or max_summary_tokens.
+            remaining_direct_budget = max(
+                0,
+                remaining_direct_budget
+                - min(_estimate_text_tokens(summary_input_text), max_summary_tokens),
+            )
 
-                    summary = ""
-                    generated_with_llm = False
+            ref = {
+                "chat_id": ref_chat_id,
+                "title": ref_chat_title,
+                "summary": summary_input_text,
+                "type": "direct_fallback",
+            }
+            referenced_summaries.append(ref)
+            summary_jobs.append(
+                {
+                    "ref": ref,
+                    "input_text": summary_input_text,
+                    "messages": hierarchical_messages,
+                    "covers_full_history": covers_full_history,
+                    "covered_message_count": covered_message_count,
+                }
+            )
 
-                    if isinstance(user_data, dict) and user_data.get("id"):
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] 🤖 Generating referenced chat summary for '{ref_chat_title}' with model '{summary_model}'",
-                                event_call=__event_call__,
-                            )
-                        try:
-                            summary = await self._call_summary_llm(
-                                summary_input_text,
-                                {"model": summary_model},
-                                user_data,
-                                __event_call__,
-                                __request__,
-                                previous_summary=None,
-                            )
-                            generated_with_llm = bool(summary)
-                        except Exception as exc:
-                            logger.warning(
-                                "[Inlet] Referenced chat summary failed for '%s': %s",
-                                ref_chat_title,
-                                exc,
-                            )
-                            if __event_call__:
-                                await self._log(
-                                    f"[Inlet] ⚠️ Referenced chat summary failed for '{ref_chat_title}', falling back to direct contextual injection: {exc}",
-                                    log_type="warning",
-                                    event_call=__event_call__,
-                                )
-                    else:
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] ⚠️ Missing user context for '{ref_chat_title}', falling back to direct contextual injection without LLM summary",
-                                event_call=__event_call__,
-                            )
+        has_user = isinstance(user_data, dict) and bool(user_data.get("id"))
 
-                    if not summary:
-                        summary = summary_input_text
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] 📎 Falling back to direct contextual injection for '{ref_chat_title}'",
-                                event_call=__event_call__,
-                            )
+        async def summarize_reference(job: Dict[str, Any]):
+            ref = job["ref"]
+            if __event_call__:
+                await self._log(
+                    f"[Inlet] 🤖 Generating referenced chat summary for '{ref['title']}' with model '{summary_model}'",
+                    event_call=__event_call__,
+                )
+            try:
+                if job["messages"]:
+                    summary = await self._summarize_hierarchically(
+                        job["messages"],
+                        summary_model,
+                        {"model": summary_model},
+                        user_data,
+                        self._compute_summary_request_limits(
+                            summary_model_max_context
+                        )["max_input_tokens"],
+                        __event_call__=__event_call__,
+                        __request__=__request__,
+                    )
+                    if summary:
+                        job["covers_full_history"] = True
+                        job["covered_message_count"] = len(job["messages"])
+                        return summary
+                return await self._call_summary_llm(
+                    job["input_text"],
+                    {"model": summary_model},
+                    user_data,
+                    __event_call__,
+                    __request__,
+                    previous_summary=None,
+                )
+            except Exception as exc:
+                logger.warning(
+                    "[Inlet] Referenced chat summary failed for '%s': %s",
+                    ref["title"],
+                    exc,
+                )
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] ⚠️ Referenced chat summary failed for '{ref['title']}', falling back to direct contextual injection: {exc}",
+                        log_type="warning",
+                        event_call=__event_call__,
+                    )
+                return ""
 
-                    summary_estimate = _estimate_text_tokens(summary)
-                    if summary_estimate > max_summary_tokens:
-                        target_chars = max(
-                            1, int(len(summary) * max_summary_tokens / summary_estimate)
-                        )
-                        summary = summary[:target_chars]
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] ✂️ Trimmed injected context for '{ref_chat_title}' to stay near {max_summary_tokens} tokens",
-                                event_call=__event_call__,
-                            )
-                        summary_estimate = _estimate_text_tokens(summary)
+        if has_user and summary_jobs:
+            generated = await self._run_referenced_chat_jobs(
+                [
+                    (job["ref"]["title"], functools.partial(summarize_reference, job))
+                    for job in summary_jobs
+                ],
+                __event_call__=__event_call__,
+            )
+        else:
+            generated = [None] * len(summary_jobs)
+            for job in summary_jobs:
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] ⚠️ Missing user context for '{job['ref']['title']}', falling back to direct contextual injection without LLM summary",
+                        event_call=__event_call__,
+                    )
+
+        for job, summary in zip(summary_jobs, generated):
+            ref = job["ref"]
+            ref_chat_title = ref["title"]
+            covers_full_history = job["covers_full_history"]
+            covered_message_count = job["covered_message_count"]
+            generated_with_llm = bool(summary)
 
-                    remaining_direct_budget = max(
-                        0, remaining_direct_budget - summary_estimate
+            if not summary:
+                summary = job["input_text"]
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] 📎 Falling back to direct contextual injection for '{ref_chat_title}'",
+                        event_call=__event_call__,
                     )
 
-                    referenced_summaries.append(
-                        {
-                            "chat_id": ref_chat_id,
-                            "title": ref_chat_title,
-                            "summary": summary,
-                            "type": "generated_summary" if generated_with_llm else "direct_fallback",
-                        }
+            summary_estimate = _estimate_text_tokens(summary)
+            if summary_estimate > max_summary_tokens:
+                target_chars = max(
+                    1, int(len(summary) * max_summary_tokens / summary_estimate)
+                )
+                summary = summary[:target_chars]
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] ✂️ Trimmed injected context for '{ref_chat_title}' to stay near {max_summary_tokens} tokens",
+                        event_call=__event_call__,
                     )
 
-                    if generated_with_llm and covers_full_history and covered_message_count > 0:
-                        await asyncio.to_thread(
-                            self._save_summary,
-                            ref_chat_id,
-                            summary,
-                            covered_message_count,
-                        )
-                        if __event_call__:
-                            await self._log(
-                                f"[Inlet] 💾 Saved summary cache for '{ref_chat_title}'",
-                                event_call=__event_call__,
-                            )
+            ref["summary"] = summary
+            ref["type"] = "generated_summary" if generated_with_llm else "direct_fallback"
+
+            if generated_with_llm and covers_full_history and covered_message_count > 0:
+                await asyncio.to_thread(
+                    self._save_summary,
+                    ref["chat_id"],
+                    summary,
+                    covered_message_count,
+                )
+                if __event_call__:
+                    await self._log(
+                        f"[Inlet] 💾 Saved summary cache for '{ref_chat_title}'",
+                        event_call=__event_call__,
+                    )
 
         if not referenced_summaries:
             return body
@@ -1775,6 +2952,68 @@ class Filter:
 
         return body
 
+    async def _run_bounded_jobs(
+        self,
+        jobs: List[tuple],
+        concurrency: int,
+        timeout: float,
+        log_prefix: str,
+        __event_call__: Callable = None,
+    ) -> List[Any]:
+        """Run `(title, coroutine_factory)` jobs with bounded concurrency and per-job timeouts.
+
+        Results come back in job order. A job that times out or raises yields None,
+        so callers can keep the partial results of the others.
+        """
+        if not jobs:
+            return []
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(title: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                try:
+                    if timeout and timeout > 0:
+                        return await asyncio.wait_for(factory(), timeout)
+                    return await factory()
+                except asyncio.TimeoutError:
+                    logger.warning(
+                        "%s '%s' timed out after %.1fs", log_prefix, title, timeout
+                    )
+                    if __event_call__:
+                        await self._log(
+                            f"{log_prefix} ⏱️ '{title}' timed out after {timeout:.1f}s",
+                            log_type="warning",
+                            event_call=__event_call__,
+                        )
+                except Exception as exc:
+                    logger.warning("%s '%s' failed: %s", log_prefix, title, exc)
+                    if __event_call__:
+                        await self._log(
+                            f"{log_prefix} ⚠️ '{title}' failed: {exc}",
+                            log_type="warning",
+                            event_call=__event_call__,
+                        )
+                return None
+
+        return list(
+            await asyncio.gather(*(run(title, factory) for title, factory in jobs))
+        )
+
+    async def _run_referenced_chat_jobs(
+        self,
+        jobs: List[tuple],
+        __event_call__: Callable = None,
+    ) -> List[Any]:
+        """Run referenced-chat jobs under the referenced_chat_* concurrency and timeout valves."""
+        return await self._run_bounded_jobs(
+            jobs,
+            self.valves.referenced_chat_concurrency,
+            self.valves.referenced_chat_timeout_seconds,
+            "[Referenced Chats]",
+            __event_call__=__event_call__,
+        )
+
     async def _generate_referenced_summaries_background(
         self,
         referenced_chats: List[Dict[str, Any]],
@@ -1786,7 +3025,9 @@ class Filter:
         if not referenced_chats:
             return []
 
-        generated_summaries = []
+        if not isinstance(user_data, dict) or not user_data.get("id"):
+            return []
+
         summary_model = (
             self._clean_model_id(self.valves.summary_model) or "gpt-4o-mini"
         )
@@ -1794,15 +3035,9 @@ class Filter:
             summary_model
         )
 
-        for referenced_chat in referenced_chats:
-            if not isinstance(referenced_chat, dict):
-                continue
-
-            ref_chat_id = referenced_chat.get("chat_id")
-            ref_chat_title = referenced_chat.get("title", "Unknown Chat")
-            if not ref_chat_id:
-                continue
-
+        async def summarize(
+            ref_chat_id: str, ref_chat_title: str, referenced_chat: Dict[str, Any]
+        ) -> Optional[Dict[str, Any]]:
             summary_input_text = referenced_chat.get("conversation_text", "")
             covers_full_history = bool(
                 referenced_chat.get("covers_full_history", True)
@@ -1816,11 +3051,12 @@ class Filter:
                     self._load_full_chat_messages, ref_chat_id
                 )
                 if not chat_messages:
-                    continue
+                    return None
                 summary_input_text = self._format_messages_for_summary(chat_messages)
                 covers_full_history = True
                 covered_message_count = len(chat_messages)
 
+            summary = ""
             estimated_tokens = _estimate_text_tokens(summary_input_text)
             if (
                 summary_model_max_context > 0
@@ -1829,90 +3065,285 @@ class Filter:
                 chat_messages = await asyncio.to_thread(
                     self._load_full_chat_messages, ref_chat_id
                 )
-                if chat_messages:
+                if chat_messages and self.valves.enable_hierarchical_summary:
+                    summary = await self._summarize_hierarchically(
+                        chat_messages,
+                        summary_model,
+                        {"model": summary_model},
+                        user_data,
+                        self._compute_summary_request_limits(
+                            summary_model_max_context
+                        )["max_input_tokens"],
+                        __event_call__=__event_call__,
+                        __request__=__request__,
+                    )
+                    if summary:
+                        covers_full_history = True
+                        covered_message_count = len(chat_messages)
+                if chat_messages and not summary:
                     summary_input_text = self._truncate_messages_for_summary(
                         chat_messages, summary_model_max_context
                     )
                     covers_full_history = False
                     covered_message_count = 0
 
-            if not isinstance(user_data, dict) or not user_data.get("id"):
-                continue
-
-            summary = await self._call_summary_llm(
-                summary_input_text,
-                {"model": summary_model},
-                user_data,
-                __event_call__,
-                __request__,
-                previous_summary=None,
-            )
+            if not summary:
+                summary = await self._call_summary_llm(
+                    summary_input_text,
+                    {"model": summary_model},
+                    user_data,
+                    __event_call__,
+                    __request__,
+                    previous_summary=None,
+                )
 
             if not summary:
+                return None
+
+            if covers_full_history and covered_message_count > 0:
+                await asyncio.to_thread(
+                    self._save_summary,
+                    ref_chat_id,
+                    summary,
+                    covered_message_count,
+                )
+
+            return {
+                "chat_id": ref_chat_id,
+                "title": ref_chat_title,
+                "summary": summary,
+                "covers_full_history": covers_full_history,
+                "covered_message_count": covered_message_count,
+            }
+
+        jobs = []
+        for referenced_chat in referenced_chats:
+            if not isinstance(referenced_chat, dict):
+                continue
+            ref_chat_id = referenced_chat.get("chat_id")
+            ref_chat_title = referenced_chat.get("title", "Unknown Chat")
+            if not ref_chat_id:
                 continue
+            jobs.append(
+                (
+                    ref_chat_title,
+                    functools.partial(
+                        summarize, ref_chat_id, ref_chat_title, referenced_chat
+                    ),
+                )
+            )
 
-            generated_summaries.append(
-                {
-                    "chat_id": ref_chat_id,
-                    "title": ref_chat_title,
+        results = await self._run_referenced_chat_jobs(
+            jobs, __event_call__=__event_call__
+        )
+        return [result for result in results if result]
+
+    def _save_summary(self, chat_id: str, summary: str, compressed_count: int):
+        """Saves the summary to the database (or queues it when write-behind is enabled)."""
+        if self.valves.summary_write_behind_ms > 0:
+            self._enqueue_summary_write(chat_id, summary, compressed_count)
+            return
+
+        try:
+            self._write_summaries(
+                {chat_id: {"summary": summary, "compressed_message_count": compressed_count}}
+            )
+        except Exception as e:
+            logger.error(f"[Storage] ❌ Database save failed: {str(e)}")
+
+    def _enqueue_summary_write(
+        self, chat_id: str, summary: str, compressed_count: int
+    ) -> None:
+        """Coalesce a summary upsert into the pending write-behind batch."""
+        with self._summary_write_lock:
+            pending = self._pending_summary_writes.get(chat_id)
+            if pending is None or compressed_count > pending["compressed_message_count"]:
+                self._pending_summary_writes[chat_id] = {
                     "summary": summary,
-                    "covers_full_history": covers_full_history,
-                    "covered_message_count": covered_message_count,
+                    "compressed_message_count": compressed_count,
                 }
+                self._summary_write_attempts.pop(chat_id, None)
+            self._schedule_summary_flush(self.valves.summary_write_behind_ms / 1000.0)
+        self._invalidate_summary_cache(chat_id)
+
+    def _schedule_summary_flush(self, delay: float) -> None:
+        """Arm the write-behind timer if none is pending. Caller holds `_summary_write_lock`."""
+        if self._summary_flush_timer is not None:
+            return
+        timer = threading.Timer(delay, self._flush_summary_writes)
+        timer.daemon = True
+        self._summary_flush_timer = timer
+        timer.start()
+
+    def _flush_summary_writes(self) -> int:
+        """Write all pending summaries in one batch. Returns the number of rows flushed.
+
+        If the batch fails, each row is retried on its own so one bad row can't
+        block the others; rows that still fail are re-queued and the timer is
+        re-armed with exponential backoff, up to `SUMMARY_WRITE_MAX_ATTEMPTS`.
+        """
+        with self._summary_write_lock:
+            pending = self._pending_summary_writes
+            self._pending_summary_writes = {}
+            self._summary_flush_timer = None
+
+        if not pending:
+            return 0
+
+        try:
+            self._write_summaries(pending)
+            failed: Dict[str, Dict[str, Any]] = {}
+        except Exception as e:
+            logger.error(
+                f"[Storage] ❌ Write-behind flush failed for {len(pending)} summaries, retrying per row: {str(e)}"
             )
+            failed = {}
+            for chat_id, row in pending.items():
+                try:
+                    self._write_summaries({chat_id: row})
+                except Exception as row_error:
+                    logger.error(
+                        f"[Storage] ❌ Summary write failed (Chat ID: {chat_id}): {str(row_error)}"
+                    )
+                    failed[chat_id] = row
+
+        with self._summary_write_lock:
+            for chat_id in pending:
+                if chat_id not in failed:
+                    self._summary_write_attempts.pop(chat_id, None)
+            # Re-queue rows that were not superseded while the flush was running.
+            for chat_id, row in failed.items():
+                attempts = self._summary_write_attempts.get(chat_id, 0) + 1
+                if attempts >= SUMMARY_WRITE_MAX_ATTEMPTS:
+                    self._summary_write_attempts.pop(chat_id, None)
+                    logger.error(
+                        f"[Storage] ❌ Dropping summary after {attempts} failed writes (Chat ID: {chat_id})"
+                    )
+                    continue
+                newer = self._pending_summary_writes.get(chat_id)
+                if newer is None or row["compressed_message_count"] > newer["compressed_message_count"]:
+                    self._pending_summary_writes[chat_id] = row
+                    self._summary_write_attempts[chat_id] = attempts
 
-            if covers_full_history and covered_message_count > 0:
-                await asyncio.to_thread(
-                    self._save_summary,
-                    ref_chat_id,
-                    summary,
-                    covered_message_count,
-                )
+            if failed:
+                self._summary_flush_failures += 1
+            else:
+                self._summary_flush_failures = 0
+            if self._pending_summary_writes:
+                base_delay = max(self.valves.summary_write_behind_ms / 1000.0, 0.5)
+                delay = base_delay
+                if failed:
+                    delay = min(
+                        base_delay * (2 ** self._summary_flush_failures),
+                        max(SUMMARY_WRITE_RETRY_MAX_DELAY, base_delay),
+                    )
+                self._schedule_summary_flush(delay)
 
-        return generated_summaries
+        return len(pending) - len(failed)
 
-    def _save_summary(self, chat_id: str, summary: str, compressed_count: int):
-        """Saves the summary to the database."""
-        try:
-            with self._db_session() as session:
-                # Find existing record
-                existing = session.query(ChatSummary).filter_by(chat_id=chat_id).first()
-
-                if existing:
-                    # [Optimization] Optimistic lock check: update only if progress moves forward
-                    if compressed_count <= existing.compressed_message_count:
-                        if self.valves.debug_mode:
-                            logger.info(
-                                f"[Storage] Skipping update: New progress ({compressed_count}) is not greater than existing progress ({existing.compressed_message_count})"
-                            )
-                        return
+    def _write_summaries(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        """Upsert summaries, only moving each chat's progress forward.
+
+        PostgreSQL and SQLite use a single `INSERT ... ON CONFLICT DO UPDATE` for the
+        whole batch; other backends fall back to per-row read-modify-write.
+        """
+        with self._db_session() as session:
+            bind = session.get_bind()
+            dialect_name = getattr(getattr(bind, "dialect", None), "name", "")
 
-                    # Update existing record
-                    existing.summary = summary
-                    existing.compressed_message_count = compressed_count
-                    existing.updated_at = datetime.now(timezone.utc)
+            if dialect_name in ("postgresql", "sqlite"):
+                if dialect_name == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert as dialect_insert
                 else:
-                    # Create new record
-                    new_summary = ChatSummary(
-                        chat_id=chat_id,
-                        summary=summary,
-                        compressed_message_count=compressed_count,
+                    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+                now = datetime.now(timezone.utc)
+                table = ChatSummary.__table__
+                stmt = dialect_insert(table).values(
+                    [
+                        {
+                            "chat_id": chat_id,
+                            "summary": row["summary"],
+                            "compressed_message_count": row["compressed_message_count"],
+                            "created_at": now,
+                            "updated_at": now,
+                        }
+                        for chat_id, row in rows.items()
+                    ]
+                )
+                # [Optimization] Optimistic lock check: update only if progress moves forward
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.chat_id],
+                    set_={
+                        "summary": stmt.excluded.summary,
+                        "compressed_message_count": stmt.excluded.compressed_message_count,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                    where=table.c.compressed_message_count
+                    < stmt.excluded.compressed_message_count,
+                )
+                session.execute(stmt)
+            else:
+                for chat_id, row in rows.items():
+                    self._save_summary_row(
+                        session, chat_id, row["summary"], row["compressed_message_count"]
                     )
-                    session.add(new_summary)
 
-                session.commit()
+            session.commit()
+
+        for chat_id in rows:
+            self._invalidate_summary_cache(chat_id)
+
+        if self.valves.debug_mode:
+            logger.info(
+                f"[Storage] Upserted {len(rows)} summary row(s) in the database (Chat IDs: {', '.join(rows)})"
+            )
+
+    def _save_summary_row(
+        self, session: Any, chat_id: str, summary: str, compressed_count: int
+    ) -> None:
+        """Read-modify-write a single summary row inside an open session."""
+        existing = session.query(ChatSummary).filter_by(chat_id=chat_id).first()
 
+        if existing:
+            # [Optimization] Optimistic lock check: update only if progress moves forward
+            if compressed_count <= existing.compressed_message_count:
                 if self.valves.debug_mode:
-                    action = "Updated" if existing else "Created"
                     logger.info(
-                        f"[Storage] Summary has been {action.lower()} in the database (Chat ID: {chat_id})"
+                        f"[Storage] Skipping update: New progress ({compressed_count}) is not greater than existing progress ({existing.compressed_message_count})"
                     )
+                return
 
-        except Exception as e:
-            logger.error(f"[Storage] ❌ Database save failed: {str(e)}")
+            existing.summary = summary
+            existing.compressed_message_count = compressed_count
+            existing.updated_at = datetime.now(timezone.utc)
+        else:
+            session.add(
+                ChatSummary(
+                    chat_id=chat_id,
+                    summary=summary,
+                    compressed_message_count=compressed_count,
+                )
+            )
+
+    def _get_pending_summary_record(self, chat_id: str) -> Optional[ChatSummary]:
+        """Return a transient record for a summary still waiting in the write-behind queue."""
+        with self._summary_write_lock:
+            pending = self._pending_summary_writes.get(chat_id)
+        if pending is None:
+            return None
+        return ChatSummary(
+            chat_id=chat_id,
+            summary=pending["summary"],
+            compressed_message_count=pending["compressed_message_count"],
+        )
 
     def _load_summary_record(self, chat_id: str) -> Optional[ChatSummary]:
         """Loads the summary record object from the database."""
+        pending_record = self._get_pending_summary_record(chat_id)
+        if pending_record is not None:
+            return pending_record
+
         try:
             with self._db_session() as session:
                 record = session.query(ChatSummary).filter_by(chat_id=chat_id).first()
@@ -1924,6 +3355,33 @@ class Filter:
             logger.error(f"[Load] ❌ Database read failed: {str(e)}")
         return None
 
+    def _load_summary_records(self, chat_ids: List[str]) -> Dict[str, ChatSummary]:
+        """Load summary records for many chats with a single query."""
+        unique_ids = [cid for cid in dict.fromkeys(chat_ids) if cid]
+        records: Dict[str, ChatSummary] = {}
+        if not unique_ids:
+            return records
+
+        try:
+            with self._db_session() as session:
+                rows = (
+                    session.query(ChatSummary)
+                    .filter(ChatSummary.chat_id.in_(unique_ids))
+                    .all()
+                )
+                for record in rows:
+                    session.expunge(record)
+                    records[record.chat_id] = record
+        except Exception as e:
+            logger.error(f"[Load] ❌ Database batch read failed: {str(e)}")
+
+        for chat_id in unique_ids:
+            pending_record = self._get_pending_summary_record(chat_id)
+            if pending_record is not None:
+                records[chat_id] = pending_record
+
+        return records
+
     def _load_summary(self, chat_id: str, body: dict) -> Optional[str]:
         """Loads the summary text from the database (Compatible with old interface)."""
         record = self._load_summary_record(chat_id)
@@ -1936,9 +3394,302 @@ class Filter:
             return record.summary
         return None
 
-    def _count_tokens(self, text: str) -> int:
+    def _load_summary_version(self, chat_id: str) -> Optional[tuple]:
+        """Load only the version columns of a summary row (no summary text)."""
+        with self._db_session() as session:
+            row = (
+                session.query(
+                    ChatSummary.compressed_message_count, ChatSummary.updated_at
+                )
+                .filter_by(chat_id=chat_id)
+                .first()
+            )
+            if row is None:
+                return None
+            return (row[0], row[1])
+
+    def _load_summary_record_cached(self, chat_id: str) -> Optional[ChatSummary]:
+        """Load the summary record, reusing the cached row while its version is unchanged.
+
+        A cache hit still costs one narrow query for (compressed_message_count,
+        updated_at) so summaries written by other workers are picked up; what it
+        saves is fetching the summary text and rebuilding the injected prefix.
+        """
+        with self._summary_injection_lock:
+            cached = self._summary_injection_cache.get(chat_id)
+        if cached is not None:
+            try:
+                version = self._load_summary_version(chat_id)
+            except Exception as e:
+                logger.error(f"[Load] ❌ Summary version check failed: {str(e)}")
+                version = None
+            with self._summary_injection_lock:
+                # The entry may have been invalidated or replaced during the query.
+                still_cached = self._summary_injection_cache.get(chat_id) is cached
+                if still_cached and version is not None and version == cached["version"]:
+                    self._summary_injection_cache.move_to_end(chat_id)
+                    return cached["record"]
+                if still_cached:
+                    del self._summary_injection_cache[chat_id]
+
+        record = self._load_summary_record(chat_id)
+        if record is not None:
+            with self._summary_injection_lock:
+                self._summary_injection_cache[chat_id] = {
+                    "version": (record.compressed_message_count, record.updated_at),
+                    "record": record,
+                    "prefix": None,
+                }
+                while (
+                    len(self._summary_injection_cache)
+                    > SUMMARY_INJECTION_CACHE_MAX_CHATS
+                ):
+                    self._summary_injection_cache.popitem(last=False)
+        return record
+
+    def _invalidate_summary_cache(self, chat_id: str) -> None:
+        with self._summary_injection_lock:
+            self._summary_injection_cache.pop(chat_id, None)
+
+    def _hold_early_summary(self, chat_id: str, target_compressed_count: int) -> None:
+        self._early_summaries[chat_id] = target_compressed_count
+        self._early_summaries.move_to_end(chat_id)
+        while len(self._early_summaries) > SUMMARY_INJECTION_CACHE_MAX_CHATS:
+            self._early_summaries.popitem(last=False)
+
+    def _is_early_summary_held(
+        self, chat_id: str, history_tokens: int, model_id: Optional[str]
+    ) -> bool:
+        """Whether a stored summary must stay out of the prompt for now.
+
+        With early summaries enabled, any summary is held while the untrimmed
+        history estimate is below the compression threshold. The outlet only
+        writes a regular summary once its untrimmed count crosses that threshold,
+        so both sides measure the same history (tool-output trimming never hides
+        a regular summary) and the hold needs no per-process state: it behaves
+        the same on every worker and after restarts. The estimate can differ
+        slightly from the outlet's precise count right at the threshold.
+        """
+        if self.valves.early_summary_ratio <= 0:
+            return False
+        thresholds = self._get_model_thresholds(model_id) or {}
+        threshold = thresholds.get(
+            "compression_threshold_tokens",
+            self.valves.compression_threshold_tokens,
+        )
+        if history_tokens < threshold:
+            return True
+        # Threshold crossed: the background check no longer needs the held target.
+        self._early_summaries.pop(chat_id, None)
+        return False
+
+    def _get_boundary_signature(
+        self, messages: List[Dict], start_index: int, raw_start_index: int
+    ) -> tuple:
+        """Structural fingerprint of the span the tail alignment depended on.
+
+        Covers the message before the aligned start through the raw start, so a
+        cached alignment is only reused while that chain keeps the same roles and
+        tool calls. Message content is deliberately not part of it: edits before
+        the boundary are already folded into the summary and don't move the tail.
+        """
+        window = messages[max(0, start_index - 1) : raw_start_index + 1]
+        return tuple(
+            (msg.get("role"), bool(msg.get("tool_calls")))
+            for msg in window
+            if isinstance(msg, dict)
+        )
+
+    def _get_summary_prefix(
+        self,
+        chat_id: str,
+        summary_record: Any,
+        messages: List[Dict],
+        lang: str,
+        compressed_count: int,
+        effective_keep_first: int,
+    ) -> Dict[str, Any]:
+        """Return the aligned tail start and summary message for inlet injection.
+
+        The result is cached per chat and reused while the summary row, language,
+        head size and boundary structure are unchanged, so repeat inlets skip
+        atomic-group alignment and summary re-estimation.
+        """
+        with self._summary_injection_lock:
+            cached = self._summary_injection_cache.get(chat_id)
+            prefix = cached.get("prefix") if cached is not None else None
+        stable = self.valves.stable_summary_prefix
+        prefix_key = (lang, compressed_count, effective_keep_first, stable)
+        if (
+            prefix is not None
+            and cached.get("record") is summary_record
+            and prefix["key"] == prefix_key
+            and prefix["start_index"] <= len(messages)
+            and prefix["boundary_signature"]
+            == self._get_boundary_signature(
+                messages, prefix["start_index"], prefix["raw_start_index"]
+            )
+        ):
+            return {
+                "start_index": prefix["start_index"],
+                "summary_message": deepcopy(prefix["summary_message"]),
+                "summary_estimate": prefix["summary_estimate"],
+                "version": prefix["version"],
+                "cache_hit": True,
+            }
+
+        raw_start_index = max(compressed_count, effective_keep_first)
+        start_index = self._align_tail_start_to_atomic_boundary(
+            messages, raw_start_index, effective_keep_first
+        )
+        version = self._get_summary_version(summary_record.summary, start_index)
+        summary_message = self._build_summary_message(
+            summary_record.summary, lang, start_index, version if stable else None
+        )
+        summary_estimate = self._estimate_content_tokens(summary_message["content"])
+
+        if cached is not None and cached.get("record") is summary_record:
+            new_prefix = {
+                "key": prefix_key,
+                "start_index": start_index,
+                "raw_start_index": raw_start_index,
+                "boundary_signature": self._get_boundary_signature(
+                    messages, start_index, raw_start_index
+                ),
+                "summary_message": deepcopy(summary_message),
+                "summary_estimate": summary_estimate,
+                "version": version,
+            }
+            with self._summary_injection_lock:
+                cached["prefix"] = new_prefix
+
+        return {
+            "start_index": start_index,
+            "summary_message": summary_message,
+            "summary_estimate": summary_estimate,
+            "version": version,
+            "cache_hit": False,
+        }
+
+    def _get_summary_version(self, summary_text: str, covered_until: int) -> str:
+        """Version id that changes only when the summary or its boundary changes."""
+        digest = hashlib.sha1(summary_text.encode("utf-8")).hexdigest()[:12]
+        return f"v{covered_until}-{digest}"
+
+    def _track_summary_prefix(
+        self, chat_id: str, version: str, prefix_messages: List[Dict]
+    ) -> str:
+        """Compare the sent [head + summary] bytes with the previous inlet of the chat.
+
+        Returns "new" (first seen), "stable" (identical), "boundary" (the summary
+        advanced) or "drift" (same summary, different bytes - a cache miss that
+        `stable_summary_prefix` is meant to avoid).
+        """
+        hasher = hashlib.sha1()
+        for message in prefix_messages:
+            hasher.update(str(message.get("role", "")).encode("utf-8"))
+            hasher.update(b"\x00")
+            content = message.get("content", "")
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+            hasher.update(content.encode("utf-8"))
+            hasher.update(b"\x00")
+        digest = hasher.hexdigest()
+
+        previous = self._summary_prefix_fingerprints.get(chat_id)
+        if previous is None:
+            status = "new"
+        elif previous[1] == digest:
+            status = "stable"
+        elif previous[0] != version:
+            status = "boundary"
+        else:
+            status = "drift"
+
+        self._summary_prefix_fingerprints[chat_id] = (version, digest)
+        self._summary_prefix_fingerprints.move_to_end(chat_id)
+        while len(self._summary_prefix_fingerprints) > SUMMARY_INJECTION_CACHE_MAX_CHATS:
+            self._summary_prefix_fingerprints.popitem(last=False)
+        self._summary_prefix_stats[status] += 1
+        return status
+
+    def _count_tokens(self, text: str, tokenizer: Optional[str] = None) -> int:
         """Counts the number of tokens in the text."""
-        return _get_cached_tokens(text)
+        return _get_cached_tokens(text, tokenizer)
+
+    def _resolve_tokenizer(self, tokenizer: Optional[str] = None) -> tuple[str, Any]:
+        """Return (name, encoding) for a tokenizer; encoding is None until it is loaded."""
+        name = tokenizer or DEFAULT_TOKENIZER_ENCODING
+        encoding = TOKENIZER_REGISTRY.get(name)
+        return (name, encoding) if encoding is not None else (ESTIMATE_TOKENIZER, None)
+
+    def _get_model_tokenizer(
+        self, model_id: Optional[str], thresholds: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Tokenizer for a model: model_thresholds entry, tiktoken's model map, then the valve default.
+
+        An encoding that failed to load falls back to the valve default rather
+        than leaving the model on the heuristic estimator for good.
+        """
+        name = (thresholds or {}).get("tokenizer") or _tokenizer_name_for_model(
+            model_id
+        )
+        default = self.valves.tokenizer_encoding or ESTIMATE_TOKENIZER
+        if not name or TOKENIZER_REGISTRY.has_failed(name):
+            name = default
+        if TOKENIZER_REGISTRY.has_failed(name):
+            name = ESTIMATE_TOKENIZER
+        TOKENIZER_REGISTRY.warm(name)
+        return name
+
+    def _count_tokens_batch(
+        self, texts: List[str], tokenizer: Optional[str] = None
+    ) -> List[int]:
+        """Count tokens for many texts, batching large workloads through tiktoken.
+
+        Above `batch_token_count_min_chars`, cache misses are encoded with
+        `encode_batch`, whose native worker threads release the GIL so a huge
+        precise count does not starve other chats on the same worker.
+        """
+        name, encoding = self._resolve_tokenizer(tokenizer)
+        min_chars = self.valves.batch_token_count_min_chars
+        if (
+            encoding is None
+            or min_chars <= 0
+            or sum(len(text) for text in texts) < min_chars
+        ):
+            return [self._count_tokens(text, name) for text in texts]
+
+        cache = TOKENIZER_REGISTRY.cache_for(name)
+        counts: List[Optional[int]] = []
+        missing_indices = []
+        for index, text in enumerate(texts):
+            cached = cache.lookup(text) if text else 0
+            counts.append(cached)
+            if cached is None:
+                missing_indices.append(index)
+
+        if missing_indices:
+            missing_texts = [texts[index] for index in missing_indices]
+            try:
+                encoded = encoding.encode_batch(
+                    missing_texts,
+                    num_threads=max(1, self.valves.batch_token_count_threads),
+                )
+                missing_counts = [len(tokens) for tokens in encoded]
+            except Exception as e:
+                logger.warning(
+                    f"[Token Count] tiktoken batch error: {e}, counting messages individually"
+                )
+                missing_counts = [
+                    _encode_token_count(encoding, t) for t in missing_texts
+                ]
+
+            for index, text, count in zip(missing_indices, missing_texts, missing_counts):
+                cache.store(text, count)
+                counts[index] = count
+
+        return [int(count or 0) for count in counts]
 
     def _extract_text_content(self, content: Any) -> str:
         """Extract human-readable text from string, multimodal list, or dict payloads."""
@@ -1977,29 +3728,133 @@ class Filter:
     def _estimate_content_tokens(self, content: Any) -> int:
         return _estimate_text_tokens(self._extract_text_content(content))
 
-    def _calculate_messages_tokens(self, messages: List[Dict]) -> int:
-        """Calculates the total tokens for a list of messages."""
+    def _get_token_ledger(self, chat_id: str) -> Dict[str, tuple]:
+        """Get or create the per-chat token ledger, evicting the least recent chats."""
+        with self._token_ledger_lock:
+            ledger = self._token_ledgers.get(chat_id)
+            if ledger is None:
+                ledger = {}
+                self._token_ledgers[chat_id] = ledger
+                while len(self._token_ledgers) > TOKEN_LEDGER_MAX_CHATS:
+                    self._token_ledgers.popitem(last=False)
+            else:
+                self._token_ledgers.move_to_end(chat_id)
+            return ledger
+
+    def _get_ledger_entry_key(self, message: Dict, content: str) -> tuple[str, str]:
+        """Return the (ledger key, content digest) pair for a message."""
+        digest = hashlib.sha1(content.encode("utf-8", "surrogatepass")).hexdigest()
+        message_id = message.get("id") if isinstance(message, dict) else None
+        if isinstance(message_id, str) and message_id:
+            return f"id:{message_id}", digest
+        # Messages without a stable ID (inlet payloads, injected summaries) are
+        # content-addressed instead.
+        return f"h:{digest}", digest
+
+    def _calculate_messages_tokens(
+        self,
+        messages: List[Dict],
+        chat_id: Optional[str] = None,
+        tokenizer: Optional[str] = None,
+        prune: bool = False,
+    ) -> int:
+        """Calculates the total tokens for a list of messages.
+
+        When `chat_id` is given, exact counts are kept in a per-chat ledger keyed by
+        message ID + content digest, so repeated passes over a growing history only
+        tokenize new or edited messages. Pass `prune=True` only when `messages` is
+        the full active history; subset views (head, tail, next context) must not
+        evict entries for the messages they don't include.
+        """
+        return sum(
+            self._calculate_message_token_list(messages, chat_id, tokenizer, prune)
+        )
+
+    def _calculate_message_token_list(
+        self,
+        messages: List[Dict],
+        chat_id: Optional[str] = None,
+        tokenizer: Optional[str] = None,
+        prune: bool = False,
+    ) -> List[int]:
+        """Exact per-message token counts, served from the chat's ledger when possible."""
         start_time = time.time()
-        total_tokens = 0
-        for msg in messages:
+        # Ledger entries are tagged with the tokenizer that produced them, so
+        # heuristic counts taken while an encoding warms up are redone once it is ready.
+        tokenizer, _ = self._resolve_tokenizer(tokenizer)
+        token_counts = [0] * len(messages)
+        ledger = self._get_token_ledger(chat_id) if chat_id else None
+        # (message index, ledger key or None, digest, content) for every message
+        entries: List[tuple] = []
+        for index, msg in enumerate(messages):
             content = self._extract_text_content(msg.get("content", ""))
-            total_tokens += self._count_tokens(content)
+            if ledger is None:
+                entries.append((index, None, None, content))
+                continue
+            key, digest = self._get_ledger_entry_key(msg, content)
+            entries.append((index, key, f"{tokenizer}:{digest}", content))
+
+        if ledger is None:
+            pending = entries
+        else:
+            pending = []
+            # Ledgers are shared by concurrent requests for the same chat and are
+            # updated from worker threads, so every access goes through the lock.
+            with self._token_ledger_lock:
+                for index, key, digest, content in entries:
+                    entry = ledger.get(key)
+                    if entry is None or entry[0] != digest:
+                        pending.append((index, key, digest, content))
+                    else:
+                        token_counts[index] = entry[1]
+
+        counted_messages = len(pending)
+        counts = self._count_tokens_batch(
+            [content for _, _, _, content in pending], tokenizer
+        )
+        for (index, _, _, _), tokens in zip(pending, counts):
+            token_counts[index] = tokens
+
+        if ledger is not None:
+            with self._token_ledger_lock:
+                for (_, key, digest, _), tokens in zip(pending, counts):
+                    ledger[key] = (digest, tokens)
+                seen_keys = {key for _, key, _, _ in entries}
+                if prune and len(ledger) > max(
+                    TOKEN_LEDGER_MIN_ENTRIES, len(seen_keys) * 2
+                ):
+                    # Drop entries for messages that left the active branch (edits, regenerations).
+                    for stale_key in [key for key in ledger if key not in seen_keys]:
+                        ledger.pop(stale_key, None)
 
         duration = (time.time() - start_time) * 1000
         if self.valves.debug_mode:
+            ledger_info = (
+                f" (ledger: {counted_messages} counted, {len(messages) - counted_messages} reused)"
+                if ledger is not None
+                else ""
+            )
+            cache_stats = (
+                ESTIMATE_TOKEN_CACHE
+                if tokenizer == ESTIMATE_TOKENIZER
+                else TOKENIZER_REGISTRY.cache_for(tokenizer)
+            ).stats()
             logger.info(
-                f"[Token Calc] Calculated {total_tokens} tokens for {len(messages)} messages in {duration:.2f}ms"
+                f"[Token Calc] Calculated {sum(token_counts)} tokens for {len(messages)} messages in {duration:.2f}ms{ledger_info} | tokenizer={tokenizer}"
+                f" | cache hit_ratio={cache_stats['hit_ratio']} entries={cache_stats['entries']} evictions={cache_stats['evictions']}"
             )
 
-        return total_tokens
+        return token_counts
+
+    def _estimate_message_token_list(self, messages: List[Dict]) -> List[int]:
+        """Per-message token estimates."""
+        return _estimate_text_token_list(
+            [self._extract_text_content(msg.get("content", "")) for msg in messages]
+        )
 
     def _estimate_messages_tokens(self, messages: List[Dict]) -> int:
         """Fast estimation of tokens using mixed-script heuristics."""
-        total_tokens = 0
-        for msg in messages:
-            total_tokens += self._estimate_content_tokens(msg.get("content", ""))
-
-        return total_tokens
+        return sum(self._estimate_message_token_list(messages))
 
     def _get_model_thresholds(self, model_id: str) -> Dict[str, int]:
         """Gets threshold configuration for a specific model.
@@ -2587,78 +4442,83 @@ class Filter:
         except Exception as e:
             logger.error(f"Error emitting debug log: {e}")
 
-    async def _emit_frontend_console_log(
-        self,
-        message: str,
-        log_type: str = "info",
-        event_call=None,
-        force: bool = False,
-    ):
-        """Emit a browser-console log, optionally bypassing the debug-log valve."""
-        if not event_call:
-            return
-        if not force and not self.valves.show_debug_log:
-            return
-
-        try:
-            css = "color: #3b82f6;"
-            console_method = "log"
-            if log_type == "error":
-                css = "color: #ef4444; font-weight: bold;"
-                console_method = "error"
-            elif log_type == "warning":
-                css = "color: #f59e0b;"
-                console_method = "warn"
-            elif log_type == "success":
-                css = "color: #10b981; font-weight: bold;"
-
-            lines = message.split("\n")
-            filtered_lines = [
-                line
-                for line in lines
-                if not line.strip().startswith("====")
-                and not line.strip().startswith("----")
-            ]
-            clean_message = "\n".join(filtered_lines).strip()
-
-            if not clean_message:
-                return
+    def _format_frontend_console_entry(
+        self, message: str, log_type: str
+    ) -> Optional[Dict[str, Any]]:
+        """Split a log message into a console header, detail lines and style."""
+        css = "color: #3b82f6;"
+        console_method = "log"
+        if log_type == "error":
+            css = "color: #ef4444; font-weight: bold;"
+            console_method = "error"
+        elif log_type == "warning":
+            css = "color: #f59e0b;"
+            console_method = "warn"
+        elif log_type == "success":
+            css = "color: #10b981; font-weight: bold;"
+
+        message_lines = [
+            line.rstrip()
+            for line in message.split("\n")
+            if line.strip()
+            and not line.strip().startswith("====")
+            and not line.strip().startswith("----")
+        ]
+        if not message_lines:
+            return None
 
-            message_lines = [
-                line.rstrip() for line in clean_message.split("\n") if line.strip()
-            ]
-            header_line = message_lines[0] if message_lines else clean_message
-            detail_lines = message_lines[1:] if len(message_lines) > 1 else []
+        return {
+            "header": "[Compression] " + message_lines[0],
+            "details": message_lines[1:],
+            "css": css,
+            "method": console_method,
+        }
 
-            if detail_lines:
-                js_code = f"""
-                    try {{
-                        const header = {json.dumps("[Compression] " + header_line, ensure_ascii=False)};
-                        const detailLines = {json.dumps(detail_lines, ensure_ascii=False)};
-                        console.groupCollapsed("%c" + header, "{css}");
-                        for (const line of detailLines) {{
-                            console.{console_method}(line);
-                        }}
-                        console.groupEnd();
-                        return true;
-                    }} catch (e) {{
-                        console.error("[Compression] Failed to emit console log", e);
-                        return false;
-                    }}
-                """
+    def _build_frontend_console_js(self, entries: List[Dict[str, Any]]) -> str:
+        """One execute snippet that prints all entries, grouped when there are several."""
+        statements = []
+        for entry in entries:
+            header = json.dumps(entry["header"], ensure_ascii=False)
+            method = entry["method"]
+            if entry["details"]:
+                details = json.dumps(entry["details"], ensure_ascii=False)
+                statements.append(
+                    f'console.groupCollapsed("%c" + {header}, "{entry["css"]}");\n'
+                    f"for (const line of {details}) {{ console.{method}(line); }}\n"
+                    "console.groupEnd();"
+                )
             else:
-                js_code = f"""
-                    try {{
-                        console.{console_method}("%c" + {json.dumps("[Compression] " + header_line, ensure_ascii=False)}, "{css}");
-                        return true;
-                    }} catch (e) {{
-                        console.error("[Compression] Failed to emit console log", e);
-                        return false;
-                    }}
-                """
+                statements.append(
+                    f'console.{method}("%c" + {header}, "{entry["css"]}");'
+                )
+
+        if len(entries) > 1:
+            batch_header = json.dumps(f"[Compression] {len(entries)} debug logs")
+            statements.insert(0, f"console.groupCollapsed({batch_header});")
+            statements.append("console.groupEnd();")
+
+        body = "\n".join(statements)
+        return f"""
+            try {{
+{body}
+                return true;
+            }} catch (e) {{
+                console.error("[Compression] Failed to emit console log", e);
+                return false;
+            }}
+        """
 
+    async def _send_frontend_console_entries(
+        self, entries: List[Dict[str, Any]], event_call, force: bool = False
+    ) -> None:
+        try:
             await asyncio.wait_for(
-                event_call({"type": "execute", "data": {"code": js_code}}),
+                event_call(
+                    {
+                        "type": "execute",
+                        "data": {"code": self._build_frontend_console_js(entries)},
+                    }
+                ),
                 timeout=2.0,
             )
         except ValueError as ve:
@@ -2675,6 +4535,53 @@ class Filter:
                 f"Failed to process log to frontend: {type(e).__name__}: {e}"
             )
 
+    async def _emit_frontend_console_log(
+        self,
+        message: str,
+        log_type: str = "info",
+        event_call=None,
+        force: bool = False,
+    ):
+        """Emit a browser-console log, optionally bypassing the debug-log valve.
+
+        Debug logs are buffered per `event_call` (one per request) and sent as a
+        single execute event at phase boundaries or once the buffer reaches
+        `frontend_log_batch_max_chars`. Forced logs flush the buffer and go out
+        immediately.
+        """
+        if not event_call:
+            return
+        if not force and not self.valves.show_debug_log:
+            return
+
+        entry = self._format_frontend_console_entry(message, log_type)
+        if entry is None:
+            return
+
+        max_chars = self.valves.frontend_log_batch_max_chars
+        if force or max_chars <= 0:
+            await self._flush_frontend_logs(event_call)
+            await self._send_frontend_console_entries([entry], event_call, force)
+            return
+
+        buffer = self._frontend_log_buffers.setdefault(
+            event_call, {"entries": [], "chars": 0}
+        )
+        buffer["entries"].append(entry)
+        buffer["chars"] += len(entry["header"]) + sum(
+            len(line) for line in entry["details"]
+        )
+        if buffer["chars"] >= max_chars:
+            await self._flush_frontend_logs(event_call)
+
+    async def _flush_frontend_logs(self, event_call) -> None:
+        """Send this request's buffered console logs as one execute event."""
+        if not event_call:
+            return
+        buffer = self._frontend_log_buffers.pop(event_call, None)
+        if buffer and buffer["entries"]:
+            await self._send_frontend_console_entries(buffer["entries"], event_call)
+
     async def _log(self, message: str, log_type: str = "info", event_call=None):
         """Unified logging to both backend (print) and frontend (console.log)"""
         # Backend logging
@@ -2743,6 +4650,30 @@ class Filter:
         Executed before sending to the LLM.
         Compression Strategy: Only responsible for injecting existing summaries, no Token calculation.
         """
+        try:
+            return await self._process_inlet(
+                body,
+                __user__=__user__,
+                __metadata__=__metadata__,
+                __request__=__request__,
+                __model__=__model__,
+                __event_emitter__=__event_emitter__,
+                __event_call__=__event_call__,
+            )
+        finally:
+            await self._flush_frontend_logs(__event_call__)
+
+    async def _process_inlet(
+        self,
+        body: dict,
+        __user__: Optional[dict] = None,
+        __metadata__: dict = None,
+        __request__: Request = None,
+        __model__: dict = None,
+        __event_emitter__: Callable[[Any], Awaitable[None]] = None,
+        __event_call__: Callable[[Any], Awaitable[None]] = None,
+    ) -> dict:
+        """Inlet implementation; `inlet` flushes buffered frontend logs afterwards."""
 
         if self._should_skip_compression(body, __model__):
             if self.valves.debug_mode:
@@ -2751,6 +4682,7 @@ class Filter:
                 )
             return body
 
+        inlet_started = time.perf_counter()
         messages = body.get("messages", [])
         user_ctx = await self._get_user_context(__user__, __event_call__)
         lang = user_ctx["user_language"]
@@ -2774,6 +4706,9 @@ class Filter:
                 event_call=__event_call__,
             )
 
+        chat_ctx = self._get_chat_context(body, __metadata__)
+        chat_id = chat_ctx["chat_id"]
+
         # --- Native Tool Output Trimming (Opt-in, only for native function calling) ---
         function_calling_mode = self._get_function_calling_mode(body)
         is_native_func_calling = function_calling_mode == "native"
@@ -2789,12 +4724,24 @@ class Filter:
                 event_call=__event_call__,
             )
 
+        # Full-history estimate for the early-summary hold. Taken before trimming so
+        # it measures the same untrimmed history the outlet compares against the
+        # compression threshold when it decides whether to summarize.
+        history_estimate: Optional[int] = None
+        if self.valves.early_summary_ratio > 0:
+            history_estimate = self._estimate_messages_tokens(messages)
+        tool_outputs_trimmed = False
+
         if self.valves.enable_tool_output_trimming and is_native_func_calling:
             trimmed_count, trim_debug = self._trim_native_tool_outputs(
                 messages,
                 lang,
                 collect_debug=bool(self.valves.show_debug_log and __event_call__),
+                chat_id=chat_id,
             )
+            tool_outputs_trimmed = trimmed_count > 0
+            if self._pending_tool_offloads:
+                await asyncio.to_thread(self._flush_tool_offloads)
             if self.valves.show_debug_log and __event_call__:
                 if trim_debug is not None:
                     await self._log(
@@ -2821,9 +4768,6 @@ class Filter:
                 event_call=__event_call__,
             )
 
-        chat_ctx = self._get_chat_context(body, __metadata__)
-        chat_id = chat_ctx["chat_id"]
-
         body = await self._handle_external_chat_references(
             body,
             user_data=__user__,
@@ -3008,22 +4952,40 @@ class Filter:
                 )
 
         # Log the aligned compression boundary using the same original-history
-        # coordinate mapping as outlet/async summary generation.
-        target_compressed_count = self._calculate_target_compressed_count(messages)
-
-        await self._log(
-            f"[Inlet] Recorded target compression progress: {target_compressed_count}",
-            event_call=__event_call__,
-        )
+        # coordinate mapping as outlet/async summary generation. This walks the
+        # full history, so only do it when the log line will actually be emitted.
+        if self.valves.debug_mode or self.valves.show_debug_log:
+            target_compressed_count = self._calculate_target_compressed_count(
+                messages
+            )
+            await self._log(
+                f"[Inlet] Recorded target compression progress: {target_compressed_count}",
+                event_call=__event_call__,
+            )
 
         # Load summary record
-        summary_record = await asyncio.to_thread(self._load_summary_record, chat_id)
+        summary_record = await asyncio.to_thread(
+            self._load_summary_record_cached, chat_id
+        )
+        if (
+            summary_record
+            and history_estimate is not None
+            and self._is_early_summary_held(
+                chat_id, history_estimate, self._clean_model_id(body.get("model"))
+            )
+        ):
+            await self._log(
+                "[Inlet] 🔮 Early summary ready, held back until the compression threshold",
+                event_call=__event_call__,
+            )
+            summary_record = None
 
         # Calculate effective_keep_first to ensure all system messages are protected
         effective_keep_first = self._get_effective_keep_first(messages)
 
         final_messages = []
         external_refs_injected_count = 0
+        inlet_metrics: Dict[str, Any] = {}
 
         if summary_record:
             # Summary exists, build view: [Head] + [Summary Message] + [Tail]
@@ -3042,22 +5004,44 @@ class Filter:
             # 2. Tail messages (Tail) - All messages starting from the last compression point.
             # Align legacy/raw progress to an atomic boundary so old summary rows do not
             # reintroduce orphaned tool messages into the retained tail.
-            raw_start_index = max(compressed_count, effective_keep_first)
-            start_index = self._align_tail_start_to_atomic_boundary(
-                messages, raw_start_index, effective_keep_first
+            # The aligned boundary and the built summary message are cached per chat
+            # and reused until the stored summary row changes.
+            summary_prefix = self._get_summary_prefix(
+                chat_id,
+                summary_record,
+                messages,
+                lang,
+                compressed_count,
+                effective_keep_first,
             )
+            start_index = summary_prefix["start_index"]
 
             # 3. Summary message (Inserted as Assistant message)
             external_refs = body.pop("__external_references__", None)
-            summary_msg = self._build_summary_message(
-                summary_record.summary,
-                lang,
-                start_index,
-            )
+            summary_msg = summary_prefix["summary_message"]
+            summary_estimate = summary_prefix["summary_estimate"]
+
+            if self.valves.show_debug_log and __event_call__:
+                await self._log(
+                    f"[Inlet] ♻️ Summary prefix cache: {'hit' if summary_prefix['cache_hit'] else 'miss'} (start_index={start_index})",
+                    event_call=__event_call__,
+                )
 
+            # In stable-prefix mode references go after the summary as their own
+            # message, so [head + summary] stays byte-identical across turns.
+            context_messages = []
             if external_refs:
                 external_content = external_refs.get("content", "")
-                if external_content:
+                if external_content and self.valves.stable_summary_prefix:
+                    external_refs_injected_count = len(
+                        external_refs.get("references", [])
+                    )
+                    context_messages.append(
+                        self._build_external_reference_message(
+                            external_refs, start_index
+                        )
+                    )
+                elif external_content:
                     external_refs_injected_count = len(
                         external_refs.get("references", [])
                     )
@@ -3068,6 +5052,9 @@ class Filter:
                     summary_msg["metadata"]["external_references"] = external_refs.get(
                         "references", []
                     )
+                    summary_estimate = self._estimate_content_tokens(
+                        summary_msg["content"]
+                    )
 
             tail_messages = messages[start_index:]
 
@@ -3105,7 +5092,9 @@ class Filter:
             # --- Preflight Check & Budgeting (Simplified) ---
 
             # Assemble candidate messages (for output)
-            candidate_messages = head_messages + [summary_msg] + tail_messages
+            candidate_messages = (
+                head_messages + [summary_msg] + context_messages + tail_messages
+            )
 
             # Prepare messages for token calculation (include system prompt if missing)
             calc_messages = candidate_messages
@@ -3121,9 +5110,18 @@ class Filter:
             max_context_tokens = thresholds.get(
                 "max_context_tokens", self.valves.max_context_tokens
             )
+            tokenizer = self._get_model_tokenizer(model, thresholds)
 
             # --- Fast Estimation Check ---
-            estimated_tokens = self._estimate_messages_tokens(calc_messages)
+            preflight_started = time.perf_counter()
+            dropped_tokens = dropped_groups = 0
+            # The summary estimate comes from the prefix cache; only head/tail are walked.
+            estimated_tokens = (
+                self._estimate_messages_tokens(
+                    [m for m in calc_messages if m is not summary_msg]
+                )
+                + summary_estimate
+            )
 
             # Since this is a hard limit check, only skip precise calculation if we are far below it (margin of 15%)
             # max_context_tokens == 0 means "no limit", skip reduction entirely
@@ -3143,7 +5141,10 @@ class Filter:
             else:
                 # Calculate exact total tokens via tiktoken
                 total_tokens = await asyncio.to_thread(
-                    self._calculate_messages_tokens, calc_messages
+                    self._calculate_messages_tokens,
+                    calc_messages,
+                    chat_id,
+                    tokenizer,
                 )
 
                 # Preflight Check Log
@@ -3153,43 +5154,35 @@ class Filter:
                     event_call=__event_call__,
                 )
 
-                # Identify atomic groups to avoid breaking tool-calling context
-                atomic_groups = self._get_atomic_groups(tail_messages)
-
-                while total_tokens > max_context_tokens and len(atomic_groups) > 1:
-                    # Strategy 1: Structure-Aware Assistant Trimming (Optional, only for non-tool messages)
-                    # For simplicity and reliability in this fix, we prioritize Group-Drop over partial trim
-                    # if a group contains tool calls.
-
-                    # Strategy 2: Drop Oldest Atomic Group Entirely
-                    dropped_group_indices = atomic_groups.pop(0)
-                    # Note: indices in dropped_group_indices are relative to ORIGINAL tail_messages
-                    # But since we are popping from tail_messages itself, we need to be careful.
-
-                    # Extract and drop messages in this group from the actual list
-                    # Since we always pop group 0, we pop len(dropped_group_indices) times from front
-                    dropped_tokens = 0
-                    for _ in range(len(dropped_group_indices)):
-                        dropped = tail_messages.pop(0)
-                        if total_tokens == estimated_tokens:
-                            dropped_tokens += self._estimate_content_tokens(
-                                dropped.get("content", "")
-                            )
-                        else:
-                            dropped_tokens += self._count_tokens(
-                                str(dropped.get("content", ""))
-                            )
-
+                # Drop the oldest atomic groups in one slice to avoid breaking
+                # tool-calling context; the tail counts come from the ledger above.
+                tail_token_counts = await asyncio.to_thread(
+                    self._calculate_message_token_list,
+                    tail_messages,
+                    chat_id,
+                    tokenizer,
+                )
+                cut_index, dropped_tokens, dropped_groups = (
+                    self._plan_atomic_group_drop(
+                        tail_messages,
+                        tail_token_counts,
+                        total_tokens - max_context_tokens,
+                    )
+                )
+                if cut_index:
+                    tail_messages = tail_messages[cut_index:]
                     total_tokens -= dropped_tokens
 
                     if self.valves.show_debug_log and __event_call__:
                         await self._log(
-                            f"[Inlet] 🗑️ Dropped atomic group ({len(dropped_group_indices)} msgs) to fit context. Tokens: {dropped_tokens}",
+                            f"[Inlet] 🗑️ Dropped {dropped_groups} atomic group(s) ({cut_index} msgs) to fit context. Tokens: {dropped_tokens}",
                             event_call=__event_call__,
                         )
 
                 # Re-assemble
-                candidate_messages = head_messages + [summary_msg] + tail_messages
+                candidate_messages = (
+                    head_messages + [summary_msg] + context_messages + tail_messages
+                )
 
                 await self._log(
                     "[Inlet] ✂️ Sent-context history reduced\n"
@@ -3198,6 +5191,30 @@ class Filter:
                 )
 
             final_messages = candidate_messages
+            inlet_metrics = {
+                "preflight_ms": round((time.perf_counter() - preflight_started) * 1000, 3),
+                "tokens_before": total_tokens + dropped_tokens,
+                "tokens_after": total_tokens,
+                "groups_dropped": dropped_groups,
+            }
+
+            prefix_status = self._track_summary_prefix(
+                chat_id, summary_prefix["version"], head_messages + [summary_msg]
+            )
+            inlet_metrics.update(
+                {
+                    "prefix_stable": int(prefix_status == "stable"),
+                    "prefix_boundary": int(prefix_status == "boundary"),
+                    "prefix_drift": int(prefix_status == "drift"),
+                }
+            )
+            if self.valves.show_debug_log and __event_call__:
+                stats = self._summary_prefix_stats
+                await self._log(
+                    f"[Inlet] 🧊 Summary prefix {prefix_status} (version={summary_prefix['version']}) | "
+                    f"stable={stats['stable']} | boundary={stats['boundary']} | drift={stats['drift']} | new={stats['new']}",
+                    event_call=__event_call__,
+                )
 
             # Calculate detailed token stats for logging
             summary_content = summary_msg.get("content", "")
@@ -3209,16 +5226,24 @@ class Filter:
                 )
                 head_tokens = self._estimate_messages_tokens(head_messages)
                 summary_tokens = self._estimate_content_tokens(summary_content)
-                tail_tokens = self._estimate_messages_tokens(tail_messages)
+                tail_tokens = self._estimate_messages_tokens(
+                    context_messages + tail_messages
+                )
             else:
                 system_tokens = (
-                    self._count_tokens(system_prompt_msg.get("content", ""))
+                    self._count_tokens(
+                        system_prompt_msg.get("content", ""), tokenizer
+                    )
                     if system_prompt_msg
                     else 0
                 )
-                head_tokens = self._calculate_messages_tokens(head_messages)
-                summary_tokens = self._count_tokens(summary_content)
-                tail_tokens = self._calculate_messages_tokens(tail_messages)
+                head_tokens = self._calculate_messages_tokens(
+                    head_messages, chat_id, tokenizer
+                )
+                summary_tokens = self._count_tokens(summary_content, tokenizer)
+                tail_tokens = self._calculate_messages_tokens(
+                    context_messages + tail_messages, chat_id, tokenizer
+                )
 
             system_info = (
                 f"System({system_tokens}t)" if system_prompt_msg else "System(0t)"
@@ -3288,24 +5313,15 @@ class Filter:
             )
         else:
             external_refs = body.pop("__external_references__", None)
+            # Messages sent on top of the original history (reference block, system prompt)
+            extra_messages: List[Dict] = []
 
             if external_refs and external_refs.get("content") and messages:
-                external_content = external_refs.get("content", "")
                 external_refs_injected_count = len(external_refs.get("references", []))
-                ref_msg = {
-                    "role": "assistant",
-                    "content": (
-                        f"<external_references>\n{external_content}\n</external_references>\n\n"
-                        + "Here are references to other conversations that may be relevant to this discussion."
-                    ),
-                    "metadata": {
-                        "is_summary": True,
-                        "is_external_references": True,
-                        "source": "external_references",
-                        "covered_until": effective_keep_first,
-                        "external_references": external_refs.get("references", []),
-                    },
-                }
+                ref_msg = self._build_external_reference_message(
+                    external_refs, effective_keep_first
+                )
+                extra_messages.append(ref_msg)
 
                 head_messages = messages[:effective_keep_first]
                 tail_messages = messages[effective_keep_first:]
@@ -3331,6 +5347,7 @@ class Filter:
                 )
                 if not is_in_messages:
                     calc_messages = [system_prompt_msg] + candidate_messages
+                    extra_messages.append(system_prompt_msg)
 
             # Get max context limit
             model = self._clean_model_id(body.get("model"))
@@ -3338,9 +5355,19 @@ class Filter:
             max_context_tokens = thresholds.get(
                 "max_context_tokens", self.valves.max_context_tokens
             )
+            tokenizer = self._get_model_tokenizer(model, thresholds)
 
             # --- Fast Estimation Check ---
-            estimated_tokens = self._estimate_messages_tokens(calc_messages)
+            preflight_started = time.perf_counter()
+            dropped_tokens = dropped_groups = 0
+            # The early-summary estimate only matches calc_messages when trimming
+            # left the history untouched.
+            if history_estimate is not None and not tool_outputs_trimmed:
+                estimated_tokens = history_estimate + self._estimate_messages_tokens(
+                    extra_messages
+                )
+            else:
+                estimated_tokens = self._estimate_messages_tokens(calc_messages)
 
             # Only skip precise calculation if we are clearly below the limit
             # max_context_tokens == 0 means "no limit", skip reduction entirely
@@ -3358,7 +5385,10 @@ class Filter:
                 )
             else:
                 total_tokens = await asyncio.to_thread(
-                    self._calculate_messages_tokens, calc_messages
+                    self._calculate_messages_tokens,
+                    calc_messages,
+                    chat_id,
+                    tokenizer,
                 )
 
             if total_tokens > max_context_tokens and max_context_tokens > 0:
@@ -3368,27 +5398,33 @@ class Filter:
                     event_call=__event_call__,
                 )
 
-                # Use atomic grouping to preserve tool-calling integrity
+                # Use atomic grouping to preserve tool-calling integrity; never drop
+                # past the first external chat reference.
                 trimmable = candidate_messages[effective_keep_first:]
-                atomic_groups = self._get_atomic_groups(trimmable)
-
-                while total_tokens > max_context_tokens and len(atomic_groups) > 1:
-                    dropped_group_indices = atomic_groups.pop(0)
-                    dropped_tokens = 0
-                    for _ in range(len(dropped_group_indices)):
-                        dropped = trimmable.pop(0)
-                        if self._is_external_reference_message(dropped):
-                            trimmable.insert(0, dropped)
-                            break
-                        if total_tokens == estimated_tokens:
-                            dropped_tokens += self._estimate_content_tokens(
-                                dropped.get("content", "")
-                            )
-                        else:
-                            dropped_tokens += self._count_tokens(
-                                str(dropped.get("content", ""))
-                            )
-                    total_tokens -= dropped_tokens
+                stop_index = next(
+                    (
+                        i
+                        for i, msg in enumerate(trimmable)
+                        if self._is_external_reference_message(msg)
+                    ),
+                    None,
+                )
+                trimmable_token_counts = await asyncio.to_thread(
+                    self._calculate_message_token_list,
+                    trimmable,
+                    chat_id,
+                    tokenizer,
+                )
+                cut_index, dropped_tokens, dropped_groups = (
+                    self._plan_atomic_group_drop(
+                        trimmable,
+                        trimmable_token_counts,
+                        total_tokens - max_context_tokens,
+                        stop_index=stop_index,
+                    )
+                )
+                trimmable = trimmable[cut_index:]
+                total_tokens -= dropped_tokens
 
                 candidate_messages = (
                     candidate_messages[:effective_keep_first] + trimmable
@@ -3399,6 +5435,13 @@ class Filter:
                     event_call=__event_call__,
                 )
 
+            inlet_metrics = {
+                "preflight_ms": round((time.perf_counter() - preflight_started) * 1000, 3),
+                "tokens_before": total_tokens + dropped_tokens,
+                "tokens_after": total_tokens,
+                "groups_dropped": dropped_groups,
+            }
+
             # Send status notification (Context Usage format)
             if max_context_tokens > 0:
                 usage_ratio = total_tokens / max_context_tokens
@@ -3461,6 +5504,14 @@ class Filter:
                 }
             )
 
+        self._record_metric(
+            "inlet",
+            chat_id=chat_id,
+            total_ms=round((time.perf_counter() - inlet_started) * 1000, 3),
+            summary_injected=bool(summary_record),
+            messages_sent=len(final_messages),
+            **inlet_metrics,
+        )
         return body
 
     async def outlet(
@@ -3477,6 +5528,30 @@ class Filter:
         Executed after the LLM response is complete.
         Calculates Token count in the background and triggers summary generation (does not block current response, does not affect content output).
         """
+        try:
+            return await self._process_outlet(
+                body,
+                __user__=__user__,
+                __metadata__=__metadata__,
+                __model__=__model__,
+                __event_emitter__=__event_emitter__,
+                __event_call__=__event_call__,
+                __request__=__request__,
+            )
+        finally:
+            await self._flush_frontend_logs(__event_call__)
+
+    async def _process_outlet(
+        self,
+        body: dict,
+        __user__: Optional[dict] = None,
+        __metadata__: dict = None,
+        __model__: dict = None,
+        __event_emitter__: Callable[[Any], Awaitable[None]] = None,
+        __event_call__: Callable[[Any], Awaitable[None]] = None,
+        __request__: Request = None,
+    ) -> dict:
+        """Outlet implementation; `outlet` flushes buffered frontend logs afterwards."""
         # Check if compression should be skipped (e.g., for copilot_sdk)
         if self._should_skip_compression(body, __model__):
             if self.valves.debug_mode:
@@ -3552,6 +5627,12 @@ class Filter:
                 else "outlet-body"
             )
 
+        if self.valves.enable_tool_output_offload:
+            # Summaries should see the full tool outputs behind any trimmed placeholders.
+            summary_messages = await asyncio.to_thread(
+                self._expand_offloaded_tool_outputs, summary_messages, chat_id
+            )
+
         restored_count_before = len(summary_messages)
         summary_messages = self._restore_pending_inlet_messages(chat_id, summary_messages)
         if len(summary_messages) != restored_count_before:
@@ -3579,20 +5660,16 @@ class Filter:
         summary_body = dict(body)
         summary_body["messages"] = summary_messages
 
-        # Process Token calculation and summary generation asynchronously in the background
-        # Use a lock to prevent multiple concurrent summary tasks for the same chat
-        chat_lock = self._get_chat_lock(chat_id)
-
-        if chat_lock.locked():
-            if self.valves.debug_mode:
-                logger.info(
-                    f"[Outlet] Skipping summary task for {chat_id}: Task already in progress"
-                )
-            return body
-
-        asyncio.create_task(
-            self._locked_summary_task(
-                chat_lock,
+        # Process Token calculation and summary generation asynchronously in the background.
+        # The scheduler runs one job per chat at a time and coalesces bursts so only the
+        # latest outlet's snapshot is kept while an earlier job is still running.
+        scheduler = self._summary_scheduler
+        scheduler.max_concurrency = self.valves.max_concurrent_summary_jobs
+        scheduler.max_queued = self.valves.max_queued_summary_jobs
+        job_status = scheduler.submit(
+            chat_id,
+            functools.partial(
+                self._check_and_generate_summary_async,
                 chat_id,
                 model,
                 summary_body,
@@ -3602,38 +5679,22 @@ class Filter:
                 __event_emitter__,
                 __event_call__,
                 __request__,
-            )
+            ),
         )
 
-        return body
-
-    async def _locked_summary_task(
-        self,
-        lock: asyncio.Lock,
-        chat_id: str,
-        model: str,
-        body: dict,
-        user_data: Optional[dict],
-        target_compressed_count: Optional[int],
-        lang: str,
-        __event_emitter__: Callable,
-        __event_call__: Callable,
-        __request__: Request = None,
-    ):
-        """Wrapper to run summary generation with an async lock."""
-        async with lock:
-            await self._check_and_generate_summary_async(
-                chat_id,
-                model,
-                body,
-                user_data,
-                target_compressed_count,
-                lang,
-                __event_emitter__,
-                __event_call__,
-                __request__,
+        if job_status == "rejected":
+            logger.warning(
+                f"[Outlet] Summary queue full ({scheduler.max_queued} chats waiting), dropping summary job for {chat_id}"
+            )
+        if self.valves.debug_mode or self.valves.show_debug_log:
+            stats = scheduler.stats()
+            await self._log(
+                f"[Outlet] 🗂️ Summary job {job_status} | running={stats['running']} | queued={stats['queued']} | coalesced={stats['coalesced']} | rejected={stats['rejected']}",
+                event_call=__event_call__,
             )
 
+        return body
+
     async def _check_and_generate_summary_async(
         self,
         chat_id: str,
@@ -3671,6 +5732,16 @@ class Filter:
             compression_threshold_tokens = thresholds.get(
                 "compression_threshold_tokens", self.valves.compression_threshold_tokens
             )
+            tokenizer = self._get_model_tokenizer(model, thresholds)
+            early_summary_tokens = int(
+                compression_threshold_tokens * self.valves.early_summary_ratio
+            )
+            # Precise counting starts at the lowest watermark that can trigger a summary.
+            trigger_tokens = (
+                early_summary_tokens
+                if early_summary_tokens > 0
+                else compression_threshold_tokens
+            )
 
             await self._log(
                 "\n[🔍 Background Calculation] Starting full-history token count...",
@@ -3678,12 +5749,13 @@ class Filter:
             )
 
             # --- Fast Estimation Check ---
+            count_started = time.perf_counter()
             estimated_tokens = self._estimate_messages_tokens(messages)
 
             # For triggering summary generation, we need to be more precise if we are in the grey zone
             # Margin is 15% (skip tiktoken if estimated is < 85% of threshold)
             # Note: We still use tiktoken if we exceed threshold, because we want an accurate usage status report
-            if estimated_tokens < compression_threshold_tokens * 0.85:
+            if estimated_tokens < trigger_tokens * 0.85:
                 current_tokens = estimated_tokens
                 await self._log(
                     "[🔍 Background Calculation] Full-history estimate below threshold\n"
@@ -3693,7 +5765,11 @@ class Filter:
             else:
                 # Calculate Token count precisely in a background thread
                 current_tokens = await asyncio.to_thread(
-                    self._calculate_messages_tokens, messages
+                    self._calculate_messages_tokens,
+                    messages,
+                    chat_id,
+                    tokenizer,
+                    True,
                 )
                 await self._log(
                     "[🔍 Background Calculation] Full-history precise token count\n"
@@ -3701,6 +5777,14 @@ class Filter:
                     event_call=__event_call__,
                 )
 
+            self._record_metric(
+                "summary_check",
+                chat_id=chat_id,
+                count_ms=round((time.perf_counter() - count_started) * 1000, 3),
+                history_tokens=current_tokens,
+                precise=current_tokens != estimated_tokens,
+            )
+
             # Send status notification (Context Usage format)
             if __event_emitter__:
                 max_context_tokens = thresholds.get(
@@ -3753,6 +5837,44 @@ class Filter:
                     __event_call__,
                     __request__,
                 )
+            elif current_tokens >= early_summary_tokens > 0 and (
+                chat_id in self._early_summaries
+                or await asyncio.to_thread(self._load_summary_record_cached, chat_id)
+                is None
+            ):
+                held_target = self._early_summaries.get(chat_id)
+                if (
+                    held_target is not None
+                    and target_compressed_count is not None
+                    and target_compressed_count
+                    < held_target + max(1, self.valves.keep_last)
+                ):
+                    await self._log(
+                        "[🔍 Background Calculation] Early summary already held\n"
+                        f"held_target={held_target} | target_compressed_count={target_compressed_count}",
+                        event_call=__event_call__,
+                    )
+                    return
+
+                await self._log(
+                    "[🔍 Background Calculation] 🔮 Early summary watermark reached\n"
+                    f"source_history_tokens={current_tokens} | early_summary_tokens={early_summary_tokens} | compression_threshold_tokens={compression_threshold_tokens}",
+                    event_call=__event_call__,
+                )
+
+                # Summarize ahead of the threshold; inlet holds the result back until it is crossed.
+                await self._generate_summary_async(
+                    messages,
+                    chat_id,
+                    body,
+                    user_data,
+                    target_compressed_count,
+                    lang,
+                    __event_emitter__,
+                    __event_call__,
+                    __request__,
+                    hold_until_threshold=True,
+                )
             else:
                 await self._log(
                     "[🔍 Background Calculation] Full-history threshold not reached\n"
@@ -3786,6 +5908,8 @@ class Filter:
                     }
                 )
             logger.exception("[🔍 Background Calculation] Unhandled exception")
+        finally:
+            await self._flush_frontend_logs(__event_call__)
 
     def _clean_model_id(self, model_id: Optional[str]) -> Optional[str]:
         """Cleans the model ID by removing whitespace and quotes."""
@@ -3805,6 +5929,7 @@ class Filter:
         __event_emitter__: Callable[[Any], Awaitable[None]] = None,
         __event_call__: Callable[[Any], Awaitable[None]] = None,
         __request__: Request = None,
+        hold_until_threshold: bool = False,
     ):
         """
         Generates summary asynchronously (runs in background, does not block response).
@@ -3812,8 +5937,12 @@ class Filter:
         1. Extract the visible message slice that maps to the next original-history boundary.
         2. If the summary model window is smaller than that slice, keep the oldest slice and trim the newest atomic groups.
         3. Generate summary for the remaining messages and save the exact covered boundary.
+
+        With `hold_until_threshold`, the saved summary is an early one that inlet
+        only injects once the history reaches the compression threshold.
         """
         try:
+            summary_started = time.perf_counter()
             await self._log(
                 f"\n[🤖 Async Summary Task] Starting...", event_call=__event_call__
             )
@@ -3930,9 +6059,63 @@ class Filter:
                     "[🤖 Async Summary Task] No max_context_tokens limit set (0). Skipping final request budgeting.",
                     event_call=__event_call__,
                 )
+
+            # Oversized ranges go through map-reduce so no history is dropped; the
+            # shrink loop below stays as the fallback.
+            new_summary = None
+            if max_context_tokens > 0 and self.valves.enable_hierarchical_summary:
+                full_prompt_tokens = await asyncio.to_thread(
+                    self._count_tokens,
+                    self._build_summary_prompt(
+                        self._format_messages_for_summary(middle_messages),
+                        previous_summary=previous_summary,
+                    ),
+                )
+                if full_prompt_tokens > request_limits["max_input_tokens"]:
+                    await self._log(
+                        f"[🤖 Async Summary Task] Summary input ({full_prompt_tokens} Tokens) exceeds budget ({request_limits['max_input_tokens']}), using hierarchical summarization",
+                        event_call=__event_call__,
+                    )
+                    if __event_emitter__:
+                        await __event_emitter__(
+                            {
+                                "type": "status",
+                                "data": {
+                                    "description": self._get_translation(
+                                        lang, "status_generating_summary"
+                                    ),
+                                    "done": False,
+                                },
+                            }
+                        )
+                    hierarchical_previous = previous_summary
+                    if protected_prefix > 0:
+                        hierarchical_previous = self._extract_text_content(
+                            middle_messages[0].get("content", "")
+                        )
+                    new_summary = (
+                        await self._summarize_hierarchically(
+                            middle_messages[protected_prefix:],
+                            summary_model_id,
+                            body,
+                            user_data,
+                            request_limits["max_input_tokens"],
+                            previous_summary=hierarchical_previous,
+                            __event_call__=__event_call__,
+                            __request__=__request__,
+                        )
+                        or None
+                    )
+                    if new_summary is None:
+                        await self._log(
+                            "[🤖 Async Summary Task] ⚠️ Hierarchical summarization unavailable, falling back to trimming the newest messages",
+                            log_type="warning",
+                            event_call=__event_call__,
+                        )
+
             # Fit the exact final request prompt, not just middle-message heuristics.
             prompt_tokens = 0
-            while max_context_tokens > 0:
+            while max_context_tokens > 0 and new_summary is None:
                 if not middle_messages:
                     await self._log(
                         "[🤖 Async Summary Task] Middle messages empty after final request shrink, skipping summary generation",
@@ -4013,37 +6196,37 @@ class Filter:
 
             # 4. Build conversation text using the fitted request payload.
             conversation_text = self._format_messages_for_summary(middle_messages)
-            if max_context_tokens > 0:
+            if max_context_tokens > 0 and new_summary is None:
                 await self._log(
                     f"[🤖 Async Summary Task] Final fitted summary input: {prompt_tokens} / {request_limits['max_input_tokens']} Tokens",
                     event_call=__event_call__,
                 )
 
-            # 6. Call LLM to generate new summary
+            # 6. Call LLM to generate new summary (unless map-reduce already produced it)
+            if new_summary is None:
+                # Send status notification for starting summary generation
+                if __event_emitter__:
+                    await __event_emitter__(
+                        {
+                            "type": "status",
+                            "data": {
+                                "description": self._get_translation(
+                                    lang, "status_generating_summary"
+                                ),
+                                "done": False,
+                            },
+                        }
+                    )
 
-            # Send status notification for starting summary generation
-            if __event_emitter__:
-                await __event_emitter__(
-                    {
-                        "type": "status",
-                        "data": {
-                            "description": self._get_translation(
-                                lang, "status_generating_summary"
-                            ),
-                            "done": False,
-                        },
-                    }
+                new_summary = await self._call_summary_llm(
+                    conversation_text,
+                    {**body, "model": summary_model_id},
+                    user_data,
+                    __event_call__,
+                    __request__,
+                    previous_summary=previous_summary,
                 )
 
-            new_summary = await self._call_summary_llm(
-                conversation_text,
-                {**body, "model": summary_model_id},
-                user_data,
-                __event_call__,
-                __request__,
-                previous_summary=previous_summary,
-            )
-
             if not new_summary:
                 await self._log(
                     "[🤖 Async Summary Task] ⚠️ Summary generation returned empty result, skipping save",
@@ -4068,6 +6251,18 @@ class Filter:
             await asyncio.to_thread(
                 self._save_summary, chat_id, new_summary, saved_compressed_count
             )
+            if hold_until_threshold:
+                self._hold_early_summary(chat_id, target_compressed_count)
+            else:
+                self._early_summaries.pop(chat_id, None)
+            self._record_metric(
+                "summary",
+                chat_id=chat_id,
+                total_ms=round((time.perf_counter() - summary_started) * 1000, 3),
+                messages_summarized=len(middle_messages),
+                compressed_count=saved_compressed_count,
+                early=hold_until_threshold,
+            )
 
             # Send completion status notification
             if __event_emitter__:
@@ -4154,12 +6349,16 @@ class Filter:
                         if not is_in_head:
                             next_context = [system_prompt_msg] + next_context
 
-                    # 4. Calculate Tokens
-                    token_count = self._calculate_messages_tokens(next_context)
-
-                    # 5. Get Thresholds & Calculate Ratio
+                    # 4. Get Thresholds & Calculate Tokens
                     model = self._clean_model_id(body.get("model"))
                     thresholds = self._get_model_thresholds(model)
+                    token_count = self._calculate_messages_tokens(
+                        next_context,
+                        chat_id,
+                        self._get_model_tokenizer(model, thresholds),
+                    )
+
+                    # 5. Calculate Ratio
                     max_context_tokens = thresholds.get(
                         "max_context_tokens", self.valves.max_context_tokens
                     )
@@ -4227,6 +6426,207 @@ class Filter:
 
             logger.exception("[🤖 Async Summary Task] Unhandled exception")
 
+    def _split_summary_windows(
+        self, messages: List[Dict], window_tokens: int
+    ) -> List[List[Dict]]:
+        """
+        Greedily packs atomic message groups into windows of at most `window_tokens`.
+        Packing starts from the oldest message, so earlier windows keep the same
+        boundaries as the range grows and their cached summaries stay reusable.
+        A single group larger than the window gets a window of its own.
+        """
+        windows = []
+        current: List[Dict] = []
+        current_tokens = 0
+
+        for group in self._get_atomic_groups(messages):
+            group_messages = [messages[i] for i in group]
+            group_tokens = _estimate_text_tokens(
+                self._format_messages_for_summary(group_messages)
+            )
+            if current and current_tokens + group_tokens > window_tokens:
+                windows.append(current)
+                current, current_tokens = [], 0
+            current.extend(group_messages)
+            current_tokens += group_tokens
+
+        if current:
+            windows.append(current)
+        return windows
+
+    async def _summarize_windows(
+        self,
+        texts: List[str],
+        window_tokens: int,
+        summary_model_id: str,
+        body: dict,
+        user_data: Optional[dict],
+        __event_call__: Callable = None,
+        __request__: Request = None,
+    ) -> Optional[List[str]]:
+        """
+        Map step: summarizes each window in parallel, reusing cached summaries for
+        windows whose text is unchanged. Returns None if any window fails, since a
+        merged summary with a silent gap would still claim to cover that range.
+        """
+        results: List[Optional[str]] = [None] * len(texts)
+        jobs = []
+        job_slots = []
+
+        for index, text in enumerate(texts):
+            text_tokens = _estimate_text_tokens(text)
+            if text_tokens > window_tokens:
+                # An oversized atomic group: keep its head so the request stays bounded.
+                text = text[: max(1, int(len(text) * window_tokens / text_tokens))]
+            cache_key = hashlib.sha256(
+                f"{summary_model_id}\0{text}".encode("utf-8", "surrogatepass")
+            ).hexdigest()
+            cached = self._summary_chunk_cache.get(cache_key)
+            if cached is not None:
+                self._summary_chunk_cache.move_to_end(cache_key)
+                results[index] = cached
+                continue
+
+            job_slots.append((index, cache_key))
+            jobs.append(
+                (
+                    f"window {index + 1}/{len(texts)}",
+                    functools.partial(
+                        self._call_summary_llm,
+                        text,
+                        {**body, "model": summary_model_id},
+                        user_data,
+                        __event_call__,
+                        __request__,
+                        previous_summary=None,
+                    ),
+                )
+            )
+
+        await self._log(
+            f"[🤖 Hierarchical Summary] Map step: {len(texts)} window(s), {len(texts) - len(jobs)} reused from chunk cache",
+            event_call=__event_call__,
+        )
+
+        generated = await self._run_bounded_jobs(
+            jobs,
+            self.valves.summary_chunk_concurrency,
+            self.valves.summary_chunk_timeout_seconds,
+            "[🤖 Hierarchical Summary]",
+            __event_call__=__event_call__,
+        )
+        for (index, cache_key), summary in zip(job_slots, generated):
+            if not summary:
+                return None
+            results[index] = summary
+            self._summary_chunk_cache[cache_key] = summary
+            while len(self._summary_chunk_cache) > SUMMARY_CHUNK_CACHE_MAX_ENTRIES:
+                self._summary_chunk_cache.popitem(last=False)
+
+        return results
+
+    async def _summarize_hierarchically(
+        self,
+        messages: List[Dict],
+        summary_model_id: str,
+        body: dict,
+        user_data: Optional[dict],
+        max_input_tokens: int,
+        previous_summary: Optional[str] = None,
+        __event_call__: Callable = None,
+        __request__: Request = None,
+    ) -> str:
+        """
+        Map-reduce summarization for ranges larger than the summary model window.
+        1. Split the range into windows that fit one summary request.
+        2. Summarize the windows in parallel (cached by content hash).
+        3. Merge the window summaries, reducing again in levels if they still do not fit.
+        Returns "" when the range cannot be summarized this way.
+        """
+        prompt_overhead = await asyncio.to_thread(
+            self._count_tokens, self._build_summary_prompt("")
+        )
+        # Windows are sized with the fast estimator, so leave 10% headroom.
+        window_tokens = int((max_input_tokens - prompt_overhead) * 0.9)
+        if window_tokens < HIERARCHICAL_SUMMARY_MIN_WINDOW_TOKENS:
+            await self._log(
+                f"[🤖 Hierarchical Summary] ⚠️ Summary window too small ({window_tokens} Tokens), skipping map-reduce",
+                log_type="warning",
+                event_call=__event_call__,
+            )
+            return ""
+
+        texts = [
+            self._format_messages_for_summary(window)
+            for window in self._split_summary_windows(messages, window_tokens)
+        ]
+        if not texts:
+            return ""
+
+        # A previous summary that would crowd out the merge step is summarized as
+        # the first window instead of being passed as working memory.
+        if previous_summary and _estimate_text_tokens(previous_summary) > window_tokens // 2:
+            texts.insert(0, previous_summary)
+            previous_summary = None
+        merge_budget = window_tokens - _estimate_text_tokens(previous_summary or "")
+
+        merged_text = ""
+        for level in range(1, HIERARCHICAL_SUMMARY_MAX_LEVELS + 1):
+            if len(texts) == 1 and _estimate_text_tokens(texts[0]) <= merge_budget:
+                merged_text = texts[0]
+                break
+
+            summaries = await self._summarize_windows(
+                texts,
+                window_tokens,
+                summary_model_id,
+                body,
+                user_data,
+                __event_call__,
+                __request__,
+            )
+            if summaries is None:
+                return ""
+
+            segments = [
+                f"<segment index=\"{index}\" of=\"{len(summaries)}\">\n{summary}\n</segment>"
+                for index, summary in enumerate(summaries, 1)
+            ]
+            merged_text = "\n\n".join(segments)
+            await self._log(
+                f"[🤖 Hierarchical Summary] Level {level}: {len(texts)} window(s) -> {_estimate_text_tokens(merged_text)} Tokens of segment summaries",
+                event_call=__event_call__,
+            )
+            if _estimate_text_tokens(merged_text) <= merge_budget or len(segments) == 1:
+                break
+
+            # Pack segment summaries into windows for the next reduce level.
+            texts, current, current_tokens = [], [], 0
+            for segment in segments:
+                segment_tokens = _estimate_text_tokens(segment)
+                if current and current_tokens + segment_tokens > window_tokens:
+                    texts.append("\n\n".join(current))
+                    current, current_tokens = [], 0
+                current.append(segment)
+                current_tokens += segment_tokens
+            if current:
+                texts.append("\n\n".join(current))
+
+        merged_tokens = _estimate_text_tokens(merged_text)
+        if merged_tokens > merge_budget > 0:
+            merged_text = merged_text[
+                : max(1, int(len(merged_text) * merge_budget / merged_tokens))
+            ]
+
+        return await self._call_summary_llm(
+            merged_text,
+            {**body, "model": summary_model_id},
+            user_data,
+            __event_call__,
+            __request__,
+            previous_summary=previous_summary,
+        )
+
     def _truncate_messages_for_summary(self, messages: list, max_tokens: int) -> str:
         formatted = []
         total_tokens = 0
@@ -4506,7 +6906,14 @@ Return only the XML working memory:
             request = __request__ or Request(scope={"type": "http", "app": webui_app})
 
             # Call generate_chat_completion
+            llm_started = time.perf_counter()
             response = await generate_chat_completion(request, payload, user)
+            self._record_metric(
+                "summary_llm",
+                model=model,
+                latency_ms=round((time.perf_counter() - llm_started) * 1000, 3),
+                prompt_chars=len(summary_prompt),
+            )
 
             # Handle JSONResponse (some backends return JSONResponse instead of dict)
             if hasattr(response, "body"):
@@ -4555,6 +6962,7 @@ Return only the XML working memory:
             return summary
 
         except Exception as e:
+            self._record_metric("summary_llm_error", model=model)
             error_msg = str(e)
             # Handle specific error messages
             if "Model not found" in error_msg:
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Standalone benchmark for the async_context_compression hot paths.
+async_context_compression 热点路径的独立基准测试。
+
+Usage:
+    python benchmark_async_context_compression.py                      # 10/100/1000-message chats
+    python benchmark_async_context_compression.py --sizes 100 --repeat 20
+    python benchmark_async_context_compression.py --json results.json  # save results
+    python benchmark_async_context_compression.py --baseline results.json --max-regression 0.25
+
+Runs outside Open WebUI: `open_webui` modules are stubbed, `generate_chat_completion`
+returns a canned summary, and `ChatSummary` lives in an in-memory SQLite database.
+SQLite needs sqlalchemy and pydantic; without them the plugin is loaded through the
+unit-test stubs and the database-backed cases are skipped.
+
+Synthetic chats are seeded and mix English/Chinese/Japanese/Russian text, native
+tool-call groups (assistant tool_calls -> tool -> assistant) and large tool outputs.
+With --baseline, the exit code is 1 when any case's median is slower than the
+baseline by more than --max-regression.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+from copy import deepcopy
+from typing import Any, Callable, Dict, List
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_PATH = os.path.join(PLUGIN_DIR, "async_context_compression.py")
+MODULE_NAME = "async_context_compression_benchmark"
+CANNED_SUMMARY = "<working_memory>benchmark summary</working_memory>"
+
+TEXT_SNIPPETS = [
+    "Could you refactor the session cache so it survives worker restarts? ",
+    "def load(path):\n    with open(path) as fh:\n        return json.load(fh)\n",
+    "请帮我总结一下这个项目的部署流程，以及数据库迁移需要注意的地方。",
+    "このエラーの原因を調べて、再現手順をまとめてください。",
+    "Пожалуйста, проверьте конфигурацию и перезапустите сервис.",
+]
+
+
+def _ensure_module(name: str) -> types.ModuleType:
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        sys.modules[name] = module
+    return module
+
+
+def _install_openwebui_stubs(chat_store: Dict[str, Any]) -> None:
+    """Stub the Open WebUI modules the plugin imports and back its DB with in-memory SQLite."""
+    for name in ("open_webui", "open_webui.utils", "open_webui.models", "open_webui.internal"):
+        _ensure_module(name)
+
+    async def generate_chat_completion(request, payload, user):
+        return {"choices": [{"message": {"content": CANNED_SUMMARY}}]}
+
+    class Users:
+        @staticmethod
+        def get_user_by_id(user_id):
+            return types.SimpleNamespace(id=user_id, email="bench@example.com")
+
+    class Models:
+        @staticmethod
+        def get_model_by_id(model_id):
+            return None
+
+    class Chats:
+        @staticmethod
+        def get_chat_by_id(chat_id):
+            chat = chat_store.get(chat_id)
+            return types.SimpleNamespace(chat=chat) if chat is not None else None
+
+    _ensure_module("open_webui.utils.chat").generate_chat_completion = (
+        generate_chat_completion
+    )
+    _ensure_module("open_webui.models.users").Users = Users
+    _ensure_module("open_webui.models.models").Models = Models
+    _ensure_module("open_webui.models.chats").Chats = Chats
+    _ensure_module("open_webui.main").app = object()
+    _ensure_module("open_webui.env").DATABASE_SCHEMA = None
+
+    if importlib.util.find_spec("fastapi") is None:
+
+        class Request:
+            def __init__(self, *args, **kwargs):
+                pass
+
+        _ensure_module("fastapi")
+        _ensure_module("fastapi.requests").Request = Request
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    db_module = _ensure_module("open_webui.internal.db")
+    db_module.engine = engine
+    db_module.SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def load_plugin(chat_store: Dict[str, Any]) -> tuple[types.ModuleType, bool]:
+    """Load the plugin module. Returns (module, sqlite_backed)."""
+    has_db_deps = all(
+        importlib.util.find_spec(name) is not None for name in ("sqlalchemy", "pydantic")
+    )
+    if not has_db_deps:
+        sys.path.insert(0, PLUGIN_DIR)
+        import test_async_context_compression as harness
+
+        harness.module.Chats = types.SimpleNamespace(
+            get_chat_by_id=lambda chat_id: (
+                types.SimpleNamespace(chat=chat_store[chat_id])
+                if chat_id in chat_store
+                else None
+            )
+        )
+        return harness.module, False
+
+    _install_openwebui_stubs(chat_store)
+    spec = importlib.util.spec_from_file_location(MODULE_NAME, PLUGIN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[MODULE_NAME] = module
+    assert spec.loader is not None
+    spec.loader.exec_module(module)
+    return module, True
+
+
+def build_chat(message_count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Build a deterministic chat with mixed scripts and native tool-call groups."""
+    rng = random.Random(seed + message_count)
+    messages: List[Dict[str, Any]] = [
+        {"id": "sys", "role": "system", "content": "You are a helpful assistant."}
+    ]
+    index = 0
+    while len(messages) < message_count:
+        index += 1
+        messages.append(
+            {
+                "id": f"u{index}",
+                "role": "user",
+                "content": "".join(rng.choice(TEXT_SNIPPETS) for _ in range(rng.randint(1, 6))),
+            }
+        )
+        if rng.random() < 0.35:
+            call_id = f"call_{index}"
+            output_size = rng.choice([400, 2_000, 8_000, 20_000])
+            messages.append(
+                {
+                    "id": f"a{index}t",
+                    "role": "assistant",
+                    "content": "",
+                    "tool_calls": [
+                        {
+                            "id": call_id,
+                            "type": "function",
+                            "function": {"name": "search", "arguments": '{"q": "x"}'},
+                        }
+                    ],
+                }
+            )
+            messages.append(
+                {
+                    "id": f"t{index}",
+                    "role": "tool",
+                    "tool_call_id": call_id,
+                    "content": (rng.choice(TEXT_SNIPPETS) * (output_size // 60 + 1))[
+                        :output_size
+                    ],
+                }
+            )
+        messages.append(
+            {
+                "id": f"a{index}",
+                "role": "assistant",
+                "content": "".join(rng.choice(TEXT_SNIPPETS) for _ in range(rng.randint(2, 10))),
+            }
+        )
+    return messages[:message_count]
+
+
+def measure(
+    run: Callable[[Any], Any],
+    prepare: Callable[[], Any],
+    repeat: int,
+) -> Dict[str, float]:
+    """Time `run(prepare())` `repeat` times; preparation is excluded from the timing."""
+    samples = []
+    for _ in range(repeat):
+        arg = prepare()
+        started = time.perf_counter()
+        run(arg)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def wait_for_default_encoding(module: types.ModuleType, timeout: float = 30.0) -> bool:
+    """Block until the plugin's background-warmed default tiktoken encoding is loaded."""
+    registry = module.TOKENIZER_REGISTRY
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if registry.get(module.DEFAULT_TOKENIZER_ENCODING) is not None:
+            return True
+        if module.tiktoken is None or registry.stats()["failed"]:
+            return False
+        time.sleep(0.05)
+    return False
+
+
+def run_benchmarks(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    chat_store: Dict[str, Any] = {}
+    module, sqlite_backed = load_plugin(chat_store)
+    module.logger.disabled = True
+
+    plugin = module.Filter()
+    precise_ready = wait_for_default_encoding(module)
+    if not sqlite_backed:
+        plugin._load_summary_record = lambda chat_id: None
+        plugin._load_summary_version = lambda chat_id: None
+
+    async def noop_log(*args, **kwargs):
+        return None
+
+    plugin._log = noop_log
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Dict[str, float]] = {}
+
+    for size in sizes:
+        chat = build_chat(size)
+        chat_id = f"bench-{size}"
+        chat_store[chat_id] = {"messages": chat}
+        total_chars = sum(len(m.get("content") or "") for m in chat)
+        print(f"\n== {size} messages ({total_chars:,} chars) ==")
+
+        def record(case: str, stats: Dict[str, float]) -> None:
+            key = f"{case}[{size}]"
+            results[key] = stats
+            print(
+                f"  {case:<28} median {stats['median_ms']:>10.3f} ms"
+                f"   min {stats['min_ms']:>10.3f} ms"
+            )
+
+        def estimate_cold(messages):
+            module.ESTIMATE_TOKEN_CACHE.clear()
+            plugin._estimate_messages_tokens(messages)
+
+        record("estimate_tokens_cold", measure(estimate_cold, lambda: chat, repeat))
+        record(
+            "estimate_tokens_warm",
+            measure(plugin._estimate_messages_tokens, lambda: chat, repeat),
+        )
+        record("get_atomic_groups", measure(plugin._get_atomic_groups, lambda: chat, repeat))
+        record(
+            "trim_native_tool_outputs",
+            measure(
+                lambda messages: plugin._trim_native_tool_outputs(messages, "en-US"),
+                lambda: deepcopy(chat),
+                repeat,
+            ),
+        )
+
+        if precise_ready:
+            record(
+                "precise_tokens_ledger",
+                measure(
+                    lambda messages: plugin._calculate_messages_tokens(messages, chat_id),
+                    lambda: chat,
+                    repeat,
+                ),
+            )
+
+        if sqlite_backed:
+            plugin._save_summary(chat_id, CANNED_SUMMARY, max(1, size // 2))
+
+        def inlet_case(max_context_tokens: int) -> Callable[[dict], Any]:
+            def run(body: dict) -> Any:
+                plugin.valves.max_context_tokens = max_context_tokens
+                plugin.valves.compression_threshold_tokens = max_context_tokens // 2
+                return loop.run_until_complete(
+                    plugin.inlet(
+                        body,
+                        __user__={"id": "bench-user", "language": "en-US"},
+                        __metadata__={"chat_id": chat_id, "message_id": "m"},
+                    )
+                )
+
+            return run
+
+        def inlet_body() -> dict:
+            return {
+                "model": "bench-model",
+                "messages": deepcopy(chat),
+                "params": {"function_calling": "native"},
+                "metadata": {"chat_id": chat_id},
+            }
+
+        record("inlet", measure(inlet_case(10_000_000), inlet_body, repeat))
+        # A context limit far below the chat size forces the oldest-message drop loop.
+        record("inlet_drop_loop", measure(inlet_case(2_000), inlet_body, repeat))
+
+    loop.close()
+    if not sqlite_backed:
+        print("\n(sqlalchemy/pydantic not installed: summaries were not SQLite-backed)")
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    max_regression: float,
+) -> List[str]:
+    regressions = []
+    for key, stats in results.items():
+        previous = baseline.get(key)
+        if not previous or previous.get("median_ms", 0) <= 0:
+            continue
+        ratio = stats["median_ms"] / previous["median_ms"]
+        if ratio > 1 + max_regression:
+            regressions.append(
+                f"{key}: {previous['median_ms']:.3f} ms -> {stats['median_ms']:.3f} ms ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--sizes",
+        default="10,100,1000",
+        help="Comma-separated chat sizes in messages (default: 10,100,1000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Timed runs per case (default: 10)"
+    )
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous --json file")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="Allowed median slowdown versus the baseline (default: 0.25 = 25%%)",
+    )
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = run_benchmarks(sizes, max(1, args.repeat))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nRegressions beyond threshold:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions beyond threshold.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
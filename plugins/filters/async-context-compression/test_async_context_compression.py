@@ -4,6 +4,7 @@ import os
 import sys
 import types
 import unittest
+from copy import deepcopy
 
 
 PLUGIN_PATH = os.path.join(os.path.dirname(__file__), "async_context_compression.py")
@@ -128,6 +129,22 @@ module.Filter._init_database = lambda self: None
 class TestAsyncContextCompression(unittest.TestCase):
     def setUp(self):
         self.filter = module.Filter()
+        # Tests may register fake encodings into the module-global registry.
+        registry = module.TOKENIZER_REGISTRY
+        with registry._lock:
+            self._registry_snapshot = (
+                dict(registry._encodings),
+                dict(registry._caches),
+                set(registry._failed),
+            )
+
+    def tearDown(self):
+        registry = module.TOKENIZER_REGISTRY
+        encodings, caches, failed = self._registry_snapshot
+        with registry._lock:
+            registry._encodings = encodings
+            registry._caches = caches
+            registry._failed = failed
 
     def test_inlet_logs_tool_trimming_outcome_when_no_oversized_outputs(self):
         self.filter.valves.show_debug_log = True
@@ -288,6 +305,137 @@ class TestAsyncContextCompression(unittest.TestCase):
         self.assertNotIn("x" * 200, messages[0]["content"])
         self.assertTrue(messages[0]["metadata"]["tool_outputs_trimmed"])
 
+    def test_tool_block_scanner_matches_regex_and_trims_card_results(self):
+        import re
+
+        content = (
+            '<details type="tool_calls" id="a" result="&quot;short&quot;">\n</details>\n'
+            "text between\n"
+            '<details type="tool_calls" id="b" arguments="{}">\n</details>\n'
+            f'<details type="tool_calls" id="c" result="{"z" * 700}">\n</details>'
+            '<details type="reasoning">result="not a tool"</details>'
+        )
+        expected = []
+        for block in re.finditer(r'<details type="tool_calls"[\s\S]*?</details>', content):
+            result = re.search(r'result="([^"]*)"', block.group(0))
+            if result:
+                expected.append(
+                    (block.start() + result.start(1), block.start() + result.end(1))
+                )
+
+        self.assertEqual(list(module._scan_tool_block_result_spans(content)), expected)
+
+        messages = [{"role": "assistant", "content": content}]
+        trimmed_count, _ = self.filter._trim_native_tool_outputs(messages, "en-US")
+
+        self.assertEqual(trimmed_count, 1)
+        self.assertIn('result="&quot;short&quot;"', messages[0]["content"])
+        self.assertNotIn("z" * 700, messages[0]["content"])
+
+    def test_trimmed_tool_outputs_are_offloaded_by_hash_and_expandable(self):
+        self.filter.valves.enable_tool_output_offload = True
+        tool_output = "x" * 1600
+        card_result = "&quot;" + "y" * 1600 + "&quot;"
+        messages = [
+            {
+                "role": "assistant",
+                "tool_calls": [{"id": "call_1", "type": "function"}],
+                "content": "",
+            },
+            {"role": "tool", "content": tool_output},
+            {
+                "role": "assistant",
+                "content": (
+                    '<details type="tool_calls" done="true" id="call-2" '
+                    f'name="search" arguments="&quot;{{}}&quot;" result="{card_result}">\n'
+                    "<summary>Tool Executed</summary>\n"
+                    "</details>\n"
+                    "Final answer"
+                ),
+            },
+        ]
+        original = deepcopy(messages)
+
+        trimmed_count, _ = self.filter._trim_native_tool_outputs(
+            messages, "en-US", chat_id="chat-1"
+        )
+
+        self.assertEqual(trimmed_count, 2)
+        tool_ref = messages[1]["metadata"]["offload_ref"]
+        self.assertTrue(tool_ref.startswith(module.TOOL_OUTPUT_REF_PREFIX))
+        self.assertIn(f"[{tool_ref}]", messages[1]["content"])
+        self.assertNotIn("y" * 200, messages[2]["content"])
+        self.assertEqual(len(self.filter._pending_tool_offloads), 2)
+
+        # Trimming the same outputs again maps to the same references.
+        again = deepcopy(original)
+        self.filter._trim_native_tool_outputs(again, "en-US", chat_id="chat-1")
+        self.assertEqual(again[1]["content"], messages[1]["content"])
+        self.assertEqual(len(self.filter._pending_tool_offloads), 2)
+
+        expanded = self.filter._expand_offloaded_tool_outputs(messages, "chat-1")
+        self.assertEqual(expanded[1]["content"], tool_output)
+        self.assertIn(f'result="{card_result}"', expanded[2]["content"])
+        self.assertIn("[Content collapsed]", messages[1]["content"])
+
+        # Outputs are scoped to their chat: another chat gets its own reference
+        # and cannot expand this chat's.
+        other = deepcopy(original)
+        self.filter._trim_native_tool_outputs(other, "en-US", chat_id="chat-2")
+        self.assertNotEqual(other[1]["metadata"]["offload_ref"], tool_ref)
+        def unavailable_session():
+            raise RuntimeError("database unavailable")
+
+        self.filter._db_session = unavailable_session
+        self.assertEqual(
+            self.filter._expand_offloaded_tool_outputs(messages, "chat-2"), messages
+        )
+
+        # Without a chat ID outputs are only collapsed, never stored.
+        anonymous = deepcopy(original)
+        self.filter._trim_native_tool_outputs(anonymous, "en-US")
+        self.assertNotIn("offload_ref", anonymous[1]["metadata"])
+        self.assertEqual(len(self.filter._pending_tool_offloads), 4)
+
+    def test_failed_tool_offload_flush_requeues_outputs(self):
+        self.filter.valves.enable_tool_output_offload = True
+        tool_output = "x" * 1600
+        messages = [
+            {
+                "role": "assistant",
+                "tool_calls": [{"id": "call_1", "type": "function"}],
+                "content": "",
+            },
+            {"role": "tool", "content": tool_output},
+            {"role": "assistant", "content": "Final answer"},
+        ]
+        self.filter._trim_native_tool_outputs(messages, "en-US", chat_id="chat-1")
+
+        created = []
+        original_table = getattr(module.ToolOutputOffload, "__table__", None)
+        module.ToolOutputOffload.__table__ = types.SimpleNamespace(
+            create=lambda bind, checkfirst=False: created.append(checkfirst)
+        )
+        self.filter._db_engine = object()
+
+        def failing_session():
+            raise RuntimeError("database is locked")
+
+        self.filter._db_session = failing_session
+
+        try:
+            self.assertEqual(self.filter._flush_tool_offloads(), 0)
+            self.assertEqual(self.filter._flush_tool_offloads(), 0)
+        finally:
+            module.ToolOutputOffload.__table__ = original_table
+        # The table is created lazily, once, on the first flush.
+        self.assertEqual(created, [True])
+        self.assertEqual(len(self.filter._pending_tool_offloads), 1)
+        self.assertEqual(len(self.filter._offloaded_digests), 0)
+        # References stay expandable from the re-queued rows.
+        expanded = self.filter._expand_offloaded_tool_outputs(messages, "chat-1")
+        self.assertEqual(expanded[1]["content"], tool_output)
+
     def test_function_calling_mode_reads_params_fallback(self):
         self.assertEqual(
             self.filter._get_function_calling_mode(
@@ -392,6 +540,21 @@ class TestAsyncContextCompression(unittest.TestCase):
         self.assertEqual([message["id"] for message in messages], ["m1", "m2", "m3"])
         self.assertEqual(messages[2]["role"], "tool")
 
+    def test_reconstruct_active_history_branch_returns_views_without_copying(self):
+        history_messages = {
+            "m1": {"id": "m1", "role": "user", "content": "Q", "timestamp": 1},
+            "m2": {"id": "m2", "role": "assistant", "content": "A", "timestamp": 2},
+            "m0": {"id": "m0", "role": "system", "content": "S", "timestamp": 0},
+        }
+
+        branch = self.filter._reconstruct_active_history_branch(history_messages, "m2")
+        fallback = self.filter._reconstruct_active_history_branch(history_messages, None)
+
+        self.assertEqual([message["id"] for message in branch], ["m2"])
+        self.assertIs(branch[0], history_messages["m2"])
+        self.assertEqual([message["id"] for message in fallback], ["m0", "m1", "m2"])
+        self.assertIs(fallback[0], history_messages["m0"])
+
     def test_outlet_unfolds_compact_tool_details_view(self):
         compact_messages = [
             {"role": "user", "content": "U1"},
@@ -459,6 +622,68 @@ class TestAsyncContextCompression(unittest.TestCase):
 
         self.assertTrue(create_task_called)
 
+    def test_summary_job_scheduler_caps_concurrency_and_coalesces_per_chat(self):
+        scheduler = module.SummaryJobScheduler(max_concurrency=1, max_queued=2)
+        runs = []
+
+        def job(name):
+            async def run():
+                runs.append(name)
+                await asyncio.sleep(0)
+
+            return run
+
+        async def scenario():
+            statuses = [
+                scheduler.submit("chat-a", job("a1")),
+                scheduler.submit("chat-a", job("a2")),
+                scheduler.submit("chat-b", job("b1")),
+                scheduler.submit("chat-a", job("a3")),
+                scheduler.submit("chat-c", job("c1")),
+            ]
+            while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+                await asyncio.sleep(0)
+            return statuses
+
+        statuses = asyncio.run(scenario())
+
+        self.assertEqual(
+            statuses, ["started", "queued", "queued", "coalesced", "rejected"]
+        )
+        self.assertEqual(runs, ["a1", "b1", "a3"])
+        stats = scheduler.stats()
+        self.assertEqual(stats["completed"], 3)
+        self.assertEqual(stats["peak_queued"], 2)
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+
+    def test_summary_job_scheduler_zero_queue_still_starts_idle_jobs(self):
+        scheduler = module.SummaryJobScheduler(max_concurrency=1, max_queued=0)
+        runs = []
+
+        def job(name):
+            async def run():
+                runs.append(name)
+                await asyncio.sleep(0)
+
+            return run
+
+        async def scenario():
+            statuses = [
+                scheduler.submit("chat-a", job("a1")),
+                scheduler.submit("chat-b", job("b1")),
+            ]
+            while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+                await asyncio.sleep(0)
+            statuses.append(scheduler.submit("chat-b", job("b2")))
+            while scheduler.stats()["running"] or scheduler.stats()["queued"]:
+                await asyncio.sleep(0)
+            return statuses
+
+        statuses = asyncio.run(scenario())
+
+        self.assertEqual(statuses, ["started", "rejected", "started"])
+        self.assertEqual(runs, ["a1", "b2"])
+
     def test_estimate_messages_tokens_counts_output_text_parts(self):
         messages = [
             {
@@ -472,6 +697,468 @@ class TestAsyncContextCompression(unittest.TestCase):
             module._estimate_text_tokens("abcd" * 25),
         )
 
+    def test_text_token_list_estimator_matches_reference_values(self):
+        texts = [
+            "def f(x):\n    return [x, y]\n",
+            "Привет, мир! Как дела?",
+            "漢字とかなのテキスト、mixed with English.",
+            "",
+        ]
+
+        self.assertEqual(module._estimate_text_token_list(texts), [8, 6, 12, 0])
+        self.assertEqual(
+            module._sample_script_mix("abc 你好世界 カタカナ привет ok"),
+            (
+                {
+                    "han": 4,
+                    "kana": 4,
+                    "hangul": 0,
+                    "cyr": 6,
+                    "arabic": 0,
+                    "thai": 0,
+                    "other": 0,
+                },
+                "cyr",
+            ),
+        )
+        self.assertEqual(
+            self.filter._estimate_message_token_list(
+                [{"content": text} for text in texts]
+            ),
+            [8, 6, 12, 0],
+        )
+
+    def test_calculate_messages_tokens_ledger_only_counts_new_or_edited_messages(self):
+        counted_texts = []
+
+        def fake_count_tokens(text, tokenizer=None):
+            counted_texts.append(text)
+            return len(text)
+
+        self.filter._count_tokens = fake_count_tokens
+        messages = [
+            {"id": "m1", "role": "user", "content": "hello"},
+            {"id": "m2", "role": "assistant", "content": "world!"},
+        ]
+
+        self.assertEqual(self.filter._calculate_messages_tokens(messages, "chat-1"), 11)
+        self.assertEqual(counted_texts, ["hello", "world!"])
+
+        messages.append({"id": "m3", "role": "user", "content": "next"})
+        self.assertEqual(self.filter._calculate_messages_tokens(messages, "chat-1"), 15)
+        self.assertEqual(counted_texts[2:], ["next"])
+
+        messages[1]["content"] = "edited"
+        self.assertEqual(self.filter._calculate_messages_tokens(messages, "chat-1"), 15)
+        self.assertEqual(counted_texts[3:], ["edited"])
+
+    def test_token_ledger_subset_passes_do_not_evict_full_history_entries(self):
+        counted_texts = []
+
+        def fake_count_tokens(text, tokenizer=None):
+            counted_texts.append(text)
+            return len(text)
+
+        self.filter._count_tokens = fake_count_tokens
+        messages = [
+            {"id": f"m{i}", "role": "user", "content": f"message {i}"}
+            for i in range(300)
+        ]
+
+        self.filter._calculate_messages_tokens(messages, "chat-1", prune=True)
+        self.assertEqual(len(counted_texts), 300)
+
+        # Inlet-style subset views (head, tail) reuse the ledger without pruning it.
+        self.filter._calculate_messages_tokens(messages[:1], "chat-1")
+        self.filter._calculate_messages_tokens(messages[-40:], "chat-1")
+        self.filter._calculate_messages_tokens(messages, "chat-1", prune=True)
+        self.assertEqual(len(counted_texts), 300)
+
+        # A full-history pass still drops messages that left the active branch.
+        self.filter._calculate_messages_tokens(messages[:10], "chat-1", prune=True)
+        self.assertEqual(len(self.filter._get_token_ledger("chat-1")), 10)
+
+    def test_plan_atomic_group_drop_cuts_at_first_fitting_group(self):
+        messages = [
+            {"role": "user", "content": "u1"},
+            {"role": "assistant", "tool_calls": [{"id": "c1"}], "content": ""},
+            {"role": "tool", "tool_call_id": "c1", "content": "result"},
+            {"role": "assistant", "content": "a1"},
+            {"role": "user", "content": "u2"},
+            {"role": "assistant", "content": "a2"},
+        ]
+        token_counts = [10, 5, 40, 5, 10, 10]
+
+        # Groups: [u1]=10, [call, tool, answer]=50, [u2]=10, [a2]=10
+        self.assertEqual(
+            self.filter._plan_atomic_group_drop(messages, token_counts, 10), (1, 10, 1)
+        )
+        self.assertEqual(
+            self.filter._plan_atomic_group_drop(messages, token_counts, 11), (4, 60, 2)
+        )
+        # The newest group is always kept.
+        self.assertEqual(
+            self.filter._plan_atomic_group_drop(messages, token_counts, 1000),
+            (5, 70, 3),
+        )
+        # Dropping never passes the stop index, even inside a group.
+        self.assertEqual(
+            self.filter._plan_atomic_group_drop(
+                messages, token_counts, 1000, stop_index=2
+            ),
+            (2, 15, 1),
+        )
+        self.assertEqual(
+            self.filter._plan_atomic_group_drop(messages, token_counts, 0), (0, 0, 0)
+        )
+
+    def test_metrics_ring_buffer_jsonl_sink_and_prometheus_text(self):
+        import json
+        import tempfile
+
+        seen = []
+        # The module-level registry is process-wide; isolate this test from it.
+        self.filter._metrics = module.CompressionMetrics()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            jsonl_path = os.path.join(tmp_dir, "metrics.jsonl")
+            self.filter._record_metric("inlet", total_ms=5.0)
+            self.assertEqual(self.filter._metrics.recent(), [])
+
+            self.filter.valves.enable_metrics = True
+            self.filter.valves.metrics_ring_size = 2
+            self.filter.valves.metrics_jsonl_path = jsonl_path
+            self.filter._metrics.add_sink(seen.append)
+
+            self.filter._record_metric("inlet", chat_id="c1", total_ms=4.0, tokens_after=100)
+            self.filter._record_metric("inlet", chat_id="c2", total_ms=6.0, tokens_after=50)
+            self.filter._record_metric("summary_llm", model="m", latency_ms=250.0)
+
+            # Lines are buffered for the writer timer, not written by record().
+            self.assertFalse(os.path.exists(jsonl_path))
+            self.filter._metrics._jsonl_timer.cancel()
+            self.assertEqual(self.filter._metrics.flush_jsonl(), 3)
+            with open(jsonl_path, encoding="utf-8") as fh:
+                lines = [json.loads(line) for line in fh]
+
+        self.assertEqual([entry["event"] for entry in lines], ["inlet", "inlet", "summary_llm"])
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(
+            [entry["event"] for entry in self.filter._metrics.recent()],
+            ["inlet", "summary_llm"],
+        )
+
+        text = self.filter._metrics.render_prometheus()
+        self.assertIn('async_context_compression_events_total{event="inlet"} 2', text)
+        self.assertIn(
+            'async_context_compression_duration_ms_sum{event="inlet",phase="total"} 10.0',
+            text,
+        )
+        self.assertIn(
+            'async_context_compression_duration_ms_max{event="summary_llm",phase="latency"} 250.0',
+            text,
+        )
+        self.assertIn(
+            'async_context_compression_value_total{event="inlet",field="tokens_after"} 150',
+            text,
+        )
+        self.assertIn('async_context_compression_token_cache_hit_ratio{cache="exact"}', text)
+
+    def test_metrics_server_is_handed_over_across_module_reloads(self):
+        import socket
+        import urllib.request
+
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        # Each CompressionMetrics stands in for the registry of a fresh module copy.
+        old_metrics = module.CompressionMetrics()
+        new_metrics = module.CompressionMetrics()
+        old_metrics.record("inlet", total_ms=1.0)
+        try:
+            old_metrics.configure(10, prometheus_port=port)
+            new_metrics.configure(10, prometheus_port=port)
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as response:
+                text = response.read().decode("utf-8")
+        finally:
+            new_metrics.configure(10, prometheus_port=0)
+
+        self.assertNotIn('events_total{event="inlet"}', text)
+        self.assertIsNone(module._get_metrics_server_holder().server)
+
+    def test_token_count_cache_respects_byte_budget_and_counts_hits(self):
+        cache = module.TokenCountCache("test", max_bytes=3 * 200)
+        computed = []
+
+        def compute(text):
+            computed.append(text)
+            return len(text)
+
+        long_text = "x" * 5000
+        self.assertEqual(cache.get_or_compute(long_text, compute), 5000)
+        self.assertEqual(cache.get_or_compute(long_text, compute), 5000)
+        self.assertEqual(computed, [long_text])
+
+        for index in range(5):
+            cache.get_or_compute(f"short-{index}", compute)
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 6)
+        self.assertGreater(stats["evictions"], 0)
+        self.assertLessEqual(stats["bytes"], 3 * 200)
+
+    def test_calculate_messages_tokens_batches_large_precise_counts(self):
+        batch_calls = []
+
+        class FakeEncoding:
+            def encode(self, text):
+                raise AssertionError("single-text encode should not be used")
+
+            def encode_batch(self, texts, num_threads=1):
+                batch_calls.append((list(texts), num_threads))
+                return [[0] * (len(text) // 10) for text in texts]
+
+        self.filter.valves.batch_token_count_min_chars = 100
+        self.filter.valves.batch_token_count_threads = 3
+        messages = [
+            {"role": "user", "content": "a" * 120 + "-batch-test-1"},
+            {"role": "assistant", "content": "b" * 80 + "-batch-test-2"},
+        ]
+
+        module.TOKENIZER_REGISTRY.register("fake-batch", FakeEncoding())
+        total = self.filter._calculate_messages_tokens(
+            messages, tokenizer="fake-batch"
+        )
+
+        self.assertEqual(total, 13 + 9)
+        self.assertEqual(len(batch_calls), 1)
+        self.assertEqual(batch_calls[0][1], 3)
+
+    def test_model_tokenizer_falls_back_to_estimator_until_encoding_loads(self):
+        class FakeEncoding:
+            def encode(self, text):
+                return text.split()
+
+        self.filter.valves.model_thresholds = "local-llm:1000:2000:fake-words"
+        thresholds = self.filter._get_model_thresholds("local-llm")
+        tokenizer = self.filter._get_model_tokenizer("local-llm", thresholds)
+        self.assertEqual(tokenizer, "fake-words")
+
+        messages = [{"id": "m1", "role": "user", "content": "one two three four"}]
+        estimate = self.filter._estimate_messages_tokens(messages)
+        self.assertEqual(
+            self.filter._calculate_messages_tokens(messages, "chat-tok", tokenizer),
+            estimate,
+        )
+
+        module.TOKENIZER_REGISTRY.register("fake-words", FakeEncoding())
+        # The ledger entry taken with the estimator is recounted once the encoding is ready.
+        self.assertEqual(
+            self.filter._calculate_messages_tokens(messages, "chat-tok", tokenizer), 4
+        )
+        self.filter.valves.tokenizer_encoding = "estimate"
+        self.assertEqual(self.filter._get_model_tokenizer("other-llm", {}), "estimate")
+
+    def test_model_tokenizer_falls_back_to_valve_default_when_encoding_failed(self):
+        registry = module.TOKENIZER_REGISTRY
+        with registry._lock:
+            registry._failed.add("broken-enc")
+        self.filter.valves.tokenizer_encoding = "fake-default"
+        registry.register("fake-default", object())
+
+        thresholds = {"tokenizer": "broken-enc"}
+        self.assertEqual(
+            self.filter._get_model_tokenizer("local-llm", thresholds), "fake-default"
+        )
+
+        with registry._lock:
+            registry._failed.add("fake-default")
+            registry._encodings.pop("fake-default", None)
+        self.assertEqual(
+            self.filter._get_model_tokenizer("local-llm", thresholds), "estimate"
+        )
+
+    def test_inlet_reuses_cached_summary_prefix_until_summary_version_changes(self):
+        self.filter.valves.keep_first = 1
+        self.filter.valves.show_token_usage_status = False
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        async def fake_user_context(__user__, __event_call__):
+            return {"user_language": "en-US"}
+
+        record = types.SimpleNamespace(
+            summary="Earlier work", compressed_message_count=3, updated_at="v1"
+        )
+        load_calls = []
+        align_calls = []
+        versions = {"current": (3, "v1")}
+
+        def fake_load_summary_record(chat_id):
+            load_calls.append(chat_id)
+            return record
+
+        original_align = self.filter._align_tail_start_to_atomic_boundary
+
+        def counting_align(*args, **kwargs):
+            align_calls.append(args[1])
+            return original_align(*args, **kwargs)
+
+        self.filter._log = noop_log
+        self.filter._get_user_context = fake_user_context
+        self.filter._load_summary_record = fake_load_summary_record
+        self.filter._load_summary_version = lambda chat_id: versions["current"]
+        self.filter._align_tail_start_to_atomic_boundary = counting_align
+
+        def make_body():
+            return {
+                "chat_id": "chat-cache",
+                "messages": [
+                    {"role": "user", "content": f"message {index}"}
+                    for index in range(6)
+                ],
+            }
+
+        first = asyncio.run(self.filter.inlet(make_body()))
+        second = asyncio.run(self.filter.inlet(make_body()))
+
+        self.assertEqual(first["messages"], second["messages"])
+        self.assertEqual(len(second["messages"]), 1 + 1 + 3)
+        self.assertEqual(load_calls, ["chat-cache"])
+        self.assertEqual(len(align_calls), 1)
+
+        versions["current"] = (4, "v2")
+        record = types.SimpleNamespace(
+            summary="Newer work", compressed_message_count=4, updated_at="v2"
+        )
+        third = asyncio.run(self.filter.inlet(make_body()))
+
+        self.assertEqual(load_calls, ["chat-cache", "chat-cache"])
+        self.assertIn("Newer work", third["messages"][1]["content"])
+        self.assertEqual(len(third["messages"]), 1 + 1 + 2)
+
+    def test_stable_summary_prefix_keeps_head_and_summary_bytes_across_turns(self):
+        self.filter.valves.keep_first = 1
+        self.filter.valves.show_token_usage_status = False
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        async def fake_user_context(__user__, __event_call__):
+            return {"user_language": "en-US"}
+
+        records = {
+            "current": types.SimpleNamespace(
+                summary="Earlier work", compressed_message_count=3, updated_at="v1"
+            )
+        }
+        self.filter._log = noop_log
+        self.filter._get_user_context = fake_user_context
+        self.filter._load_summary_record = lambda chat_id: records["current"]
+        self.filter._load_summary_version = lambda chat_id: (
+            records["current"].compressed_message_count,
+            records["current"].updated_at,
+        )
+
+        def make_body(reference):
+            return {
+                "chat_id": "chat-stable",
+                "messages": [
+                    {"role": "user", "content": f"message {index}"}
+                    for index in range(6)
+                ],
+                "__external_references__": {
+                    "content": f"notes from {reference}",
+                    "references": [{"chat_id": reference}],
+                },
+            }
+
+        self.filter.valves.stable_summary_prefix = True
+        first = asyncio.run(self.filter.inlet(make_body("chat-a")))
+        second = asyncio.run(self.filter.inlet(make_body("chat-b")))
+
+        self.assertEqual(first["messages"][:2], second["messages"][:2])
+        self.assertTrue(
+            second["messages"][1]["content"].startswith(
+                f"<!-- {module.SUMMARY_VERSION_MARKER} v3-"
+            )
+        )
+        self.assertIn("notes from chat-b", second["messages"][2]["content"])
+        self.assertTrue(second["messages"][2]["metadata"]["is_external_references"])
+        self.assertEqual(len(second["messages"]), 1 + 1 + 1 + 3)
+
+        records["current"] = types.SimpleNamespace(
+            summary="Newer work", compressed_message_count=4, updated_at="v2"
+        )
+        asyncio.run(self.filter.inlet(make_body("chat-b")))
+
+        self.filter.valves.stable_summary_prefix = False
+        asyncio.run(self.filter.inlet(make_body("chat-a")))
+        asyncio.run(self.filter.inlet(make_body("chat-b")))
+
+        self.assertEqual(
+            self.filter._summary_prefix_stats,
+            {"new": 1, "stable": 1, "boundary": 1, "drift": 2},
+        )
+
+    def test_save_summary_write_behind_coalesces_into_one_batch(self):
+        self.filter.valves.summary_write_behind_ms = 60000
+        written_batches = []
+        self.filter._write_summaries = lambda rows: written_batches.append(dict(rows))
+
+        self.filter._save_summary("chat-a", "first", 4)
+        self.filter._save_summary("chat-a", "second", 6)
+        self.filter._save_summary("chat-a", "stale", 5)
+        self.filter._save_summary("chat-b", "other", 2)
+
+        timer = self.filter._summary_flush_timer
+        self.assertIsNotNone(timer)
+        timer.cancel()
+        self.assertEqual(written_batches, [])
+
+        self.assertEqual(self.filter._flush_summary_writes(), 2)
+        self.assertEqual(
+            written_batches,
+            [
+                {
+                    "chat-a": {"summary": "second", "compressed_message_count": 6},
+                    "chat-b": {"summary": "other", "compressed_message_count": 2},
+                }
+            ],
+        )
+        self.assertEqual(self.filter._flush_summary_writes(), 0)
+
+    def test_summary_write_behind_isolates_bad_rows_and_rearms_timer(self):
+        self.filter.valves.summary_write_behind_ms = 1000
+        written = []
+
+        def fake_write(rows):
+            if "chat-bad" in rows:
+                raise RuntimeError("poisoned row")
+            written.extend(rows)
+
+        self.filter._write_summaries = fake_write
+        self.filter._save_summary("chat-good", "ok", 3)
+        self.filter._save_summary("chat-bad", "boom", 2)
+        self.filter._summary_flush_timer.cancel()
+
+        self.assertEqual(self.filter._flush_summary_writes(), 1)
+        self.assertEqual(written, ["chat-good"])
+        self.assertEqual(list(self.filter._pending_summary_writes), ["chat-bad"])
+        retry_timer = self.filter._summary_flush_timer
+        self.assertIsNotNone(retry_timer)
+        retry_timer.cancel()
+        self.assertEqual(retry_timer.interval, 2.0)
+
+        # The row is dropped after SUMMARY_WRITE_MAX_ATTEMPTS failed flushes.
+        for _ in range(module.SUMMARY_WRITE_MAX_ATTEMPTS - 1):
+            self.filter._summary_flush_timer.cancel()
+            self.filter._flush_summary_writes()
+        self.assertEqual(self.filter._pending_summary_writes, {})
+        self.assertIsNone(self.filter._summary_flush_timer)
+
     def test_unfold_messages_keeps_plain_assistant_output_when_expand_is_not_richer(self):
         misc_module = _ensure_module("open_webui.utils.misc")
         misc_module.convert_output_to_messages = lambda output, raw=True: [
@@ -817,6 +1504,157 @@ class TestAsyncContextCompression(unittest.TestCase):
             any("Check browser console (F12) for details" in text for text in status_descriptions)
         )
 
+    def test_frontend_debug_logs_are_batched_per_request_until_flushed(self):
+        self.filter.valves.show_debug_log = True
+        self.filter.valves.debug_mode = False
+
+        frontend_calls = []
+
+        async def fake_event_call(payload):
+            frontend_calls.append(payload)
+            return True
+
+        async def run():
+            await self.filter._log("[Inlet] first line", event_call=fake_event_call)
+            await self.filter._log(
+                "[Inlet] second line\ndetail", event_call=fake_event_call
+            )
+            self.assertEqual(frontend_calls, [])
+            await self.filter._emit_frontend_console_log(
+                "[Inlet] forced failure",
+                log_type="error",
+                event_call=fake_event_call,
+                force=True,
+            )
+            await self.filter._log("[Inlet] after error", event_call=fake_event_call)
+            await self.filter._flush_frontend_logs(fake_event_call)
+
+        asyncio.run(run())
+
+        self.assertEqual(len(frontend_calls), 3)
+        batched_code = frontend_calls[0]["data"]["code"]
+        self.assertIn("first line", batched_code)
+        self.assertIn("second line", batched_code)
+        self.assertIn("2 debug logs", batched_code)
+        self.assertIn("console.error", frontend_calls[1]["data"]["code"])
+        self.assertIn("forced failure", frontend_calls[1]["data"]["code"])
+        self.assertIn("after error", frontend_calls[2]["data"]["code"])
+        self.assertEqual(self.filter._frontend_log_buffers, {})
+
+        frontend_calls.clear()
+        self.filter.valves.frontend_log_batch_max_chars = 0
+        asyncio.run(self.filter._log("[Inlet] unbuffered", event_call=fake_event_call))
+        self.assertEqual(len(frontend_calls), 1)
+
+    def test_early_summary_runs_below_threshold_and_is_held_until_crossed(self):
+        self.filter.valves.early_summary_ratio = 0.8
+        self.filter.valves.keep_last = 4
+        runs = []
+        history_tokens = {"value": 850}
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        async def fake_generate(messages, chat_id, *args, hold_until_threshold=False, **kwargs):
+            runs.append((args[2], hold_until_threshold))
+            if hold_until_threshold:
+                self.filter._hold_early_summary(chat_id, args[2])
+
+        self.filter._log = noop_log
+        self.filter._generate_summary_async = fake_generate
+        self.filter._load_summary_record_cached = lambda chat_id: None
+        self.filter._estimate_messages_tokens = lambda messages: history_tokens["value"]
+        self.filter._calculate_messages_tokens = (
+            lambda messages, chat_id=None, tokenizer=None, prune=False: history_tokens["value"]
+        )
+        self.filter._get_model_thresholds = lambda model_id: {
+            "compression_threshold_tokens": 1000,
+            "max_context_tokens": 4000,
+        }
+
+        def check(target):
+            asyncio.run(
+                self.filter._check_and_generate_summary_async(
+                    chat_id="chat-early",
+                    model="fake-model",
+                    body={"messages": [{"role": "user", "content": "Hello"}]},
+                    user_data={"id": "user-1"},
+                    target_compressed_count=target,
+                    lang="en-US",
+                )
+            )
+
+        check(10)
+        check(12)  # within keep_last of the held summary: no new run
+        check(14)
+        self.assertEqual(runs, [(10, True), (14, True)])
+
+        self.assertTrue(
+            self.filter._is_early_summary_held("chat-early", 850, "fake-model")
+        )
+        # The hold does not depend on in-process state (other workers, restarts).
+        other_worker = module.Filter()
+        other_worker.valves.early_summary_ratio = 0.8
+        other_worker._get_model_thresholds = self.filter._get_model_thresholds
+        self.assertTrue(other_worker._is_early_summary_held("chat-early", 850, "fake-model"))
+
+        history_tokens["value"] = 1000
+        self.assertFalse(
+            self.filter._is_early_summary_held("chat-early", 1000, "fake-model")
+        )
+        self.assertNotIn("chat-early", self.filter._early_summaries)
+
+        check(16)
+        self.assertEqual(runs[-1], (16, False))
+
+    def test_early_summary_hold_uses_history_estimate_taken_before_trimming(self):
+        self.filter.valves.early_summary_ratio = 0.8
+        self.filter.valves.enable_tool_output_trimming = True
+        self.filter.valves.keep_first = 1
+        self.filter.valves.show_token_usage_status = False
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        async def fake_user_context(__user__, __event_call__):
+            return {"user_language": "en-US"}
+
+        def fake_trim(messages, lang, collect_debug=False, chat_id=None):
+            # Trimming shrinks the tool output far below the threshold.
+            messages[2]["content"] = "trimmed"
+            return 1, None
+
+        record = types.SimpleNamespace(
+            summary="Earlier work", compressed_message_count=3, updated_at="v1"
+        )
+        self.filter._log = noop_log
+        self.filter._get_user_context = fake_user_context
+        self.filter._get_function_calling_mode = lambda body: "native"
+        self.filter._trim_native_tool_outputs = fake_trim
+        self.filter._load_summary_record_cached = lambda chat_id: record
+        self.filter._get_model_thresholds = lambda model_id: {
+            "compression_threshold_tokens": 1000,
+            "max_context_tokens": 0,
+        }
+
+        body = {
+            "chat_id": "chat-tools",
+            "messages": [
+                {"role": "user", "content": "run the tool"},
+                {"role": "assistant", "content": "", "tool_calls": []},
+                {"role": "tool", "content": "word " * 4000},
+                {"role": "assistant", "content": "done"},
+                {"role": "user", "content": "next"},
+            ],
+        }
+        result = asyncio.run(self.filter.inlet(body))
+
+        # The untrimmed history crossed the threshold, so the regular summary the
+        # outlet wrote for it is injected instead of being held back.
+        self.assertTrue(
+            any("Earlier work" in str(m.get("content")) for m in result["messages"])
+        )
+
     def test_external_reference_message_detection_matches_injected_marker(self):
         message = {
             "role": "assistant",
@@ -838,7 +1676,7 @@ class TestAsyncContextCompression(unittest.TestCase):
             raise Exception("reference summary failed")
 
         self.filter._call_summary_llm = fake_summary_llm
-        self.filter._load_summary_record = lambda chat_id: None
+        self.filter._load_summary_records = lambda chat_ids: {}
         self.filter._load_full_chat_messages = lambda chat_id: [
             {"role": "user", "content": "Referenced question"},
             {"role": "assistant", "content": "Referenced answer"},
@@ -989,6 +1827,146 @@ class TestAsyncContextCompression(unittest.TestCase):
             captured["saved"], ("chat-ref-1", "cached reference summary", 3)
         )
 
+    def test_generate_referenced_summaries_background_bounds_concurrency_and_keeps_partial_results(
+        self,
+    ):
+        self.filter.valves.summary_model = "fake-summary-model"
+        self.filter.valves.referenced_chat_concurrency = 2
+        self.filter.valves.referenced_chat_timeout_seconds = 0.05
+
+        active = {"now": 0, "peak": 0}
+
+        async def fake_summary_llm(
+            new_conversation_text,
+            body,
+            user_data,
+            __event_call__=None,
+            __request__=None,
+            previous_summary=None,
+        ):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                await asyncio.sleep(1 if new_conversation_text == "slow" else 0.01)
+            finally:
+                active["now"] -= 1
+            return f"summary of {new_conversation_text}"
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        self.filter._call_summary_llm = fake_summary_llm
+        self.filter._save_summary = lambda *args: None
+        self.filter._log = noop_log
+
+        referenced_chats = [
+            {
+                "chat_id": f"chat-{name}",
+                "title": name,
+                "conversation_text": name,
+                "covered_message_count": 1,
+            }
+            for name in ("a", "slow", "b", "c")
+        ]
+
+        results = asyncio.run(
+            self.filter._generate_referenced_summaries_background(
+                referenced_chats, user_data={"id": "user-1"}
+            )
+        )
+
+        self.assertEqual(
+            [result["chat_id"] for result in results], ["chat-a", "chat-b", "chat-c"]
+        )
+        self.assertEqual(active["peak"], 2)
+
+    def test_generate_referenced_summaries_background_map_reduces_and_reuses_chunks(self):
+        self.filter.valves.summary_model = "fake-summary-model"
+        self.filter.valves.summary_model_max_context = 4000
+
+        llm_inputs = []
+        saved_calls = []
+
+        async def fake_summary_llm(
+            new_conversation_text,
+            body,
+            user_data,
+            __event_call__=None,
+            __request__=None,
+            previous_summary=None,
+        ):
+            llm_inputs.append(new_conversation_text)
+            return f"summary {len(llm_inputs)}"
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        history = [
+            {
+                "id": f"m{i}",
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": letter * 4000,
+            }
+            for i, letter in enumerate("abcdef")
+        ]
+
+        self.filter._call_summary_llm = fake_summary_llm
+        self.filter._save_summary = lambda *args: saved_calls.append(args)
+        self.filter._log = noop_log
+        self.filter._load_full_chat_messages = lambda chat_id: list(history)
+        self.filter._build_summary_prompt = (
+            lambda conversation_text, previous_summary=None: conversation_text
+        )
+        self.filter._count_tokens = lambda text: len(text) // 4
+
+        def run():
+            return asyncio.run(
+                self.filter._generate_referenced_summaries_background(
+                    [{"chat_id": "chat-big", "title": "Big Chat"}],
+                    user_data={"id": "user-1"},
+                )
+            )
+
+        first = run()
+        self.assertEqual(len(llm_inputs), 3)  # two windows + merge
+        self.assertIn('<segment index="1" of="2">', llm_inputs[-1])
+        self.assertTrue(first[0]["covers_full_history"])
+        self.assertEqual(saved_calls[-1][2], 6)
+
+        history.append({"id": "m6", "role": "user", "content": "g" * 4000})
+        llm_inputs.clear()
+        run()
+        # Only the new trailing window and the merge are regenerated.
+        self.assertEqual(len(llm_inputs), 2)
+        self.assertIn("g" * 100, llm_inputs[0])
+        self.assertEqual(saved_calls[-1][2], 7)
+
+    def test_summarize_windows_times_out_hung_window_jobs(self):
+        self.filter.valves.summary_chunk_timeout_seconds = 0.05
+
+        async def fake_summary_llm(text, *args, **kwargs):
+            if text == "hang":
+                await asyncio.sleep(10)
+            return f"summary of {text}"
+
+        async def noop_log(*args, **kwargs):
+            return None
+
+        self.filter._call_summary_llm = fake_summary_llm
+        self.filter._log = noop_log
+
+        result = asyncio.run(
+            self.filter._summarize_windows(
+                ["ok", "hang"], 1000, "fake-summary-model", {}, {"id": "user-1"}
+            )
+        )
+
+        self.assertIsNone(result)
+        # The window that finished is still cached for the next attempt.
+        self.assertEqual(
+            list(self.filter._summary_chunk_cache.values()), ["summary of ok"]
+        )
+
     def test_generate_referenced_summaries_background_skips_progress_save_for_truncation(self):
         self.filter.valves.summary_model = "fake-summary-model"
         self.filter.valves.summary_model_max_context = 100
@@ -5,7 +5,7 @@ author_url: https://github.com/Fu-Jie/openwebui-extensions
 funding_url: https://github.com/open-webui
 openwebui_id: ce96f7b4-12fc-4ac3-9a01-875713e69359
 description: A powerful Agent SDK integration for OpenWebUI. It deeply bridges GitHub Copilot SDK with OpenWebUI's ecosystem, enabling the Agent to autonomously perform intent recognition, web search, and context compaction. It seamlessly reuses your existing Tools, MCP servers, OpenAPI servers, and Skills for a professional, full-featured experience.
-version: 0.12.0
+version: 0.13.0
 requirements: github-copilot-sdk==0.1.30
 """
 
@@ -26,7 +26,9 @@ import tarfile
 import zipfile
 import urllib.parse
 import urllib.request
+import contextvars
 import aiohttp
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Union, AsyncGenerator, List, Any, Dict, Literal, Tuple
 from types import SimpleNamespace
@@ -73,6 +75,20 @@ except ImportError:
 # Setup logger
 logger = logging.getLogger(__name__)
 
+# Max converted tool signatures (name, description, params model) kept across requests
+TOOL_SPEC_CACHE_MAX_ENTRIES = 512
+
+# Seconds a process-wide tool server config read is trusted before re-checking its version
+TOOL_SERVER_CONFIG_TTL = 5.0
+# A full skills sync is forced at least this often even if nothing looks changed
+SKILL_SYNC_MAX_AGE = 300.0
+# In-progress status updates within this window collapse into the latest one
+STATUS_DEBOUNCE_INTERVAL = 0.1
+# Per-request memo set by Pipe.pipe for each turn (tool server connections, skill sync)
+_request_cache: contextvars.ContextVar = contextvars.ContextVar(
+    "copilot_request_cache", default=None
+)
+
 RICHUI_BRIDGE_MARKER = 'data-openwebui-richui-bridge="1"'
 RICHUI_BRIDGE_STYLE = """
 <style id="openwebui-richui-bridge-style" data-openwebui-richui-bridge="1">
@@ -1658,6 +1674,41 @@ class Pipe:
             default=300,
             description="Timeout for each stream chunk (seconds)",
         )
+        SESSION_POOL_SIZE: int = Field(
+            default=0,
+            ge=0,
+            description="Keep up to N chats' SDK sessions (and their CLI clients) alive between turns so the next turn skips client start and resume_session. 0 disables (one ephemeral client per request).",
+        )
+        SESSION_POOL_IDLE_TTL: int = Field(
+            default=600,
+            ge=1,
+            description="Seconds a pooled live session may stay idle before its client is stopped.",
+        )
+        CLIENT_POOL_MAX_SIZE: int = Field(
+            default=8,
+            ge=1,
+            description="Max shared CopilotClients (one per distinct token, used for model discovery) kept running. The least recently used client is stopped beyond this.",
+        )
+        CLIENT_POOL_IDLE_TTL: int = Field(
+            default=900,
+            ge=1,
+            description="Seconds a shared CopilotClient may go unused before it is stopped.",
+        )
+        CLIENT_HEALTH_CHECK_INTERVAL: int = Field(
+            default=60,
+            ge=0,
+            description="Seconds between background health probes (state + ping) of shared CopilotClients; unhealthy clients are stopped and recreated on next use. 0 disables probing (idle eviction still runs).",
+        )
+        STREAM_COALESCE_MS: int = Field(
+            default=30,
+            ge=0,
+            description="Merge streamed message/reasoning deltas arriving within this window (ms) into one chunk to cut websocket and DB writes. 0 yields every delta as-is.",
+        )
+        STREAM_COALESCE_CHARS: int = Field(
+            default=512,
+            ge=1,
+            description="Flush a coalesced chunk early once it reaches this many characters.",
+        )
 
         EXCLUDE_KEYWORDS: str = Field(
             default="",
@@ -1785,8 +1836,16 @@ class Pipe:
             description="BYOK Wire API override.",
         )
 
-    _shared_clients: Dict[str, Any] = {}  # Map: token_hash -> CopilotClient
-    _shared_client_lock = asyncio.Lock()  # Lock for thread-safe client lifecycle
+    _shared_clients: "OrderedDict[str, Any]" = (
+        OrderedDict()
+    )  # Map: token_hash -> CopilotClient (LRU order)
+    _shared_client_lock = asyncio.Lock()  # Guards pool maps; never held across client.start()
+    _shared_client_key_locks: Dict[str, asyncio.Lock] = {}  # Map: token_hash -> start lock
+    _shared_client_key_lock_users: Dict[str, int] = {}  # Map: token_hash -> tasks holding/awaiting it
+    _shared_client_leases: Dict[int, int] = {}  # Map: id(client) -> callers still using it
+    _shared_client_retiring: Dict[int, Any] = {}  # Map: id(client) -> removed, stopped on last release
+    _shared_client_last_used: Dict[str, float] = {}  # Map: token_hash -> monotonic time
+    _shared_client_monitor: Optional[asyncio.Task] = None  # Idle eviction + health probe loop
     _model_cache: List[dict] = []  # Model list cache (Memory only fallback)
     _standard_model_ids: set = set()  # Track standard model IDs
     _last_byok_config_hash: str = ""  # Track BYOK config (Status only)
@@ -1796,6 +1855,19 @@ class Pipe:
     _discovery_cache: Dict[str, Dict[str, Any]] = (
         {}
     )  # Map config_hash -> {"time": float, "models": list}
+    _tool_spec_cache: Dict[str, Tuple[str, str, Any]] = (
+        {}
+    )  # Map tool spec hash -> (sdk tool name, description, params model)
+    _tool_server_config_cache: Dict[str, Any] = (
+        {}
+    )  # {"connections": list, "version": tuple, "checked_at": float}
+    _skill_sync_state: Dict[Tuple[str, str], Dict[str, Any]] = (
+        {}
+    )  # Map (shared_dir, user_id) -> {"fingerprint": tuple, "synced_at": float}
+    _live_sessions: "OrderedDict[str, Dict[str, Any]]" = (
+        OrderedDict()
+    )  # Map chat_id -> {"client", "session", "client_key", "fingerprint", "last_used"}
+    _live_session_reaper: Optional[asyncio.Task] = None  # Idle eviction loop
 
     def _is_version_at_least(self, target: str) -> bool:
         """Check if OpenWebUI version is at least the target version."""
@@ -2991,21 +3063,26 @@ class Pipe:
         __chat_id__: Optional[str] = None,
         __message_id__: Optional[str] = None,
     ) -> Union[str, AsyncGenerator]:
-        return await self._pipe_impl(
-            body,
-            __metadata__=__metadata__,
-            __user__=__user__,
-            __event_emitter__=__event_emitter__,
-            __event_call__=__event_call__,
-            __request__=__request__,
-            __messages__=__messages__,
-            __files__=__files__,
-            __task__=__task__,
-            __task_body__=__task_body__,
-            __session_id__=__session_id__,
-            __chat_id__=__chat_id__,
-            __message_id__=__message_id__,
-        )
+        # Tool server config and skill sync run at most once per turn
+        request_cache_token = _request_cache.set({})
+        try:
+            return await self._pipe_impl(
+                body,
+                __metadata__=__metadata__,
+                __user__=__user__,
+                __event_emitter__=__event_emitter__,
+                __event_call__=__event_call__,
+                __request__=__request__,
+                __messages__=__messages__,
+                __files__=__files__,
+                __task__=__task__,
+                __task_body__=__task_body__,
+                __session_id__=__session_id__,
+                __chat_id__=__chat_id__,
+                __message_id__=__message_id__,
+            )
+        finally:
+            _request_cache.reset(request_cache_token)
 
     # ==================== Functional Areas ====================
     # 1) Tool registration: define tools and register in _initialize_custom_tools
@@ -3807,7 +3884,10 @@ class Pipe:
                         # reflects them without needing a new request.
                         try:
                             await asyncio.to_thread(
-                                self._sync_openwebui_skills, workspace_dir, user_id
+                                self._sync_openwebui_skills,
+                                workspace_dir,
+                                user_id,
+                                force=True,
                             )
                         except Exception:
                             pass
@@ -3927,7 +4007,10 @@ class Pipe:
                     # Immediately sync to OW DB so frontend reflects the change.
                     try:
                         await asyncio.to_thread(
-                            self._sync_openwebui_skills, workspace_dir, user_id
+                            self._sync_openwebui_skills,
+                            workspace_dir,
+                            user_id,
+                            force=True,
                         )
                     except Exception:
                         pass
@@ -3984,15 +4067,50 @@ class Pipe:
 
         return Any
 
-    def _convert_openwebui_tool_to_sdk(
-        self,
-        tool_name: str,
-        tool_dict: dict,
-        __event_emitter__=None,
-        __event_call__=None,
-        user_lang: Optional[str] = None,
-    ):
-        """Convert OpenWebUI tool definition to Copilot SDK tool."""
+    def _get_sdk_tool_signature(
+        self, tool_name: str, tool_dict: dict
+    ) -> Tuple[str, str, Any]:
+        """
+        Return (sdk tool name, description, params model) for an OpenWebUI tool.
+
+        Building the Pydantic params model is the expensive part of conversion and
+        depends only on the tool spec, so it is cached by spec hash across requests.
+        The handler itself binds request-scoped callables and is built per request.
+        """
+        spec_key = None
+        try:
+            spec_key = hashlib.sha256(
+                json.dumps(
+                    [
+                        tool_name,
+                        tool_dict.get("spec"),
+                        tool_dict.get("tool_id", ""),
+                        tool_dict.get("type", ""),
+                        tool_dict.get("_tool_group_name"),
+                        tool_dict.get("_tool_group_description"),
+                    ],
+                    sort_keys=True,
+                    default=str,
+                ).encode("utf-8")
+            ).hexdigest()
+        except Exception:
+            spec_key = None
+
+        cache = self.__class__._tool_spec_cache
+        if spec_key and spec_key in cache:
+            return cache[spec_key]
+
+        signature = self._build_sdk_tool_signature(tool_name, tool_dict)
+        if spec_key:
+            cache[spec_key] = signature
+            while len(cache) > TOOL_SPEC_CACHE_MAX_ENTRIES:
+                cache.pop(next(iter(cache)))
+        return signature
+
+    def _build_sdk_tool_signature(
+        self, tool_name: str, tool_dict: dict
+    ) -> Tuple[str, str, Any]:
+        """Sanitize the tool name and build its description and params model."""
         # Sanitize tool name to match pattern ^[a-zA-Z0-9_-]+$
         sanitized_tool_name = re.sub(r"[^a-zA-Z0-9_-]", "_", tool_name)
 
@@ -4053,7 +4171,6 @@ class Pipe:
         else:
             ParamsModel = create_model(f"{sanitized_tool_name}_Params")
 
-        tool_callable = tool_dict.get("callable")
         tool_description = spec.get("description", "") if isinstance(spec, dict) else ""
         if not tool_description and isinstance(spec, dict):
             tool_description = spec.get("summary", "")
@@ -4109,6 +4226,22 @@ class Pipe:
         else:
             tool_description = f"{group_prefix} {tool_description}"
 
+        return sanitized_tool_name, tool_description, ParamsModel
+
+    def _convert_openwebui_tool_to_sdk(
+        self,
+        tool_name: str,
+        tool_dict: dict,
+        __event_emitter__=None,
+        __event_call__=None,
+        user_lang: Optional[str] = None,
+    ):
+        """Convert OpenWebUI tool definition to Copilot SDK tool."""
+        sanitized_tool_name, tool_description, ParamsModel = (
+            self._get_sdk_tool_signature(tool_name, tool_dict)
+        )
+        tool_callable = tool_dict.get("callable")
+
         async def _tool(params):
             # Crucial Fix: Use exclude_unset=True.
             # This ensures that parameters not explicitly provided by the LLM
@@ -4345,10 +4478,74 @@ class Pipe:
         )(_tool)
 
     def _read_tool_server_connections(self) -> list:
+        """
+        Read tool server connections once per request.
+
+        The first call in a turn stores the result in a request-scoped snapshot;
+        later calls (tool loading, metadata enrichment, MCP parsing) reuse it.
+        Across requests the DB read is shared for TOOL_SERVER_CONFIG_TTL seconds
+        and then revalidated against the config row version.
+        """
+        request_cache = _request_cache.get()
+        if request_cache is not None and "tool_server_connections" in request_cache:
+            return request_cache["tool_server_connections"]
+
+        connections = self._read_tool_server_connections_cached()
+        if request_cache is not None:
+            request_cache["tool_server_connections"] = connections
+        return connections
+
+    def _get_tool_server_config_version(self) -> Optional[tuple]:
+        """Read only the id/updated_at of the current config row (no JSON payload)."""
+        try:
+            from open_webui.config import Config
+            from open_webui.internal.db import get_db
+
+            with get_db() as db:
+                row = (
+                    db.query(Config.id, Config.updated_at)
+                    .order_by(Config.id.desc())
+                    .first()
+                )
+                return (row[0], str(row[1])) if row else None
+        except Exception as e:
+            logger.debug(f"[Tools] Config version check failed: {e}")
+            return None
+
+    def _read_tool_server_connections_cached(self) -> list:
+        """Process-wide TTL cache over the DB read, revalidated by config version."""
+        cache = self.__class__._tool_server_config_cache
+        now = time.monotonic()
+        if cache and now - cache["checked_at"] < TOOL_SERVER_CONFIG_TTL:
+            return cache["connections"]
+
+        version = self._get_tool_server_config_version()
+        if cache and version is not None and version == cache["version"]:
+            cache["checked_at"] = now
+            return cache["connections"]
+
+        connections = self._read_tool_server_connections_from_db()
+        if connections is not None:
+            self.__class__._tool_server_config_cache = {
+                "connections": connections,
+                "version": version,
+                "checked_at": now,
+            }
+            return connections
+
+        # Fallback: in-memory value (may be stale in multi-worker)
+        if hasattr(TOOL_SERVER_CONNECTIONS, "value") and isinstance(
+            TOOL_SERVER_CONNECTIONS.value, list
+        ):
+            return TOOL_SERVER_CONNECTIONS.value
+        return []
+
+    def _read_tool_server_connections_from_db(self) -> Optional[list]:
         """
         Read tool server connections directly from the database to avoid stale
         in-memory state in multi-worker deployments.
-        Falls back to the in-memory PersistentConfig value if DB read fails.
+        Returns None if the DB read fails so callers can fall back to the
+        in-memory PersistentConfig value.
         """
         try:
             from open_webui.config import get_config
@@ -4361,13 +4558,7 @@ class Pipe:
             logger.debug(
                 f"[Tools] DB config read failed, using in-memory fallback: {e}"
             )
-
-        # Fallback: in-memory value (may be stale in multi-worker)
-        if hasattr(TOOL_SERVER_CONNECTIONS, "value") and isinstance(
-            TOOL_SERVER_CONNECTIONS.value, list
-        ):
-            return TOOL_SERVER_CONNECTIONS.value
-        return []
+        return None
 
     def _build_openwebui_request(
         self, user: dict = None, token: str = None, body: dict = None
@@ -4589,11 +4780,23 @@ class Pipe:
             return []
 
         tool_ids = []
+        # Name/description of the user's tools, reused for metadata enrichment below
+        tool_metadata_cache = {}
         # 1. Get User defined tools (Python scripts)
         if enable_tools:
             tool_items = Tools.get_tools_by_user_id(user_id, permission="read")
             if tool_items:
                 tool_ids.extend([tool.id for tool in tool_items])
+                for tool in tool_items:
+                    tool_meta = getattr(tool, "meta", None)
+                    tool_metadata_cache[tool.id] = {
+                        "name": getattr(tool, "name", None),
+                        "description": (
+                            getattr(tool_meta, "description", None)
+                            if tool_meta
+                            else None
+                        ),
+                    }
 
         # 2. Get OpenAPI Tool Server tools
         if enable_openapi:
@@ -4918,7 +5121,6 @@ class Pipe:
                         __event_call__,
                     )
 
-                import time
                 t_get_opw_start = time.perf_counter()
                 tools_dict = await get_openwebui_tools(
                     tool_request, tool_ids, user, extra_params
@@ -5040,7 +5242,6 @@ class Pipe:
         # Enrich tools with metadata from their source
         # 1. User-defined tools: name, description from docstring
         # 2. OpenAPI Tool Server tools: name, description from server config info
-        tool_metadata_cache = {}
         server_metadata_cache = {}
 
         # Pre-build server metadata cache from DB-fresh tool server connections
@@ -5099,6 +5300,7 @@ class Pipe:
                         tool_id
                     ].get("description")
 
+        t_convert_start = time.perf_counter()
         converted_tools = []
         for tool_name, t_dict in tools_dict.items():
             if isinstance(tool_name, str) and tool_name.startswith("_"):
@@ -5122,6 +5324,9 @@ class Pipe:
                     f"Failed to load OpenWebUI tool '{tool_name}': {e}",
                     __event_call__,
                 )
+        logger.info(
+            f"[Perf] convert OpenWebUI tools ({len(converted_tools)} tools, spec cache {len(self.__class__._tool_spec_cache)} entries): {(time.perf_counter()-t_convert_start)*1000:.2f}ms"
+        )
 
         return converted_tools
 
@@ -6144,7 +6349,94 @@ class Pipe:
             f"{body}\n"
         )
 
-    def _sync_openwebui_skills(self, resolved_cwd: str, user_id: str) -> str:
+    def _get_skill_db_watermark(self) -> Optional[tuple]:
+        """(row count, max updated_at) of the skill table, or None if unavailable."""
+        try:
+            from sqlalchemy import func
+            from open_webui.internal.db import get_db
+            from open_webui.models.skills import Skill
+
+            with get_db() as db:
+                count, max_updated_at = db.query(
+                    func.count(Skill.id), func.max(Skill.updated_at)
+                ).one()
+                return (int(count or 0), max_updated_at or 0)
+        except Exception as e:
+            logger.debug(f"[Skills Sync] Watermark query failed: {e}")
+            return None
+
+    def _build_skill_dir_manifest(self, shared_dir: Path) -> tuple:
+        """Stat-only manifest of shared/: (dir name, SKILL.md mtime_ns, size, linked)."""
+        entries = []
+        for skill_dir in shared_dir.iterdir():
+            if not skill_dir.is_dir():
+                continue
+            try:
+                stat = (skill_dir / "SKILL.md").stat()
+            except OSError:
+                continue
+            entries.append(
+                (
+                    skill_dir.name,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    (skill_dir / ".owui_id").exists(),
+                )
+            )
+        return tuple(sorted(entries))
+
+    def _get_skill_sync_fingerprint(self, shared_dir: Path) -> Optional[tuple]:
+        watermark = self._get_skill_db_watermark()
+        if watermark is None:
+            return None
+        return (watermark, self._build_skill_dir_manifest(shared_dir))
+
+    def _sync_openwebui_skills(
+        self, resolved_cwd: str, user_id: str, force: bool = False
+    ) -> str:
+        """Sync skills incrementally; skip the full reconcile when nothing changed.
+
+        The full reconcile (`_reconcile_openwebui_skills`) only runs when the skill
+        table watermark (row count + max updated_at) or the stat manifest of shared/
+        differs from the last successful sync for this directory and user, or
+        after SKILL_SYNC_MAX_AGE. The result is memoized for the rest of the turn.
+        Pass `force=True` after writing skill files to sync them immediately.
+        """
+        shared_dir = Path(self._get_shared_skills_dir(resolved_cwd))
+        memo_key = f"skills_sync:{shared_dir}:{user_id}"
+        request_cache = _request_cache.get()
+        if not force and request_cache is not None and memo_key in request_cache:
+            return request_cache[memo_key]
+
+        state_key = (str(shared_dir), str(user_id))
+        state = self.__class__._skill_sync_state.get(state_key)
+        try:
+            fingerprint = self._get_skill_sync_fingerprint(shared_dir)
+        except Exception:
+            fingerprint = None
+
+        if (
+            not force
+            and fingerprint is not None
+            and state is not None
+            and state["fingerprint"] == fingerprint
+            and time.monotonic() - state["synced_at"] < SKILL_SYNC_MAX_AGE
+        ):
+            logger.debug("[Skills Sync] No skill changes since last sync, skipped")
+        elif self._reconcile_openwebui_skills(shared_dir, user_id):
+            try:
+                self.__class__._skill_sync_state[state_key] = {
+                    "fingerprint": self._get_skill_sync_fingerprint(shared_dir),
+                    "synced_at": time.monotonic(),
+                }
+            except Exception:
+                self.__class__._skill_sync_state.pop(state_key, None)
+
+        if request_cache is not None:
+            request_cache[memo_key] = str(shared_dir)
+        return str(shared_dir)
+
+    def _reconcile_openwebui_skills(self, shared_dir: Path, user_id: str) -> bool:
         """Bidirectionally sync skills between OpenWebUI DB and the shared/ directory.
 
         Sync rules (per skill):
@@ -6161,10 +6453,8 @@ class Pipe:
         If a directory has `.owui_id` but the corresponding OpenWebUI skill is gone,
         the local directory is removed (UI is source of truth for deletions).
 
-        Returns the shared skills directory path (always, even on sync failure).
+        Returns True when the sync completed.
         """
-        shared_dir = Path(self._get_shared_skills_dir(resolved_cwd))
-
         try:
             from open_webui.models.skills import Skills, SkillForm, SkillMeta
 
@@ -6387,6 +6677,7 @@ class Pipe:
                             sync_stats["file_to_db_creates"] += 1
 
             logger.debug(f"[Skills Sync] Summary: {sync_stats}")
+            return True
 
         except ImportError:
             # Running outside OpenWebUI environment — directory is still usable
@@ -6394,7 +6685,7 @@ class Pipe:
         except Exception as e:
             logger.debug(f"[Copilot] Skills sync failed: {e}", exc_info=True)
 
-        return str(shared_dir)
+        return False
 
     def _resolve_session_skill_config(
         self,
@@ -7371,43 +7662,313 @@ class Pipe:
         # 2. Return results with real-time user-specific filtering
         return self._apply_model_filters(all_models, uv)
 
+    def _get_client_config_key(self, client_config: dict) -> str:
+        """Stable hash of a client config (token, cwd, env) for live-session reuse."""
+        return hashlib.sha256(
+            json.dumps(client_config, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _get_session_fingerprint(self, resume_params: dict) -> str:
+        """Hash of everything a resume would send, with tools reduced to their schema."""
+        comparable = {k: v for k, v in resume_params.items() if k != "tools"}
+        comparable["tools"] = [
+            (
+                getattr(tool, "name", None),
+                getattr(tool, "description", None),
+                getattr(tool, "parameters", None),
+            )
+            for tool in (resume_params.get("tools") or [])
+        ]
+        comparable.pop("on_permission_request", None)
+        return hashlib.sha256(
+            json.dumps(comparable, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _rebind_live_session(
+        self,
+        session: Any,
+        custom_tools: List[Any],
+        resolved_cwd: str,
+        __event_call__=None,
+    ) -> bool:
+        """Point a pooled session's tool handlers and hooks at the current request.
+
+        Relies on private SDK session methods; returns False (caller falls back to
+        resume_session on the same client) when this SDK version lacks them.
+        """
+        has_hooks = bool(getattr(session, "_hooks", None))
+        if not hasattr(session, "_register_tools") or (
+            has_hooks and not hasattr(session, "_register_hooks")
+        ):
+            logger.debug(
+                "[Session Pool] SDK session has no _register_tools/_register_hooks; resuming instead"
+            )
+            return False
+        try:
+            session._register_tools(custom_tools)
+            if has_hooks:
+                session._register_hooks(
+                    self._build_session_hooks(
+                        cwd=resolved_cwd, __event_call__=__event_call__
+                    )
+                )
+        except Exception as e:
+            logger.debug(f"[Session Pool] Rebinding live session failed: {e}")
+            return False
+        return True
+
+    async def _stop_live_session_client(self, entry: Dict[str, Any]) -> None:
+        try:
+            await asyncio.wait_for(entry["client"].stop(), timeout=10.0)
+        except Exception as e:
+            logger.debug(f"[Session Pool] Client stop failed: {e}")
+
+    async def _evict_idle_live_sessions(self) -> None:
+        pool = self.__class__._live_sessions
+        now = time.monotonic()
+        ttl = self.valves.SESSION_POOL_IDLE_TTL
+        for chat_id in [
+            cid for cid, entry in pool.items() if now - entry["last_used"] > ttl
+        ]:
+            entry = pool.pop(chat_id, None)
+            if entry is not None:
+                logger.debug(f"[Session Pool] Evicting idle session {chat_id}")
+                await self._stop_live_session_client(entry)
+
+    async def _reap_idle_live_sessions(self) -> None:
+        """Background loop that stops idle pooled clients until the pool is empty."""
+        try:
+            while self.__class__._live_sessions:
+                await asyncio.sleep(max(1.0, self.valves.SESSION_POOL_IDLE_TTL / 2))
+                await self._evict_idle_live_sessions()
+        finally:
+            self.__class__._live_session_reaper = None
+
+    async def _checkout_live_session(
+        self, chat_id: Optional[str], client_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """Take a chat's live session out of the pool (so no other turn can use it)."""
+        if not chat_id or self.valves.SESSION_POOL_SIZE <= 0:
+            return None
+        await self._evict_idle_live_sessions()
+        entry = self.__class__._live_sessions.pop(chat_id, None)
+        if entry is None:
+            return None
+        if entry["client_key"] != client_key:
+            await self._stop_live_session_client(entry)
+            return None
+        try:
+            if entry["client"].get_state() != "connected":
+                await self._stop_live_session_client(entry)
+                return None
+        except Exception:
+            await self._stop_live_session_client(entry)
+            return None
+        return entry
+
+    async def _checkin_live_session(
+        self,
+        chat_id: Optional[str],
+        client: Any,
+        session: Any,
+        client_key: str,
+        fingerprint: Optional[str],
+    ) -> bool:
+        """Return a finished turn's client/session to the pool. False means caller stops it."""
+        if not chat_id or not fingerprint or self.valves.SESSION_POOL_SIZE <= 0:
+            return False
+        pool = self.__class__._live_sessions
+        previous = pool.pop(chat_id, None)
+        if previous is not None and previous["client"] is not client:
+            await self._stop_live_session_client(previous)
+        pool[chat_id] = {
+            "client": client,
+            "session": session,
+            "client_key": client_key,
+            "fingerprint": fingerprint,
+            "last_used": time.monotonic(),
+        }
+        while len(pool) > self.valves.SESSION_POOL_SIZE:
+            _, evicted = pool.popitem(last=False)
+            await self._stop_live_session_client(evicted)
+        if self.__class__._live_session_reaper is None:
+            self.__class__._live_session_reaper = asyncio.create_task(
+                self._reap_idle_live_sessions()
+            )
+        return True
+
+    async def _stop_shared_client(self, client: Any) -> None:
+        try:
+            await asyncio.wait_for(client.stop(), timeout=10.0)
+        except Exception as e:
+            logger.debug(f"[Client Pool] Client stop failed: {e}")
+
+    def _detach_shared_client_locked(self, token_hash: str, client: Any) -> Optional[Any]:
+        """Forget a client removed from the pool. Caller holds `_shared_client_lock`.
+
+        Returns the client if it can be stopped now; a client that is still leased
+        is parked and stopped by the last `_release_shared_client`.
+        """
+        self.__class__._shared_client_last_used.pop(token_hash, None)
+        if not self.__class__._shared_client_key_lock_users.get(token_hash):
+            self.__class__._shared_client_key_locks.pop(token_hash, None)
+        if self.__class__._shared_client_leases.get(id(client)):
+            self.__class__._shared_client_retiring[id(client)] = client
+            return None
+        return client
+
+    async def _remove_shared_client(self, token_hash: str, client: Any) -> None:
+        """Drop a client from the pool (if it is still the pooled one) and stop it once unused."""
+        to_stop = None
+        async with self.__class__._shared_client_lock:
+            if self.__class__._shared_clients.get(token_hash) is client:
+                del self.__class__._shared_clients[token_hash]
+                to_stop = self._detach_shared_client_locked(token_hash, client)
+        if to_stop is not None:
+            await self._stop_shared_client(to_stop)
+
+    async def _release_shared_client(self, client: Any) -> None:
+        """End a lease taken by `_get_client`; stops the client if it was removed meanwhile."""
+        retired = None
+        async with self.__class__._shared_client_lock:
+            leases = self.__class__._shared_client_leases
+            remaining = leases.get(id(client), 0) - 1
+            if remaining > 0:
+                leases[id(client)] = remaining
+                return
+            leases.pop(id(client), None)
+            retired = self.__class__._shared_client_retiring.pop(id(client), None)
+        if retired is not None:
+            await self._stop_shared_client(retired)
+
+    async def _monitor_shared_clients(self) -> None:
+        """Background loop: stop idle clients and probe the rest until the pool is empty."""
+        try:
+            while self.__class__._shared_clients:
+                probe_interval = self.valves.CLIENT_HEALTH_CHECK_INTERVAL
+                await asyncio.sleep(
+                    probe_interval
+                    if probe_interval > 0
+                    else min(60, self.valves.CLIENT_POOL_IDLE_TTL)
+                )
+                now = time.monotonic()
+                for token_hash, client in list(self.__class__._shared_clients.items()):
+                    key_lock = self.__class__._shared_client_key_locks.get(token_hash)
+                    if key_lock is not None and key_lock.locked():
+                        continue  # Being started or checked by _get_client
+                    last_used = self.__class__._shared_client_last_used.get(
+                        token_hash, now
+                    )
+                    reason = None
+                    if now - last_used > self.valves.CLIENT_POOL_IDLE_TTL:
+                        reason = "idle"
+                    elif probe_interval > 0:
+                        try:
+                            if client.get_state() != "connected":
+                                reason = f"state={client.get_state()}"
+                            else:
+                                await asyncio.wait_for(client.ping(), timeout=10.0)
+                        except Exception as e:
+                            reason = f"ping failed: {e}"
+                    if reason:
+                        logger.info(f"[Client Pool] Stopping shared client ({reason})")
+                        await self._remove_shared_client(token_hash, client)
+        finally:
+            self.__class__._shared_client_monitor = None
+
     async def _get_client(self, token: str) -> Any:
-        """Get or create the persistent CopilotClient from the pool based on token."""
+        """Get or create the persistent CopilotClient from the pool based on token.
+
+        Starts are serialized per token (not globally), the pool is capped at
+        CLIENT_POOL_MAX_SIZE with LRU eviction, and a background monitor stops
+        idle or unhealthy clients. The returned client is leased: callers must
+        pass it to `_release_shared_client` when done, and eviction never stops
+        a client while a lease is open.
+        """
         # Use an MD5 hash of the token as the key for the client pool.
         # If no token is provided (BYOK-only mode), use a dedicated cache key.
         safe_token = token or "byok_only_mode"
         token_hash = hashlib.md5(safe_token.encode()).hexdigest()
+        cls = self.__class__
 
-        async with self.__class__._shared_client_lock:
-            # Check if client exists for this token and is healthy
-            client = self.__class__._shared_clients.get(token_hash)
-            if client:
-                try:
-                    state = client.get_state()
-                    if state == "connected":
-                        return client
-                    if state == "error":
-                        try:
-                            await client.stop()
-                        except:
-                            pass
-                        del self.__class__._shared_clients[token_hash]
-                except Exception:
-                    del self.__class__._shared_clients[token_hash]
+        async with cls._shared_client_lock:
+            key_lock = cls._shared_client_key_locks.setdefault(
+                token_hash, asyncio.Lock()
+            )
+            # Counted users keep the lock in the map, so every waiter serializes
+            # on the same lock object.
+            cls._shared_client_key_lock_users[token_hash] = (
+                cls._shared_client_key_lock_users.get(token_hash, 0) + 1
+            )
 
-            # Ensure environment discovery is done
-            if not self.__class__._env_setup_done:
-                self._setup_env(token=token)
+        try:
+            async with key_lock:
+                # Check if client exists for this token and is healthy
+                client = cls._shared_clients.get(token_hash)
+                if client:
+                    try:
+                        healthy = client.get_state() == "connected"
+                    except Exception:
+                        healthy = False
+                    if healthy:
+                        async with cls._shared_client_lock:
+                            # Another token's start may have evicted it meanwhile.
+                            if cls._shared_clients.get(token_hash) is client:
+                                cls._shared_clients.move_to_end(token_hash)
+                                cls._shared_client_last_used[token_hash] = (
+                                    time.monotonic()
+                                )
+                                cls._shared_client_leases[id(client)] = (
+                                    cls._shared_client_leases.get(id(client), 0) + 1
+                                )
+                                return client
+                    else:
+                        await self._remove_shared_client(token_hash, client)
 
-            # Build configuration and start persistent client
-            client_config = self._build_client_config(user_id=None, chat_id=None, token=token)
-            client_config["github_token"] = token
-            client_config["auto_start"] = True
+                # Ensure environment discovery is done
+                if not cls._env_setup_done:
+                    self._setup_env(token=token)
 
-            new_client = CopilotClient(client_config)
-            await new_client.start()
-            self.__class__._shared_clients[token_hash] = new_client
-            return new_client
+                # Build configuration and start persistent client
+                client_config = self._build_client_config(
+                    user_id=None, chat_id=None, token=token
+                )
+                client_config["github_token"] = token
+                client_config["auto_start"] = True
+
+                new_client = CopilotClient(client_config)
+                await new_client.start()
+
+                to_stop = []
+                async with cls._shared_client_lock:
+                    pool = cls._shared_clients
+                    pool[token_hash] = new_client
+                    pool.move_to_end(token_hash)
+                    cls._shared_client_last_used[token_hash] = time.monotonic()
+                    cls._shared_client_leases[id(new_client)] = 1
+                    while len(pool) > self.valves.CLIENT_POOL_MAX_SIZE:
+                        evicted_hash, evicted_client = pool.popitem(last=False)
+                        stoppable = self._detach_shared_client_locked(
+                            evicted_hash, evicted_client
+                        )
+                        if stoppable is not None:
+                            to_stop.append(stoppable)
+                    if cls._shared_client_monitor is None:
+                        cls._shared_client_monitor = asyncio.create_task(
+                            self._monitor_shared_clients()
+                        )
+                for evicted_client in to_stop:
+                    await self._stop_shared_client(evicted_client)
+                return new_client
+        finally:
+            async with cls._shared_client_lock:
+                users = cls._shared_client_key_lock_users.get(token_hash, 0) - 1
+                if users > 0:
+                    cls._shared_client_key_lock_users[token_hash] = users
+                else:
+                    cls._shared_client_key_lock_users.pop(token_hash, None)
+                    if token_hash not in cls._shared_clients:
+                        cls._shared_client_key_locks.pop(token_hash, None)
 
     async def _fetch_standard_models(self, token: str, __user__: dict) -> List[dict]:
         """Fetch models using the shared persistent client pool."""
@@ -7416,7 +7977,10 @@ class Pipe:
 
         try:
             client = await self._get_client(token)
-            raw = await client.list_models()
+            try:
+                raw = await client.list_models()
+            finally:
+                await self._release_shared_client(client)
 
             models = []
             for m in raw if isinstance(raw, list) else []:
@@ -8101,10 +8665,18 @@ class Pipe:
             user_id=user_id, chat_id=chat_id, token=effective_token
         )
         client_config["github_token"] = effective_token
-        client = CopilotClient(client_config)
+        # Live session pool (SESSION_POOL_SIZE): reuse this chat's running client
+        client_key = self._get_client_config_key(client_config)
+        pooled_session = await self._checkout_live_session(chat_id, client_key)
+        session_fingerprint = None
+        if pooled_session:
+            client = pooled_session["client"]
+        else:
+            client = CopilotClient(client_config)
         should_stop_client = True
         try:
-            await client.start()
+            if not pooled_session:
+                await client.start()
             t_after_client = time.monotonic()
 
             # Initialize custom tools (Handles caching internally)
@@ -8279,25 +8851,49 @@ class Pipe:
                         debug_enabled=effective_debug,
                     )
 
-                    t_before_rpc = time.monotonic()
-                    session = await client.resume_session(chat_id, resume_params)
-                    t_after_rpc = time.monotonic()
+                    # Fingerprint of the requested config, taken before the resume
+                    # attempt: a session created below (first turn of a chat) is
+                    # pooled under it too, since the next turn's resume params
+                    # describe the same config.
+                    session_fingerprint = self._get_session_fingerprint(resume_params)
+                    if (
+                        pooled_session
+                        and pooled_session["fingerprint"] == session_fingerprint
+                        and self._rebind_live_session(
+                            pooled_session["session"],
+                            custom_tools,
+                            resolved_cwd,
+                            __event_call__,
+                        )
+                    ):
+                        # Same config as the live session: this turn's tool handlers
+                        # (they capture request emitters) are rebound, skip the RPC.
+                        session = pooled_session["session"]
+                        self._emit_debug_log_sync(
+                            f"⏱️ [Profiling] Skills Resolve: {t_skills_elapsed:.3f}s | Live session reused (resume_session skipped)",
+                            __event_call__,
+                            debug_enabled=True,
+                        )
+                    else:
+                        t_before_rpc = time.monotonic()
+                        session = await client.resume_session(chat_id, resume_params)
+                        t_after_rpc = time.monotonic()
 
-                    self._emit_debug_log_sync(
-                        f"⏱️ [Profiling] Skills Resolve: {t_skills_elapsed:.3f}s | RPC resume_session: {t_after_rpc - t_before_rpc:.3f}s",
-                        __event_call__,
-                        debug_enabled=True,
-                    )
+                        self._emit_debug_log_sync(
+                            f"⏱️ [Profiling] Skills Resolve: {t_skills_elapsed:.3f}s | RPC resume_session: {t_after_rpc - t_before_rpc:.3f}s",
+                            __event_call__,
+                            debug_enabled=True,
+                        )
 
-                    await self._emit_debug_log(
-                        f"Successfully resumed session {chat_id} with model {real_model_id}",
-                        __event_call__,
-                    )
-                    await self._abort_stale_resumed_turn_if_needed(
-                        session,
-                        __event_call__=__event_call__,
-                        debug_enabled=effective_debug,
-                    )
+                        await self._emit_debug_log(
+                            f"Successfully resumed session {chat_id} with model {real_model_id}",
+                            __event_call__,
+                        )
+                        await self._abort_stale_resumed_turn_if_needed(
+                            session,
+                            __event_call__=__event_call__,
+                            debug_enabled=effective_debug,
+                        )
                 except Exception as e:
                     await self._emit_debug_log(
                         f"Session {chat_id} not found or failed to resume ({str(e)}), creating new.",
@@ -8305,6 +8901,8 @@ class Pipe:
                     )
 
             if session is None:
+                # Without a fingerprint (no chat_id, or resume params could not be
+                # built) the new session is not pooled and its client is stopped.
                 session_config = self._build_session_config(
                     chat_id,
                     real_model_id,
@@ -8416,10 +9014,15 @@ class Pipe:
                     user_lang=user_lang,
                     pending_embeds=pending_embeds,
                     request_start_ts=request_start_ts,
+                    session_pool_key=(client_key, session_fingerprint),
                 )
             else:
                 try:
                     response = await session.send_and_wait(send_payload)
+                    if await self._checkin_live_session(
+                        chat_id, client, session, client_key, session_fingerprint
+                    ):
+                        should_stop_client = False
                     return response.data.content if response else "Empty response."
                 finally:
                     # Cleanup: destroy session if no chat_id (temporary session)
@@ -8464,10 +9067,13 @@ class Pipe:
         user_lang: str = "en-US",
         pending_embeds: List[dict] = None,
         request_start_ts: float = 0.0,
+        session_pool_key: Optional[Tuple[str, Optional[str]]] = None,
     ) -> AsyncGenerator:
         """
         Stream response from Copilot SDK, handling various event types.
         Follows official SDK patterns for event handling and streaming.
+        A turn that reaches session.idle without error returns the client and
+        session to the live session pool (`session_pool_key`) instead of stopping.
         """
         queue = asyncio.Queue()
         done = asyncio.Event()
@@ -8491,6 +9097,8 @@ class Pipe:
             "final_status_desc": self._get_translation(
                 user_lang, "status_task_completed"
             ),
+            "status_ops": [],  # Pending (description, is_done) status emissions
+            "status_worker": None,
         }
         has_content = False  # Track if any content has been yielded
         active_tools = {}  # Map tool_call_id to tool_name
@@ -8499,6 +9107,9 @@ class Pipe:
         last_wait_status_ts = 0.0
         wait_status_interval = 15.0
         queue_poll_interval = max(1.0, min(float(self.valves.TIMEOUT), 5.0))
+        coalesce_window = self.valves.STREAM_COALESCE_MS / 1000.0
+        coalesce_max_chars = self.valves.STREAM_COALESCE_CHARS
+        held_chunk = None  # Sentinel read while coalescing, handled next iteration
 
         IDLE_SENTINEL = object()
         ERROR_SENTINEL = object()
@@ -8684,11 +9295,34 @@ class Pipe:
                 except:
                     pass
 
+            async def _drain_status_ops():
+                # Single worker per stream: emits queued statuses in order, waiting
+                # briefly while the newest one is in-progress so bursts collapse.
+                ops = state["status_ops"]
+                try:
+                    while ops:
+                        if not ops[-1][1]:
+                            await asyncio.sleep(STATUS_DEBOUNCE_INTERVAL)
+                            if not ops:
+                                break
+                        desc, is_done = ops.pop(0)
+                        await _emit_status_helper(desc, is_done)
+                finally:
+                    state["status_worker"] = None
+
             def emit_status(desc: str, is_done: bool = False):
-                """Sync wrapper to schedule the async status emission."""
+                """Sync wrapper to queue a debounced status emission."""
                 if __event_emitter__ and desc:
+                    ops = state["status_ops"]
+                    # A newer update supersedes a still-pending in-progress one
+                    if ops and not ops[-1][1]:
+                        ops.pop()
+                    ops.append((desc, is_done))
                     # We use a task because this is often called from sync tool handlers
-                    asyncio.create_task(_emit_status_helper(desc, is_done))
+                    if state.get("status_worker") is None:
+                        state["status_worker"] = asyncio.create_task(
+                            _drain_status_ops()
+                        )
 
             # === Turn Management Events ===
             if event_type == "assistant.turn_start":
@@ -9456,9 +10090,38 @@ class Pipe:
         try:
             while not done.is_set():
                 try:
-                    chunk = await asyncio.wait_for(
-                        queue.get(), timeout=queue_poll_interval
-                    )
+                    if held_chunk is not None:
+                        chunk, held_chunk = held_chunk, None
+                    else:
+                        chunk = await asyncio.wait_for(
+                            queue.get(), timeout=queue_poll_interval
+                        )
+
+                    # Coalesce bursts of small deltas into one yielded chunk
+                    if isinstance(chunk, str) and coalesce_window > 0:
+                        parts = [chunk]
+                        size = len(chunk)
+                        deadline = time.monotonic() + coalesce_window
+                        while size < coalesce_max_chars:
+                            try:
+                                next_chunk = queue.get_nowait()
+                            except asyncio.QueueEmpty:
+                                remaining = deadline - time.monotonic()
+                                if remaining <= 0:
+                                    break
+                                try:
+                                    next_chunk = await asyncio.wait_for(
+                                        queue.get(), timeout=remaining
+                                    )
+                                except asyncio.TimeoutError:
+                                    break
+                            if not isinstance(next_chunk, str):
+                                held_chunk = next_chunk
+                                break
+                            parts.append(next_chunk)
+                            size += len(next_chunk)
+                        chunk = "".join(parts)
+
                     if chunk is SENTINEL:
                         done.set()
                         break
@@ -9761,7 +10424,7 @@ class Pipe:
                         last_wait_status_ts = now_ts
                     continue
 
-            while not queue.empty():
+            while held_chunk is None and not queue.empty():
                 chunk = queue.get_nowait()
                 if chunk in (SENTINEL, IDLE_SENTINEL, ERROR_SENTINEL):
                     break
@@ -9869,10 +10532,23 @@ class Pipe:
                     pass
 
             unsubscribe()
-            try:
-                await client.stop()
-            except Exception:
-                pass
+            pooled = False
+            if (
+                session_pool_key
+                and state.get("idle_reached")
+                and not state.get("last_error_msg")
+            ):
+                try:
+                    pooled = await self._checkin_live_session(
+                        chat_id, client, session, *session_pool_key
+                    )
+                except Exception:
+                    pooled = False
+            if not pooled:
+                try:
+                    await client.stop()
+                except Exception:
+                    pass
 
 
 # Triggering release after CI fix